@@ -16,3 +16,5 @@ class ConfigLoader:
         self.minio_host = os.environ.get('API_HOST')
         self.minio_user = os.environ.get('API_USER')
         self.minio_pass = os.environ.get('API_KEY')
+        self.storage_type = os.environ.get('STORAGE_TYPE', 'minio')
+        self.local_storage_root = os.environ.get('LOCAL_STORAGE_ROOT', '')
@@ -4,17 +4,21 @@
 
 import os
 import logging
-from typing import Optional, List
+from datetime import timedelta
+from typing import Optional, List, BinaryIO, Dict
 
 from minio import Minio
 from urllib3.exceptions import MaxRetryError
 
 from db.config import ConfigLoader  # pylint: disable=import-error
+from db.storage import BaseStorage  # pylint: disable=import-error
 
 log = logging.getLogger(__name__)
 
+PRESIGNED_URL_EXPIRES = 60 * 60
 
-class MinioDB:
+
+class MinioDB(BaseStorage):
     """
     Класс, позволяющий выполнять запросы к базе данных (БД) Minio.
     """
@@ -89,19 +93,102 @@ class MinioDB:
 
         filename = os.path.split(obj_name_in_db)[-1]
         save_path = os.path.join(self.local_download_path, filename) if save_path is None else save_path
-        if bucket == 'main':
-            self.client.fget_object(self.main_bucket, obj_name_in_db, save_path)
-        elif bucket == 'tmp':
-            self.client.fget_object(self.tmp_bucket, obj_name_in_db, save_path)
-        else:
-            log.error("Bucket doesn't exist!")
-            raise NameError
+        self.client.fget_object(self._get_bucket_name(bucket), obj_name_in_db, save_path)
+
+    def db_get_stream(self, obj_name_in_db: str, bucket: str = 'main') -> BinaryIO:
+        """
+        Потоковое чтение объекта из БД без сохранения на диск. Поток нужно закрыть после чтения
+        (см. db_close_stream).
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            stream (BinaryIO): Поток с содержимым объекта.
+        """
+        return self.client.get_object(self._get_bucket_name(bucket), obj_name_in_db)
+
+    def db_close_stream(self, stream: BinaryIO):
+        """
+        Закрытие потока, полученного db_get_stream, и возврат соединения в пул.
+
+        Args:
+            stream (BinaryIO): Поток с содержимым объекта.
+        """
+        stream.close()
+        stream.release_conn()
+
+    def db_get_url(self, obj_name_in_db: str, bucket: str = 'main') -> str:
+        """
+        Временная (presigned) ссылка на объект, по которой его можно читать частями с помощью range запросов.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание на папку БД (main - основная, tmp - второстепенная).
+        Returns:
+            url (str): Ссылка на объект.
+        """
+        return self.client.presigned_get_object(self._get_bucket_name(bucket), obj_name_in_db,
+                                                expires=timedelta(seconds=PRESIGNED_URL_EXPIRES))
+
+    def db_stat_file(self, obj_name_in_db: str, bucket: str = 'main') -> Dict[str, str]:
+        """
+        Идентификатор содержимого объекта без его скачивания.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            stat (Dict[str, str]): ETag объекта (etag) и его размер в байтах (size).
+        """
+        stat = self.client.stat_object(self._get_bucket_name(bucket), obj_name_in_db)
+        return {'etag': stat.etag.strip('"'), 'size': str(stat.size)}
 
-    def db_put_file(self, file_path: str):
+    def db_put_file(self, file_path: str, keep_local: bool = True, metadata: Optional[Dict[str, str]] = None):
         """
         Подгрузка объекта из локальной директории в БД.
         Args:
             file_path (str): Локальный путь до файла
+            keep_local (bool): Оставить ли локальный файл после подгрузки.
+            metadata (Optional[Dict[str, str]]): Метаданные объекта (сохраняются как x-amz-meta-* заголовки).
         """
         filename = os.path.split(file_path)[-1]
-        self.client.fput_object(self.tmp_bucket, filename, file_path)
+        self.client.fput_object(self.tmp_bucket, filename, file_path, metadata=metadata)
+        if not keep_local:
+            os.remove(file_path)
+
+    def db_get_metadata(self, obj_name_in_db: str, bucket: str = 'tmp') -> Dict[str, str]:
+        """
+        Чтение метаданных объекта, записанных при его подгрузке в БД.
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            metadata (Dict[str, str]): Метаданные объекта (без префикса x-amz-meta-).
+        """
+        stat = self.client.stat_object(self._get_bucket_name(bucket), obj_name_in_db)
+        prefix = 'x-amz-meta-'
+        return {key.lower()[len(prefix):]: value for key, value in (stat.metadata or {}).items()
+                if key.lower().startswith(prefix)}
+
+    def db_delete_file(self, obj_name_in_db: str, bucket: str = 'tmp'):
+        """
+        Удаление объекта из БД.
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД удалять (main - основная, tmp - второстепенная).
+        """
+        self.client.remove_object(self._get_bucket_name(bucket), obj_name_in_db)
+
+    def _get_bucket_name(self, bucket: str) -> str:
+        """
+        Args:
+            bucket (str): Указание на папку БД (main - основная, tmp - второстепенная).
+        Returns (str): Название папки в БД.
+        """
+        if bucket == 'main':
+            return self.main_bucket
+        if bucket == 'tmp':
+            return self.tmp_bucket
+        log.error("Bucket doesn't exist!")
+        raise NameError
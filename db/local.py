@@ -0,0 +1,212 @@
+"""
+Модуль позволяющий работать с видео, лежащими в локальной файловой системе (в том числе на примонтированном NAS),
+так же, как с базой данных Minio, но без сервера и без копирования данных.
+"""
+
+import os
+import json
+import errno
+import hashlib
+import shutil
+import logging
+from typing import Optional, List, BinaryIO, Dict
+
+from db.config import ConfigLoader  # pylint: disable=import-error
+from db.storage import BaseStorage  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+METADATA_SUFFIX = '.meta.json'
+STAT_BLOCK_SIZE = 1024 ** 2
+
+
+def _link_or_copy(src_path: str, dst_path: str):
+    """
+    Создание жесткой ссылки на файл (без копирования данных). Если src_path и dst_path находятся
+    на разных файловых системах, то создается символическая ссылка.
+    """
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        try:
+            os.symlink(os.path.abspath(src_path), dst_path)
+        except OSError:
+            shutil.copy2(src_path, dst_path)
+
+
+class LocalDB(BaseStorage):
+    """
+    Класс, реализующий хранилище в локальной директории: папки (bucket'ы) это директории внутри
+    LOCAL_STORAGE_ROOT. Загрузка и выгрузка объектов выполняется через жесткие ссылки и переименования.
+    """
+
+    def __init__(self,
+                 main_bucket_name: str,
+                 tmp_bucket_name: str,
+                 logs_path: str,
+                 local_download_path: str):
+        """
+        Функция инициализирует параметры для хранилища
+
+        Args:
+            main_bucket_name (str): Путь до директории с видео (относительно LOCAL_STORAGE_ROOT).
+            tmp_bucket_name (str): Путь до директории, в которую будут сохраняться фичи видео
+                                   (относительно LOCAL_STORAGE_ROOT).
+            logs_path (str): Название локальной папки, в которую будет сохраняться лог об актуальном состоянии.
+            local_download_path (str):  Путь до локальной папки, в которую будут сохраняться данные из хранилища.
+        """
+        config_manager = ConfigLoader()
+        self.main_bucket = os.path.join(config_manager.local_storage_root, main_bucket_name)
+        self.tmp_bucket = os.path.join(config_manager.local_storage_root, tmp_bucket_name)
+        self.local_download_path = local_download_path
+        self.logs_path = logs_path
+
+        if not os.path.isdir(self.main_bucket):
+            log.error("Directory with videos doesn't exist!")
+            raise FileNotFoundError(self.main_bucket)
+
+        if not os.path.isdir(self.tmp_bucket):
+            os.makedirs(self.tmp_bucket)
+            log.info("Created temporary directory.")
+
+    def db_get_video_list(self) -> List[str]:
+        """
+        Returns (List[str]): Список видео из директории с видео (пути относительно директории).
+        """
+        my_list = []
+        for root, _, filenames in os.walk(self.main_bucket):
+            for filename in filenames:
+                if filename.endswith(METADATA_SUFFIX):
+                    continue
+                my_list.append(os.path.relpath(os.path.join(root, filename), self.main_bucket))
+        my_list.sort()
+        return my_list
+
+    def db_get_file(self, obj_name_in_db: str, save_path: Optional[str] = None, bucket: str = 'main'):
+        """
+        "Загрузка" объекта в локальную директорию: создается жесткая ссылка на объект.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            save_path (Optional[str]): Путь до локальной директории, куда подгружать.
+            bucket (str): Указание из какой папки подгружать (main - основная, tmp - второстепенная).
+        """
+        filename = os.path.split(obj_name_in_db)[-1]
+        save_path = os.path.join(self.local_download_path, filename) if save_path is None else save_path
+        obj_path = self._get_object_path(obj_name_in_db, bucket)
+        if os.path.abspath(obj_path) != os.path.abspath(save_path):
+            _link_or_copy(obj_path, save_path)
+
+    def db_get_stream(self, obj_name_in_db: str, bucket: str = 'main') -> BinaryIO:
+        """
+        Потоковое чтение объекта. Поток нужно закрыть после чтения.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание из какой папки читать (main - основная, tmp - второстепенная).
+        Returns:
+            stream (BinaryIO): Поток с содержимым объекта.
+        """
+        return open(self._get_object_path(obj_name_in_db, bucket), 'rb')  # pylint: disable=consider-using-with
+
+    def db_get_url(self, obj_name_in_db: str, bucket: str = 'main') -> str:
+        """
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание на папку (main - основная, tmp - второстепенная).
+        Returns:
+            url (str): Путь до объекта в файловой системе.
+        """
+        return self._get_object_path(obj_name_in_db, bucket)
+
+    def db_stat_file(self, obj_name_in_db: str, bucket: str = 'main') -> Dict[str, str]:
+        """
+        Идентификатор содержимого объекта: чтобы не читать видео целиком, хэш считается по размеру файла
+        и его первому и последнему мегабайту.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание из какой папки читать (main - основная, tmp - второстепенная).
+        Returns:
+            stat (Dict[str, str]): Хэш содержимого объекта (etag) и его размер в байтах (size).
+        """
+        obj_path = self._get_object_path(obj_name_in_db, bucket)
+        size = os.path.getsize(obj_path)
+        sha1 = hashlib.sha1(str(size).encode('utf8'))
+        with open(obj_path, 'rb') as obj:
+            sha1.update(obj.read(STAT_BLOCK_SIZE))
+            if size > STAT_BLOCK_SIZE:
+                obj.seek(max(size - STAT_BLOCK_SIZE, STAT_BLOCK_SIZE))
+                sha1.update(obj.read(STAT_BLOCK_SIZE))
+        return {'etag': sha1.hexdigest(), 'size': str(size)}
+
+    def db_put_file(self, file_path: str, keep_local: bool = True, metadata: Optional[Dict[str, str]] = None):
+        """
+        Выгрузка объекта во временную папку: жесткая ссылка, если локальный файл нужно оставить,
+        иначе переименование.
+        Args:
+            file_path (str): Локальный путь до файла
+            keep_local (bool): Оставить ли локальный файл после выгрузки.
+            metadata (Optional[Dict[str, str]]): Метаданные объекта (сохраняются рядом с объектом в json).
+        """
+        filename = os.path.split(file_path)[-1]
+        obj_path = os.path.join(self.tmp_bucket, filename)
+        if metadata is not None:
+            with open(obj_path + METADATA_SUFFIX, 'w', encoding='utf8') as metadata_file:
+                json.dump(metadata, metadata_file)
+        if os.path.abspath(obj_path) == os.path.abspath(file_path):
+            return
+        if keep_local:
+            _link_or_copy(file_path, obj_path)
+        else:
+            try:
+                os.replace(file_path, obj_path)
+            except OSError as error:
+                if error.errno != errno.EXDEV:
+                    raise
+                shutil.move(file_path, obj_path)
+
+    def db_delete_file(self, obj_name_in_db: str, bucket: str = 'tmp'):
+        """
+        Удаление объекта из хранилища.
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание из какой папки удалять (main - основная, tmp - второстепенная).
+        """
+        obj_path = self._get_object_path(obj_name_in_db, bucket)
+        os.remove(obj_path)
+        if os.path.exists(obj_path + METADATA_SUFFIX):
+            os.remove(obj_path + METADATA_SUFFIX)
+
+    def db_get_metadata(self, obj_name_in_db: str, bucket: str = 'tmp') -> Dict[str, str]:
+        """
+        Чтение метаданных объекта, записанных при его выгрузке.
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание из какой папки читать (main - основная, tmp - второстепенная).
+        Returns:
+            metadata (Dict[str, str]): Метаданные объекта.
+        """
+        metadata_path = self._get_object_path(obj_name_in_db, bucket) + METADATA_SUFFIX
+        if not os.path.exists(metadata_path):
+            return {}
+        with open(metadata_path, encoding='utf8') as metadata_file:
+            return json.load(metadata_file)
+
+    def _get_object_path(self, obj_name_in_db: str, bucket: str) -> str:
+        """
+        Args:
+            obj_name_in_db (str): Имя объекта в хранилище.
+            bucket (str): Указание на папку (main - основная, tmp - второстепенная).
+        Returns (str): Путь до объекта в файловой системе.
+        """
+        if bucket == 'main':
+            return os.path.join(self.main_bucket, obj_name_in_db)
+        if bucket == 'tmp':
+            return os.path.join(self.tmp_bucket, obj_name_in_db)
+        log.error("Bucket doesn't exist!")
+        raise NameError
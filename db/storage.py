@@ -0,0 +1,131 @@
+"""
+Модуль описывает интерфейс хранилища видео и фич, а также позволяет создать нужную реализацию хранилища.
+"""
+from abc import ABC, abstractmethod
+from typing import Optional, List, BinaryIO, Dict
+
+
+class BaseStorage(ABC):
+    """
+    Интерфейс хранилища (БД), в котором лежат видео (основная папка, main) и
+    куда выгружаются фичи видео (временная папка, tmp).
+    """
+
+    @abstractmethod
+    def db_get_video_list(self) -> List[str]:
+        """
+        Returns (List[str]): Список видео из директории с видео в БД.
+        """
+
+    @abstractmethod
+    def db_get_file(self, obj_name_in_db: str, save_path: Optional[str] = None, bucket: str = 'main'):
+        """
+        Загрузка объекта из БД в локальную директорию.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            save_path (Optional[str]): Путь до локальной директории, куда подгружать.
+            bucket (str): Указание из какой папки БД подгружать (main - основная, tmp - второстепенная).
+        """
+
+    @abstractmethod
+    def db_get_stream(self, obj_name_in_db: str, bucket: str = 'main') -> BinaryIO:
+        """
+        Потоковое чтение объекта из БД без сохранения на диск. Поток нужно закрыть после чтения.
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            stream (BinaryIO): Поток с содержимым объекта.
+        """
+
+    def db_close_stream(self, stream: BinaryIO):
+        """
+        Закрытие потока, полученного db_get_stream.
+
+        Args:
+            stream (BinaryIO): Поток с содержимым объекта.
+        """
+        stream.close()
+
+    @abstractmethod
+    def db_get_url(self, obj_name_in_db: str, bucket: str = 'main') -> str:
+        """
+        Ссылка на объект, по которой его можно читать частями без скачивания (например, ffprobe или cv2).
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание на папку БД (main - основная, tmp - второстепенная).
+        Returns:
+            url (str): Ссылка на объект (или путь до него).
+        """
+
+    @abstractmethod
+    def db_stat_file(self, obj_name_in_db: str, bucket: str = 'main') -> Dict[str, str]:
+        """
+        Идентификатор содержимого объекта без его скачивания (например, для кэша фич, см. utils/feature_cache.py).
+
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            stat (Dict[str, str]): Хэш содержимого объекта (etag) и его размер в байтах (size).
+        """
+
+    @abstractmethod
+    def db_put_file(self, file_path: str, keep_local: bool = True, metadata: Optional[Dict[str, str]] = None):
+        """
+        Подгрузка объекта из локальной директории во временную папку БД.
+        Args:
+            file_path (str): Локальный путь до файла
+            keep_local (bool): Оставить ли локальный файл после подгрузки.
+            metadata (Optional[Dict[str, str]]): Метаданные объекта (например, кодек сжатия фич).
+        """
+
+    @abstractmethod
+    def db_get_metadata(self, obj_name_in_db: str, bucket: str = 'tmp') -> Dict[str, str]:
+        """
+        Чтение метаданных объекта, записанных при его подгрузке в БД.
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД читать (main - основная, tmp - второстепенная).
+        Returns:
+            metadata (Dict[str, str]): Метаданные объекта.
+        """
+
+    @abstractmethod
+    def db_delete_file(self, obj_name_in_db: str, bucket: str = 'tmp'):
+        """
+        Удаление объекта из БД.
+        Args:
+            obj_name_in_db (str): Имя объекта в БД.
+            bucket (str): Указание из какой папки БД удалять (main - основная, tmp - второстепенная).
+        """
+
+
+def get_storage(storage_type: str,
+                main_bucket_name: str,
+                tmp_bucket_name: str,
+                logs_path: str,
+                local_download_path: str) -> BaseStorage:
+    """
+    Создание хранилища нужного типа.
+
+    Args:
+        storage_type (str): Тип хранилища (minio - сервер Minio, local - локальная файловая система или NAS).
+        main_bucket_name (str): Название папки с видео в БД.
+        tmp_bucket_name (str): Название папки в БД, в которую будут сохраняться фичи видео.
+        logs_path (str): Название локальной папки, в которую будет сохраняться лог об актуальном состоянии.
+        local_download_path (str):  Путь до локальной папки, в которую будут сохраняться данные из БД.
+    Returns:
+        storage (BaseStorage): Хранилище.
+    """
+    # pylint: disable=import-outside-toplevel
+    if storage_type == 'minio':
+        from db.database import MinioDB  # pylint: disable=import-error
+        return MinioDB(main_bucket_name, tmp_bucket_name, logs_path, local_download_path)
+    if storage_type == 'local':
+        from db.local import LocalDB  # pylint: disable=import-error
+        return LocalDB(main_bucket_name, tmp_bucket_name, logs_path, local_download_path)
+    raise NameError(f"Storage type {storage_type} doesn't exist!")
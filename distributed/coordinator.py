@@ -0,0 +1,254 @@
+"""
+Модуль описывает координатора распределенного режима. Координатор создает задания в общем хранилище заданий
+(см. distributed/lease.py), которые выполняют исполнители (distributed/worker.py) на разных машинах, и
+переносит результаты в свои мета данные.
+
+1 этап: по одному заданию extract на видео, а для видео длиннее MetaData.segment_duration (по длительности из
+заголовков) - по одному заданию extract_segment на сегмент, чтобы длинное видео обрабатывали несколько
+исполнителей; фичи сегментов склеивает координатор. После выполнения всех заданий мета данные сортируются (2 этап).
+3 этап: жадная группировка (см. meta/meta.py) зависит от порядка видео, поэтому решения принимает только
+координатор, строго по порядку видео. Исполнители же заранее сравнивают пары (видео, главное видео) для окна
+из нескольких следующих видео, так что к моменту принятия решения большинство сравнений уже выполнено.
+Результат группировки совпадает с MetaData.compare_videos.
+"""
+import os
+import time
+import logging
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Tuple, Optional
+
+from distributed.lease import LeaseStore, DONE, FAILED  # pylint: disable=import-error
+from meta.submeta import init_submeta, NO_GROUP  # pylint: disable=import-error
+from utils.probe import bin_pack  # pylint: disable=import-error
+from video.segments import split_into_segments, stitch_segments  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def extraction_plan(meta_data, num_workers: int) -> List[List[int]]:
+    """
+    Распределение вытягивания фич между несколькими исполнителями с примерно равной суммарной длительностью видео
+    (без общего хранилища заданий, например, для статического разбиения по машинам).
+    Args:
+        meta_data (ColumnarMeta): Мета данные (нужны длительности видео из заголовков, см. MetaData.probe_videos).
+        num_workers (int): Количество исполнителей.
+    Returns:
+        plan (List[List[int]]): Индексы видео для каждого исполнителя (в порядке убывания длительности).
+    """
+    return bin_pack(meta_data['probed_videos_duration'].tolist(), num_workers)
+
+
+class Coordinator:
+    """
+    Координатор распределенного режима. Использует собственный объект MetaData, мета данные которого являются
+    итоговым результатом работы.
+    """
+
+    def __init__(self, meta_obj, store: LeaseStore, poll_seconds: float = 5, window: int = 16):
+        """
+        Args:
+            meta_obj (MetaData): Объект MetaData координатора.
+            store (LeaseStore): Хранилище заданий.
+            poll_seconds (float): Период проверки результатов заданий в секундах.
+            window (int): Количество следующих видео, пары которых с главными видео сравниваются заранее
+                          (чем больше окно, тем больше параллелизм, но и тем больше лишних сравнений).
+        """
+        self.meta_obj = meta_obj
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.window = window
+
+    @staticmethod
+    def extract_item_id(video_path: str) -> str:
+        """Идентификатор задания extract для видео."""
+        return f"extract:{video_path}"
+
+    @staticmethod
+    def segment_item_id(video_path: str, segment_idx: int) -> str:
+        """Идентификатор задания extract_segment для сегмента видео."""
+        return f"extract:{video_path}#{segment_idx}"
+
+    def compare_item_id(self, video_idx: int, main_video_idx: int) -> str:
+        """Идентификатор задания compare для пары (видео, главное видео)."""
+        remote_videos_paths = self.meta_obj.meta_data['remote_videos_paths']
+        return f"compare:{remote_videos_paths[video_idx]}|{remote_videos_paths[main_video_idx]}"
+
+    def _wait(self, item_ids) -> Dict[str, Tuple[str, Optional[dict]]]:
+        """Ожидание выполнения (или окончательной ошибки) всех заданий."""
+        while True:
+            results = self.store.get_results(list(item_ids))
+            num_unfinished = sum(status not in (DONE, FAILED) for status, _ in results.values())
+            if num_unfinished == 0:
+                return results
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Waiting for {num_unfinished}/{len(results)} items...")
+            time.sleep(self.poll_seconds)
+
+    def _extraction_items(self) -> Tuple[Dict[str, dict], Dict[int, List[str]]]:
+        """
+        Returns (Tuple[Dict[str, dict], Dict[int, List[str]]]): Задания 1 этапа и идентификаторы заданий
+                                                                extract_segment каждого видео, разбитого на сегменты.
+        """
+        meta_data = self.meta_obj.meta_data
+        self.meta_obj.probe_videos()
+        items = {}
+        segmented = {}
+        for video_idx in range(meta_data['num_videos']):
+            if meta_data['were_features_uploaded'][video_idx]:
+                continue
+            video_path = str(meta_data['remote_videos_paths'][video_idx])
+            duration = int(meta_data['probed_videos_duration'][video_idx])
+            if duration <= self.meta_obj.segment_duration:
+                items[self.extract_item_id(video_path)] = {'kind': 'extract', 'video_path': video_path}
+                continue
+            segmented[video_idx] = []
+            for segment_idx, (start, end) in enumerate(split_into_segments(duration, self.meta_obj.segment_duration)):
+                item_id = self.segment_item_id(video_path, segment_idx)
+                items[item_id] = {'kind': 'extract_segment', 'video_path': video_path, 'segment_idx': segment_idx,
+                                  'start': start, 'end': end}
+                segmented[video_idx].append(item_id)
+        return items, segmented
+
+    def run_extraction(self):
+        """
+        Реализация 1 и 2 этапа пайплайна: создание заданий extract (и extract_segment для длинных видео),
+        ожидание их выполнения исполнителями, склейка фич сегментов, перенос результатов в мета данные и их сортировка.
+        После завершения работы функции мета данные обновляются.
+        """
+        meta_data = self.meta_obj.meta_data
+        items, segmented = self._extraction_items()
+        self.store.add_items(items)
+        results = self._wait(items)
+        for video_idx, item_ids in segmented.items():
+            results[self.extract_item_id(str(meta_data['remote_videos_paths'][video_idx]))] = \
+                self._stitch(video_idx, [results[item_id] for item_id in item_ids])
+
+        for video_idx in range(meta_data['num_videos']):
+            item_id = self.extract_item_id(str(meta_data['remote_videos_paths'][video_idx]))
+            if item_id not in results:
+                continue
+            status, result = results[item_id]
+            if status == FAILED or result['error']:
+                # pylint: disable=logging-fstring-interpolation
+                if status == FAILED:
+                    log.error(f"Extraction of {meta_data['remote_videos_paths'][video_idx]} failed.")
+                meta_data['was_video_with_error'][video_idx] = True
+                meta_data['videos_duration'][video_idx] = 0
+            else:
+                meta_data['videos_duration'][video_idx] = result['duration']
+                meta_data['remote_features_paths'][video_idx] = result['features_path']
+                meta_data['features_hash'][video_idx] = result['features_hash']
+                meta_data['local_features_paths'][video_idx] = os.path.join(str(self.meta_obj.local_download_path),
+                                                                            result['features_path'])
+                meta_data['are_features_remote'][video_idx] = True
+            for key in ('was_video_downloaded', 'was_video_read', 'were_features_extracted',
+                        'were_features_uploaded'):
+                meta_data[key][video_idx] = True
+        if meta_data['num_groups_found'] == 0:
+            # после начала сравнения порядок видео менять нельзя (группы ссылаются на индексы видео)
+            meta_data.sort_by_key(target_key='videos_duration')
+        self.meta_obj.update_meta()
+
+    def features_info(self, video_idx: int) -> dict:
+        """Сведения о фичах видео для задания compare (см. Worker.register_features)."""
+        meta_data = self.meta_obj.meta_data
+        return {'video_path': str(meta_data['remote_videos_paths'][video_idx]),
+                'features_path': meta_data['remote_features_paths'][video_idx],
+                'features_hash': meta_data['features_hash'][video_idx],
+                'duration': int(meta_data['videos_duration'][video_idx])}
+
+    def _stitch(self, video_idx: int, segments_results) -> Tuple[str, Optional[dict]]:
+        """
+        Склейка фич сегментов видео (результатов заданий extract_segment) и их выгрузка во временную папку БД.
+        Returns (Tuple[str, Optional[dict]]): Статус и результат, как у задания extract для всего видео.
+        """
+        if any(status == FAILED for status, _ in segments_results):
+            return FAILED, None
+        segments_paths = [result['features_path'] for _, result in segments_results
+                          if result['features_path'] is not None]
+        num_frames = sum(result['num_frames'] for _, result in segments_results)
+        features = stitch_segments([self.meta_obj.read_remote_features(features_path)
+                                    for features_path in segments_paths]) if segments_paths else None
+        self.meta_obj.record_features(video_idx, num_frames, features)
+        del features
+        self.meta_obj.upload_features(video_idx)
+        for features_path in segments_paths:
+            self.meta_obj.db.db_delete_file(features_path, bucket='tmp')
+        meta_data = self.meta_obj.meta_data
+        return DONE, {'duration': num_frames, 'error': num_frames == 0,
+                      'features_path': meta_data['remote_features_paths'][video_idx],
+                      'features_hash': meta_data['features_hash'][video_idx]}
+
+    def _submit_comparisons(self, window, submitted: set):
+        """
+        Создание заданий compare для всех пар (видео из окна, текущее главное видео). Задания сгруппированы по
+        главным видео, чтобы исполнители переиспользовали загруженные фичи главного видео.
+        """
+        meta_data = self.meta_obj.meta_data
+        window = list(window)
+        items = {}
+        for main_video_idx in meta_data['main_videos_in_groups_indices']:
+            for video_idx in window:
+                item_id = self.compare_item_id(video_idx, main_video_idx)
+                if item_id in submitted:
+                    continue
+                submitted.add(item_id)
+                items[item_id] = {'kind': 'compare', 'video': self.features_info(video_idx),
+                                  'main_video': self.features_info(main_video_idx)}
+        if items:
+            self.store.add_items(items)
+
+    def _resolve(self, video_idx: int) -> bool:
+        """
+        Применение результатов сравнения видео с главными видео по порядку групп (как в
+        MetaData.compare_video_to_main_videos). Мета данные обновляются, если видео распределено.
+        Returns (bool): Распределено ли видео (False, если еще не все нужные сравнения выполнены).
+        """
+        meta_data = self.meta_obj.meta_data
+        submeta = meta_data['comparison_submeta'][video_idx]
+        if not submeta['is_initialized']:
+            # все более длинные видео уже распределены, поэтому главные видео для текущего видео известны
+            init_submeta(submeta, num_main_videos=meta_data['num_groups_found'])
+        while submeta['matched_group'] == NO_GROUP and submeta['next_main_cursor'] < submeta['num_main_videos']:
+            group_idx = int(submeta['next_main_cursor'])
+            item_id = self.compare_item_id(video_idx, meta_data['main_videos_in_groups_indices'][group_idx])
+            status, result = self.store.get_results([item_id]).get(item_id, (None, None))
+            if status == FAILED:
+                # pylint: disable=logging-fstring-interpolation
+                log.error(f"Comparison {item_id} failed, videos are considered not similar.")
+                result = {'are_similar': False}
+            elif status != DONE:
+                return False
+            self.meta_obj.record_comparison(video_idx, group_idx, result['are_similar'])
+        if submeta['matched_group'] == NO_GROUP:
+            self.meta_obj.add_main_video(video_idx)
+        submeta['was_current_video_compared'] = True
+        self.meta_obj.update_meta()
+        return True
+
+    def run_comparison(self):
+        """
+        Реализация 3 этапа пайплайна: решения о группах принимаются по порядку видео, а сравнения пар
+        выполняют исполнители.
+        После завершения работы функции мета данные обновляются.
+        """
+        meta_data = self.meta_obj.meta_data
+        pending = deque()
+        for video_idx in range(meta_data['num_videos']):
+            submeta = meta_data['comparison_submeta'][video_idx]
+            if meta_data['was_video_with_error'][video_idx] or \
+                    (submeta['is_initialized'] and submeta['was_current_video_compared']):
+                continue
+            pending.append(video_idx)
+
+        submitted = set()
+        while pending:
+            self._submit_comparisons(islice(pending, self.window), submitted)
+            if self._resolve(pending[0]):
+                video_idx = pending.popleft()
+                # pylint: disable=logging-fstring-interpolation
+                log.info(f"Video {video_idx}/{meta_data['num_videos']} compared, "
+                         f"groups found: {meta_data['num_groups_found']}")
+            else:
+                time.sleep(self.poll_seconds)
@@ -0,0 +1,313 @@
+"""
+Модуль описывает хранилище заданий с арендой (lease): исполнитель берет задание в аренду на ограниченное время
+и продлевает аренду (heartbeat), пока выполняет его. Если исполнитель упал, аренда истекает и задание снова
+выдается другому исполнителю. Все задания идемпотентны (повторное выполнение дает тот же результат), поэтому
+повторная выдача задания безопасна.
+
+Реализации:
+    SQLiteLeaseStore - файл SQLite (для одной машины и для проверки без сервера).
+    MinioLeaseStore - объекты с состоянием заданий в БД Minio (для нескольких машин).
+"""
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class LeaseStore(ABC):
+    """
+    Интерфейс хранилища заданий с арендой. Задание состоит из идентификатора и описания (payload, dict).
+    """
+
+    @abstractmethod
+    def add_items(self, items: Dict[str, dict]):
+        """
+        Добавление заданий (уже существующие задания не изменяются).
+        Args:
+            items (Dict[str, dict]): Описания заданий по их идентификаторам.
+        """
+
+    @abstractmethod
+    def acquire(self, worker_id: str, lease_seconds: float) -> Optional[Tuple[str, dict]]:
+        """
+        Аренда первого свободного задания (новое или задание с истекшей арендой).
+        Args:
+            worker_id (str): Идентификатор исполнителя.
+            lease_seconds (float): Время аренды в секундах.
+        Returns:
+            item (Optional[Tuple[str, dict]]): Идентификатор и описание задания (None, если свободных заданий нет).
+        """
+
+    @abstractmethod
+    def renew(self, item_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Продление аренды задания (heartbeat).
+        Args:
+            item_id (str): Идентификатор задания.
+            worker_id (str): Идентификатор исполнителя.
+            lease_seconds (float): Время аренды в секундах (от текущего момента).
+        Returns (bool): Продлена ли аренда (False, если задание уже выдано другому исполнителю или выполнено).
+        """
+
+    @abstractmethod
+    def complete(self, item_id: str, worker_id: str, result: dict):
+        """
+        Сохранение результата задания. Если задание уже выполнено, то результат не перезаписывается.
+        Args:
+            item_id (str): Идентификатор задания.
+            worker_id (str): Идентификатор исполнителя.
+            result (dict): Результат задания.
+        """
+
+    @abstractmethod
+    def fail(self, item_id: str, worker_id: str, error: str, max_attempts: int):
+        """
+        Возврат задания после ошибки: задание снова становится свободным, а после max_attempts попыток
+        помечается как невыполнимое.
+        Args:
+            item_id (str): Идентификатор задания.
+            worker_id (str): Идентификатор исполнителя.
+            error (str): Описание ошибки.
+            max_attempts (int): Максимальное количество попыток.
+        """
+
+    @abstractmethod
+    def get_results(self, item_ids: List[str]) -> Dict[str, Tuple[str, Optional[dict]]]:
+        """
+        Args:
+            item_ids (List[str]): Идентификаторы заданий.
+        Returns:
+            results (Dict[str, Tuple[str, Optional[dict]]]): Статус (pending, leased, done, failed) и результат
+                                                            (или {'error': ...} для failed) каждого задания.
+        """
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    Хранилище заданий в файле SQLite. Несколько процессов на одной машине могут работать с одним файлом
+    (аренда выполняется в транзакции BEGIN IMMEDIATE).
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path (str): Путь до файла SQLite.
+        """
+        self.lock = threading.Lock()  # соединение используется и потоком heartbeat
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS items ("
+                                "item_id TEXT PRIMARY KEY, payload TEXT, status TEXT, worker_id TEXT, "
+                                "expires_at REAL, attempts INTEGER, result TEXT)")
+
+    def add_items(self, items: Dict[str, dict]):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT OR IGNORE INTO items VALUES (?, ?, ?, NULL, 0, 0, NULL)",
+                                        [(item_id, json.dumps(payload), PENDING) for item_id, payload in items.items()])
+            self.connection.execute("COMMIT")
+
+    def acquire(self, worker_id: str, lease_seconds: float) -> Optional[Tuple[str, dict]]:
+        with self.lock:
+            now = time.time()
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute("SELECT item_id, payload FROM items WHERE status = ? OR "
+                                          "(status = ? AND expires_at < ?) ORDER BY rowid LIMIT 1",
+                                          (PENDING, LEASED, now)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE items SET status = ?, worker_id = ?, expires_at = ? WHERE item_id = ?",
+                                        (LEASED, worker_id, now + lease_seconds, row[0]))
+            self.connection.execute("COMMIT")
+            return None if row is None else (row[0], json.loads(row[1]))
+
+    def renew(self, item_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self.lock:
+            cursor = self.connection.execute("UPDATE items SET expires_at = ? WHERE item_id = ? AND worker_id = ? "
+                                             "AND status = ?",
+                                             (time.time() + lease_seconds, item_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+
+    def complete(self, item_id: str, worker_id: str, result: dict):
+        with self.lock:
+            self.connection.execute("UPDATE items SET status = ?, worker_id = ?, result = ? WHERE item_id = ? "
+                                    "AND status != ?", (DONE, worker_id, json.dumps(result), item_id, DONE))
+
+    def fail(self, item_id: str, worker_id: str, error: str, max_attempts: int):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute("SELECT attempts, status FROM items WHERE item_id = ?", (item_id,)).fetchone()
+            if row is not None and row[1] != DONE:
+                attempts = row[0] + 1
+                status = FAILED if attempts >= max_attempts else PENDING
+                self.connection.execute("UPDATE items SET status = ?, worker_id = ?, attempts = ?, result = ? "
+                                        "WHERE item_id = ?",
+                                        (status, worker_id, attempts, json.dumps({'error': error}), item_id))
+            self.connection.execute("COMMIT")
+
+    def get_results(self, item_ids: List[str]) -> Dict[str, Tuple[str, Optional[dict]]]:
+        with self.lock:
+            results = {}
+            for item_id in item_ids:
+                row = self.connection.execute("SELECT status, result FROM items WHERE item_id = ?",
+                                              (item_id,)).fetchone()
+                if row is not None:
+                    results[item_id] = (row[0], json.loads(row[1]) if row[1] is not None else None)
+            return results
+
+
+class MinioLeaseStore(LeaseStore):
+    """
+    Хранилище заданий в БД Minio: состояние каждого задания хранится в отдельном json объекте (prefix/items/),
+    а для каждого еще не выполненного задания есть пустой объект-метка (prefix/pending/), поэтому при аренде
+    перебираются только невыполненные задания, а не все когда-либо созданные.
+    Minio не поддерживает атомарное сравнение с заменой, поэтому после записи аренды исполнитель перечитывает
+    объект и считает аренду своей, только если его запись не была перезаписана. В редких случаях одно задание
+    может быть выполнено двумя исполнителями, что безопасно, так как задания идемпотентны.
+    """
+
+    def __init__(self, client, bucket_name: str, prefix: str = 'leases', confirm_delay: float = 0.5):
+        """
+        Args:
+            client (Minio): Клиент БД Minio (например, MinioDB.client).
+            bucket_name (str): Название папки в БД для объектов с состоянием заданий.
+            prefix (str): Префикс объектов с состоянием заданий.
+            confirm_delay (float): Задержка в секундах перед проверкой, что аренда не перехвачена.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.confirm_delay = confirm_delay
+        if not self.client.bucket_exists(self.bucket_name):
+            self.client.make_bucket(self.bucket_name)
+
+    @staticmethod
+    def _digest(item_id: str) -> str:
+        """Ключ задания в именах объектов (идентификаторы заданий могут содержать любые символы)."""
+        return hashlib.sha1(item_id.encode('utf8')).hexdigest()
+
+    def _object_name(self, digest: str) -> str:
+        """Имя объекта с состоянием задания."""
+        return f"{self.prefix}/items/{digest}.json"
+
+    def _pending_name(self, digest: str) -> str:
+        """Имя объекта-метки невыполненного задания."""
+        return f"{self.prefix}/pending/{digest}"
+
+    def _mark_pending(self, item_id: str):
+        """Добавление метки невыполненного задания."""
+        self.client.put_object(self.bucket_name, self._pending_name(self._digest(item_id)), io.BytesIO(b''), 0)
+
+    def _unmark_pending(self, digest: str):
+        """Удаление метки задания (задание выполнено или невыполнимо)."""
+        self.client.remove_object(self.bucket_name, self._pending_name(digest))
+
+    def _read(self, item_id: str) -> Optional[dict]:
+        """Чтение состояния задания (None, если задания нет)."""
+        return self._read_object(self._object_name(self._digest(item_id)))
+
+    def _read_object(self, object_name: str) -> Optional[dict]:
+        """Чтение состояния задания по имени объекта (None, если задания нет)."""
+        # pylint: disable=import-outside-toplevel
+        from minio.error import S3Error
+        try:
+            response = self.client.get_object(self.bucket_name, object_name)
+        except S3Error as error:
+            if error.code == 'NoSuchKey':
+                return None
+            raise
+        try:
+            return json.loads(response.read().decode('utf8'))
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _write(self, state: dict):
+        """Запись состояния задания."""
+        data = json.dumps(state).encode('utf8')
+        self.client.put_object(self.bucket_name, self._object_name(self._digest(state['item_id'])), io.BytesIO(data),
+                               len(data), content_type='application/json')
+
+    def add_items(self, items: Dict[str, dict]):
+        for item_id, payload in items.items():
+            if self._read(item_id) is None:
+                self._write({'item_id': item_id, 'payload': payload, 'status': PENDING, 'worker_id': None,
+                             'expires_at': 0, 'attempts': 0, 'result': None})
+                self._mark_pending(item_id)
+
+    def acquire(self, worker_id: str, lease_seconds: float) -> Optional[Tuple[str, dict]]:
+        for obj in self.client.list_objects(self.bucket_name, prefix=self.prefix + '/pending/', recursive=True):
+            digest = obj.object_name.rsplit('/', 1)[-1]
+            state = self._read_object(self._object_name(digest))
+            if state is None or state['status'] in (DONE, FAILED):
+                # метка осталась после сбоя между записью состояния и ее удалением
+                self._unmark_pending(digest)
+                continue
+            now = time.time()
+            if state['status'] == PENDING or (state['status'] == LEASED and state['expires_at'] < now):
+                state.update(status=LEASED, worker_id=worker_id, expires_at=now + lease_seconds)
+                self._write(state)
+                time.sleep(self.confirm_delay)
+                confirmed = self._read(state['item_id'])
+                if confirmed is not None and confirmed['worker_id'] == worker_id and confirmed['status'] == LEASED:
+                    return state['item_id'], state['payload']
+        return None
+
+    def renew(self, item_id: str, worker_id: str, lease_seconds: float) -> bool:
+        state = self._read(item_id)
+        if state is None or state['worker_id'] != worker_id or state['status'] != LEASED:
+            return False
+        state['expires_at'] = time.time() + lease_seconds
+        self._write(state)
+        return True
+
+    def complete(self, item_id: str, worker_id: str, result: dict):
+        state = self._read(item_id)
+        if state is None or state['status'] == DONE:
+            return
+        state.update(status=DONE, worker_id=worker_id, result=result)
+        self._write(state)
+        self._unmark_pending(self._digest(item_id))
+
+    def fail(self, item_id: str, worker_id: str, error: str, max_attempts: int):
+        state = self._read(item_id)
+        if state is None or state['status'] == DONE:
+            return
+        state['attempts'] += 1
+        state.update(status=FAILED if state['attempts'] >= max_attempts else PENDING, worker_id=worker_id,
+                     result={'error': error})
+        self._write(state)
+        if state['status'] == FAILED:
+            self._unmark_pending(self._digest(item_id))
+
+    def get_results(self, item_ids: List[str]) -> Dict[str, Tuple[str, Optional[dict]]]:
+        results = {}
+        for item_id in item_ids:
+            state = self._read(item_id)
+            if state is not None:
+                results[item_id] = (state['status'], state['result'])
+        return results
+
+
+def get_lease_store(store_type: str, location: str, db=None) -> LeaseStore:
+    """
+    Создание хранилища заданий нужного типа.
+    Args:
+        store_type (str): Тип хранилища заданий (sqlite - файл SQLite, minio - объекты в БД Minio).
+        location (str): Путь до файла SQLite или название папки в БД Minio.
+        db (Optional[MinioDB]): БД Minio (нужна для типа minio).
+    Returns:
+        store (LeaseStore): Хранилище заданий.
+    """
+    if store_type == 'sqlite':
+        return SQLiteLeaseStore(location)
+    if store_type == 'minio':
+        return MinioLeaseStore(db.client, location)
+    raise NameError(f"Lease store type {store_type} doesn't exist!")
@@ -0,0 +1,241 @@
+"""
+Модуль описывает исполнителя заданий распределенного режима. Исполнитель берет задания в аренду из общего
+хранилища заданий (см. distributed/lease.py), продлевает аренду, пока выполняет задание, и сохраняет результат.
+
+Виды заданий (идентификаторы и описания создает distributed/coordinator.py):
+    extract - 1 этап пайплайна для одного видео (скачивание, вытягивание фич и их выгрузка во временную папку БД).
+    extract_segment - вытягивание фич из одного сегмента длинного видео (видео не скачивается, а считывается по
+                      временной ссылке со своей точки перемотки) и их выгрузка во временную папку БД; фичи
+                      сегментов склеивает координатор (см. video/segments.py).
+    compare - сравнение фич пары (видео, главное видео) из временной папки БД тем же способом, что и на одной машине
+              (MetaData.compare_features: хранилище оценок схожести, отсечение кропов и временной индекс).
+"""
+import os
+import uuid
+import socket
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Optional
+
+from distributed.lease import LeaseStore  # pylint: disable=import-error
+from meta.placement import FeaturePlacement  # pylint: disable=import-error
+from utils.compression import save_features  # pylint: disable=import-error
+from utils.manipulate_data import load_video as read_video  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Поток, продлевающий аренду задания, пока оно выполняется.
+    """
+
+    def __init__(self, store: LeaseStore, item_id: str, worker_id: str, lease_seconds: float,
+                 heartbeat_seconds: float):
+        super().__init__(name='heartbeat', daemon=True)
+        self.store = store
+        self.item_id = item_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stopped = threading.Event()
+        self.was_lease_lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.heartbeat_seconds):
+            if not self.store.renew(self.item_id, self.worker_id, self.lease_seconds):
+                # задание выдано другому исполнителю: результат все равно можно сохранить (задания идемпотентны)
+                log.warning(f"Lease of {self.item_id} was lost.")  # pylint: disable=logging-fstring-interpolation
+                self.was_lease_lost = True
+                return
+
+    def stop(self):
+        """Остановка потока."""
+        self.stopped.set()
+        self.join()
+
+
+# pylint: disable=too-many-arguments, too-many-instance-attributes
+class Worker:
+    """
+    Исполнитель заданий распределенного режима. Использует собственный объект MetaData (со своими локальными
+    мета данными, моделью и доступом к БД). Фичи должны выгружаться во временную папку БД, так как их читают
+    другие исполнители.
+    """
+
+    def __init__(self, meta_obj, store: LeaseStore, worker_id: Optional[str] = None, lease_seconds: float = 300,
+                 heartbeat_seconds: float = 60, max_attempts: int = 3, num_cached_main_videos: int = 2):
+        """
+        Args:
+            meta_obj (MetaData): Объект MetaData исполнителя.
+            store (LeaseStore): Хранилище заданий.
+            worker_id (Optional[str]): Идентификатор исполнителя (по умолчанию имя хоста, pid и случайный суффикс).
+            lease_seconds (float): Время аренды задания в секундах.
+            heartbeat_seconds (float): Период продления аренды в секундах (должен быть меньше lease_seconds).
+            max_attempts (int): Максимальное количество попыток выполнения задания.
+            num_cached_main_videos (int): Количество главных видео, фичи которых хранятся в памяти между заданиями
+                                          (задания compare создаются сгруппированными по главным видео).
+        """
+        if not FeaturePlacement.upload_on_extract(meta_obj.feature_placement):
+            raise ValueError("Features must be uploaded to db in distributed mode!")
+        if heartbeat_seconds >= lease_seconds:
+            raise ValueError("heartbeat_seconds must be less than lease_seconds!")
+        self.meta_obj = meta_obj
+        self.store = store
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.num_cached_main_videos = num_cached_main_videos
+        self.main_videos_features = OrderedDict()
+        self.video_indices = {str(video_path): video_idx
+                              for video_idx, video_path in enumerate(meta_obj.meta_data['remote_videos_paths'])}
+
+    def run(self, stop_when_empty: bool = True, idle_seconds: float = 5) -> int:
+        """
+        Выполнение заданий, пока они есть.
+        Args:
+            stop_when_empty (bool): Завершить работу, когда свободных заданий не осталось
+                                    (иначе ждать новых заданий idle_seconds секунд и проверять снова).
+            idle_seconds (float): Время ожидания новых заданий в секундах.
+        Returns (int): Количество выполненных заданий.
+        """
+        num_done = 0
+        while True:
+            item = self.store.acquire(self.worker_id, self.lease_seconds)
+            if item is None:
+                if stop_when_empty:
+                    return num_done
+                threading.Event().wait(idle_seconds)
+                continue
+            item_id, payload = item
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Worker {self.worker_id} acquired {item_id}")
+            heartbeat = _Heartbeat(self.store, item_id, self.worker_id, self.lease_seconds, self.heartbeat_seconds)
+            heartbeat.start()
+            try:
+                result = self.execute(payload)
+            except Exception:  # pylint: disable=broad-except
+                heartbeat.stop()
+                log.exception(f"Item {item_id} failed.")  # pylint: disable=logging-fstring-interpolation
+                self.store.fail(item_id, self.worker_id, traceback.format_exc(), self.max_attempts)
+                continue
+            heartbeat.stop()
+            self.store.complete(item_id, self.worker_id, result)
+            num_done += 1
+
+    def execute(self, payload: dict) -> dict:
+        """
+        Выполнение задания.
+        Args:
+            payload (dict): Описание задания.
+        Returns (dict): Результат задания.
+        """
+        if payload['kind'] == 'extract':
+            return self.extract(payload['video_path'])
+        if payload['kind'] == 'extract_segment':
+            return self.extract_segment(payload['video_path'], payload['segment_idx'], payload['start'],
+                                        payload['end'])
+        if payload['kind'] == 'compare':
+            return self.compare(payload['video'], payload['main_video'])
+        raise NameError(f"Item kind {payload['kind']} doesn't exist!")
+
+    def extract(self, video_path: str) -> dict:
+        """
+        1 этап пайплайна для одного видео.
+        Args:
+            video_path (str): Путь до видео в БД.
+        Returns:
+            result (dict): Длительность видео (duration), была ли ошибка при чтении видео (error), путь до фич
+                           во временной папке БД (features_path) и их хэш (features_hash).
+        """
+        video_idx = self.video_indices[video_path]
+        self.meta_obj.process_video(video_idx)
+        meta_data = self.meta_obj.meta_data
+        return {'duration': int(meta_data['videos_duration'][video_idx]),
+                'error': bool(meta_data['was_video_with_error'][video_idx]),
+                'features_path': meta_data['remote_features_paths'][video_idx],
+                'features_hash': meta_data['features_hash'][video_idx]}
+
+    def extract_segment(self, video_path: str, segment_idx: int, start: int, end: Optional[int]) -> dict:
+        """
+        Вытягивание фич из одного сегмента видео.
+        Args:
+            video_path (str): Путь до видео в БД.
+            segment_idx (int): Номер сегмента.
+            start (int): Начало сегмента в секундах.
+            end (Optional[int]): Конец сегмента в секундах (не включительно, None - до конца видео).
+        Returns:
+            result (dict): Количество считанных кадров (num_frames) и путь до фич сегмента во временной папке БД
+                           (features_path, None, если не считано ни одного кадра).
+        """
+        meta_obj = self.meta_obj
+        video_idx = self.video_indices[video_path]
+        video_data = read_video(meta_obj.db.db_get_url(video_path), start=start, end=end,
+                                num_threads=meta_obj.decode_threads)
+        num_frames = video_data.shape[0]
+        if num_frames == 0:
+            return {'num_frames': 0, 'features_path': None}
+        # у коротких сегментов фичи повторяются (см. ViSiL.extract_features), лишнее отрезается
+        features = meta_obj.model.extract_features(video_data, batch_sz=meta_obj.extraction_batch_size(num_frames))
+        del video_data
+        features_path = meta_obj.features_filename(video_idx, suffix=f"_segment{segment_idx}")
+        local_path = os.path.join(str(meta_obj.local_download_path), features_path)
+        save_features(features[:num_frames], local_path, codec=meta_obj.feature_codec, shuffle=meta_obj.feature_shuffle)
+        meta_obj.db.db_put_file(local_path, keep_local=False, metadata=meta_obj.features_metadata())
+        return {'num_frames': num_frames, 'features_path': features_path}
+
+    def register_features(self, video: dict) -> int:
+        """
+        Запись в мета данные исполнителя сведений о фичах видео, вытянутых другим исполнителем.
+        Args:
+            video (dict): Путь до видео в БД (video_path), путь до его фич во временной папке БД (features_path),
+                          их хэш (features_hash) и длительность видео (duration).
+        Returns (int): Индекс видео из списка в мета данных.
+        """
+        video_idx = self.video_indices[video['video_path']]
+        meta_data = self.meta_obj.meta_data
+        if not meta_data['are_features_remote'][video_idx]:
+            meta_data['remote_features_paths'][video_idx] = video['features_path']
+            meta_data['local_features_paths'][video_idx] = os.path.join(str(self.meta_obj.local_download_path),
+                                                                        video['features_path'])
+            meta_data['videos_duration'][video_idx] = video['duration']
+            meta_data['features_hash'][video_idx] = video['features_hash']
+            meta_data['are_features_remote'][video_idx] = True
+        return video_idx
+
+    def main_video_features(self, main_video_idx: int):
+        """
+        Args:
+            main_video_idx (int): Индекс главного видео из списка в мета данных.
+        Returns (np.ndarray): Фичи главного видео (из памяти, если они уже загружались для предыдущих заданий).
+        """
+        if main_video_idx in self.main_videos_features:
+            self.main_videos_features.move_to_end(main_video_idx)
+        else:
+            self.main_videos_features[main_video_idx] = self.meta_obj.load_video_features(main_video_idx)
+            if len(self.main_videos_features) > self.num_cached_main_videos:
+                self.main_videos_features.popitem(last=False)
+        return self.main_videos_features[main_video_idx]
+
+    def compare(self, video: dict, main_video: dict) -> dict:
+        """
+        Сравнение фич пары (видео, главное видео) из временной папки БД (подробнее тут meta/meta.py
+        MetaData.compare_features). Фичи читаются, только если решения о паре нет в хранилище оценок схожести.
+        Args:
+            video (dict): Сведения о фичах видео (см. Worker.register_features).
+            main_video (dict): Сведения о фичах главного видео (см. Worker.register_features).
+        Returns:
+            result (dict): Результат сравнения (are_similar и max_similarity).
+        """
+        video_idx = self.register_features(video)
+        main_video_idx = self.register_features(main_video)
+        comparison_result = self.meta_obj.cached_comparison(video_idx, main_video_idx)
+        if comparison_result is None:
+            comparison_result = self.meta_obj.compare_features(video_idx, main_video_idx,
+                                                               self.meta_obj.load_video_features(video_idx),
+                                                               self.main_video_features(main_video_idx))
+        return {'are_similar': bool(comparison_result['are_similar']),
+                'max_similarity': float(comparison_result['max_similarity'])}
@@ -1,6 +1,7 @@
 def main():
     import os
     from meta.meta import MetaData
+    from meta.pipelined import run_pipelined
     from utils.pretty_output import output_prettifier
 
     local_save_path = "saved_data/"
@@ -17,8 +18,18 @@ def main():
                         path_to_model=model_path,
                         local_data_save_path=local_save_path)
 
-    meta_obj.preprocessing()
-    meta_obj.compare_videos()
+    pipelined = False  # вытягивание фич и сравнение видео одновременно (см. meta/pipelined.py)
+    export_frozen = False  # однократный экспорт замороженных графов перед работой (см. model/export.py)
+
+    if export_frozen and not meta_obj.model.frozen_graphs_exported:
+        meta_obj.model.export_frozen_graphs()
+
+    if pipelined:
+        run_pipelined(meta_obj)
+    else:
+        meta_obj.probe_videos()
+        meta_obj.preprocessing()
+        meta_obj.compare_videos()
     output_prettifier(os.path.join(logs_path, target_log_name))
 
 
@@ -26,8 +37,5 @@ if __name__ == '__main__':
     from utils.logger import LOGGING_CONFIG
     from logging.config import dictConfig
 
-    # from utils.bug_fixes import fix_download_bug  # for restarting from checkpoint 
-    # fix_download_bug()
-
     dictConfig(LOGGING_CONFIG)
     main()
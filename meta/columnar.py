@@ -0,0 +1,259 @@
+"""
+Модуль, описывающий колоночное представление мета данных: флаги хранятся в numpy массивах (на диске - в битовых
+масках), длительности и другие числовые характеристики видео - в массивах int64 и float32, а пути, названия
+файлов и кодеки - в общей таблице интернированных строк. Это позволяет держать в памяти мета данные для миллионов видео.
+"""
+import os
+import struct
+from typing import List, Optional, Iterator
+
+import numpy as np
+
+from meta.submeta import init_submeta_table, submeta_from_legacy, upgrade_submeta_table  # pylint: disable=import-error
+
+FLAG_COLUMNS = ('was_video_downloaded', 'was_video_read', 'were_features_extracted', 'were_features_uploaded',
+                'are_features_remote', 'was_video_with_error', 'was_video_probed')
+INT_COLUMNS = ('videos_duration', 'probed_videos_duration', 'videos_width', 'videos_height')
+FLOAT_COLUMNS = ('videos_fps',)
+STRING_COLUMNS = ('remote_videos_paths', 'local_videos_paths', 'remote_features_paths', 'local_features_paths',
+                  'videos_filenames', 'videos_filenames_w_extensions', 'videos_codec', 'features_hash')
+RECORD_COLUMNS = ('comparison_submeta',)
+
+MISSING = -1  # значение в INT_COLUMNS и в индексах строк, соответствующее None (в FLOAT_COLUMNS - nan)
+
+
+class StringTable:
+    """
+    Таблица интернированных строк: каждая строка хранится один раз, а столбцы хранят ее индекс.
+    """
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = []
+        self.ids = {}
+        for string in strings or []:
+            self.intern(string)
+
+    def intern(self, string: Optional[str]) -> int:
+        """
+        Args:
+            string (Optional[str]): Строка.
+        Returns (int): Индекс строки в таблице (MISSING для None).
+        """
+        if string is None:
+            return MISSING
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+    def get(self, string_id: int) -> Optional[str]:
+        """
+        Args:
+            string_id (int): Индекс строки в таблице.
+        Returns (Optional[str]): Строка (None для MISSING).
+        """
+        return None if string_id == MISSING else self.strings[string_id]
+
+    def to_bytes(self) -> bytes:
+        """
+        Компактное представление таблицы: количество строк (uint32) и строки, разделенные нулевым байтом
+        (количество нужно, чтобы отличить пустую таблицу от таблицы из одной пустой строки).
+        """
+        return struct.pack('<I', len(self.strings)) + b'\0'.join(string.encode('utf8') for string in self.strings)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'StringTable':
+        """Восстановление таблицы из to_bytes."""
+        num_strings = struct.unpack('<I', data[:4])[0]
+        return StringTable([string.decode('utf8') for string in data[4:].split(b'\0')] if num_strings else [])
+
+
+class StringColumn:
+    """
+    Столбец строк (или None), хранящий индексы строк в общей таблице StringTable.
+    Поддерживает чтение и запись по индексу, len и итерацию, как список.
+    """
+
+    def __init__(self, table: StringTable, ids: np.ndarray):
+        self.table = table
+        self.ids = ids
+
+    def __getitem__(self, idx: int) -> Optional[str]:
+        return self.table.get(int(self.ids[idx]))
+
+    def __setitem__(self, idx: int, value: Optional[str]):
+        self.ids[idx] = self.table.intern(value)
+
+    def __len__(self) -> int:
+        return self.ids.shape[0]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for string_id in self.ids:
+            yield self.table.get(int(string_id))
+
+    def to_list(self) -> List[Optional[str]]:
+        """Столбец в виде списка строк."""
+        return list(self)
+
+
+class ColumnarMeta:
+    """
+    Колоночные мета данные. Доступ к полям такой же, как к словарю meta_data (см. meta/meta.py):
+    meta_data['was_video_read'][idx], meta_data['remote_videos_paths'][idx], meta_data['num_groups_found'] и т.д.
+    Состояния сравнения видео с главными видео хранятся в массиве записей (см. meta/submeta.py).
+    Поля, не относящиеся к отдельным видео (группы, число групп и т.п.), хранятся как есть.
+    """
+
+    def __init__(self, num_videos: int):
+        self.num_videos = num_videos
+        self.table = StringTable()
+        self.columns = {key: self._empty_column(key)
+                        for key in FLAG_COLUMNS + INT_COLUMNS + FLOAT_COLUMNS + STRING_COLUMNS + RECORD_COLUMNS}
+        self.extras = {}
+
+    def _empty_column(self, key: str):
+        """
+        Args:
+            key (str): Название столбца.
+        Returns: Столбец, в котором ни одно значение еще не заполнено.
+        """
+        if key in FLAG_COLUMNS:
+            return np.zeros(self.num_videos, dtype=bool)
+        if key in INT_COLUMNS:
+            return np.full(self.num_videos, MISSING, dtype=np.int64)
+        if key in FLOAT_COLUMNS:
+            return np.full(self.num_videos, np.nan, dtype=np.float32)
+        if key in STRING_COLUMNS:
+            return StringColumn(self.table, np.full(self.num_videos, MISSING, dtype=np.int32))
+        return init_submeta_table(self.num_videos)
+
+    @staticmethod
+    def from_remote_paths(remote_videos_paths: List[str]) -> 'ColumnarMeta':
+        """
+        Создание мета данных для списка видео из БД.
+        Args:
+            remote_videos_paths (List[str]): Пути до каждого видео внутри БД.
+        Returns (ColumnarMeta): Мета данные.
+        """
+        meta_data = ColumnarMeta(len(remote_videos_paths))
+        for video_idx, video_path in enumerate(remote_videos_paths):
+            filename = os.path.split(video_path)[-1]
+            meta_data['remote_videos_paths'][video_idx] = video_path
+            meta_data['videos_filenames'][video_idx] = filename.split('.')[0]
+            meta_data['videos_filenames_w_extensions'][video_idx] = filename
+        meta_data['num_groups_found'] = 0
+        meta_data['main_videos_in_groups_indices'] = []
+        meta_data['main_videos_in_groups_videos_paths'] = []
+        meta_data['groups_content_video_paths'] = []
+        return meta_data
+
+    @staticmethod
+    def from_dict(meta_dict: dict) -> 'ColumnarMeta':
+        """
+        Перевод мета данных из словаря параллельных списков (формат предыдущих версий) в колоночный формат.
+        Args:
+            meta_dict (dict): Мета данные в виде словаря.
+        Returns (ColumnarMeta): Мета данные.
+        """
+        meta_data = ColumnarMeta(meta_dict['num_videos'])
+        for key, value in meta_dict.items():
+            if key != 'num_videos':
+                meta_data[key] = value
+        if 'are_features_remote' not in meta_dict:
+            # мета данные, созданные до появления политики размещения фич: все фичи выгружались в БД
+            meta_data['are_features_remote'] = meta_data['were_features_uploaded'].copy()
+        return meta_data
+
+    def __getitem__(self, key: str):
+        if key == 'num_videos':
+            return self.num_videos
+        if key in self.columns:
+            return self.columns[key]
+        return self.extras[key]
+
+    def __setitem__(self, key: str, value):
+        if key == 'num_videos':
+            raise KeyError("num_videos can't be changed")
+        if key in FLAG_COLUMNS:
+            # в старых мета данных вместо списка мог оказаться один bool
+            self.columns[key] = np.array(value, dtype=bool) if isinstance(value, (list, np.ndarray)) \
+                else np.full(self.num_videos, bool(value))
+        elif key in INT_COLUMNS:
+            self.columns[key] = np.array([MISSING if item is None else item for item in value], dtype=np.int64)
+        elif key in FLOAT_COLUMNS:
+            self.columns[key] = np.array([np.nan if item is None else item for item in value], dtype=np.float32)
+        elif key in STRING_COLUMNS:
+            self.columns[key] = StringColumn(self.table, np.array([self.table.intern(item) for item in value],
+                                                                  dtype=np.int32))
+        elif key in RECORD_COLUMNS:
+            # в старых мета данных состояния сравнения хранились списком словарей
+            self.columns[key] = upgrade_submeta_table(value) if isinstance(value, np.ndarray) \
+                else submeta_from_legacy(value)
+        else:
+            self.extras[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key == 'num_videos' or key in self.columns or key in self.extras
+
+    def keys(self) -> List[str]:
+        """Список всех полей мета данных."""
+        return ['num_videos'] + list(self.columns) + list(self.extras)
+
+    def reorder(self, order: np.ndarray):
+        """
+        Перестановка всех столбцов, относящихся к видео.
+        Args:
+            order (np.ndarray): Новый порядок индексов видео.
+        """
+        for key, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                column.ids = column.ids[order]
+            else:
+                self.columns[key] = column[order]
+
+    def sort_by_key(self, target_key: str, reverse: bool = True):
+        """
+        Сортировка всех столбцов по значению столбца target_key за O(N log N) (argsort).
+        При равенстве значений порядок определяется путем видео в БД (как и при прежней сортировке словаря мета
+        данных, где следующими по порядку сравниваются флаги, совпадающие после 1 этапа, и пути видео).
+        Args:
+            target_key (str): Название столбца, по которому выполняется сортировка.
+            reverse (bool): Сортировать ли по убыванию.
+        """
+        path_ids = self.columns['remote_videos_paths'].ids
+        path_ranks = np.empty(self.num_videos, dtype=np.int64)
+        path_ranks[sorted(range(self.num_videos), key=lambda idx: self.table.strings[path_ids[idx]])] = \
+            np.arange(self.num_videos)
+        order = np.lexsort((path_ranks, np.asarray(self.columns[target_key])))
+        if reverse:
+            order = order[::-1]
+        self.reorder(order)
+
+    def __getstate__(self) -> dict:
+        """Компактное представление для сохранения на диск: флаги упаковываются в битовые маски."""
+        return {'num_videos': self.num_videos,
+                'strings': self.table.to_bytes(),
+                'flags': {key: np.packbits(self.columns[key]) for key in FLAG_COLUMNS},
+                'ints': {key: self.columns[key] for key in INT_COLUMNS + FLOAT_COLUMNS},
+                'string_ids': {key: self.columns[key].ids for key in STRING_COLUMNS},
+                'records': {key: self.columns[key] for key in RECORD_COLUMNS},
+                'extras': self.extras}
+
+    def __setstate__(self, state: dict):
+        self.num_videos = state['num_videos']
+        self.table = StringTable.from_bytes(state['strings'])
+        self.columns = {}
+        for key, packed in state['flags'].items():
+            self.columns[key] = np.unpackbits(packed)[:self.num_videos].astype(bool)
+        self.columns.update(state['ints'])
+        for key, ids in state['string_ids'].items():
+            self.columns[key] = StringColumn(self.table, ids)
+        for key, records in state['records'].items():
+            self.columns[key] = upgrade_submeta_table(records)
+        self.extras = state['extras']
+        for key in FLAG_COLUMNS + INT_COLUMNS + FLOAT_COLUMNS + STRING_COLUMNS + RECORD_COLUMNS:
+            if key not in self.columns:
+                # столбцы, появившиеся после сохранения мета данных
+                self.columns[key] = self._empty_column(key)
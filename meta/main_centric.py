@@ -0,0 +1,168 @@
+"""
+Модуль описывает альтернативный порядок 3 этапа пайплайна (подробнее тут meta/meta.py MetaData), организованный
+вокруг главных видео: берется батч еще не сравненных видео, фичи каждого главного видео загружаются один раз и
+сравниваются со всеми видео из батча. Результат группировки совпадает с MetaData.compare_videos.
+"""
+import os
+import logging
+from typing import List
+
+import numpy as np
+
+from meta.submeta import init_submeta, NO_GROUP  # pylint: disable=import-error
+from utils.compression import load_features  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def extend_submeta(meta_obj, video_idx: int):
+    """
+    Функция инициализирует структуру для отслеживания сравнения видео с главными видео или дополняет ее
+    главными видео, появившимися после ее создания.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        video_idx (int): Индекс видео из списка в мета данных.
+    """
+    submeta = meta_obj.meta_data['comparison_submeta'][video_idx]
+    if not submeta['is_initialized']:
+        init_submeta(submeta, num_main_videos=meta_obj.meta_data['num_groups_found'])
+    else:
+        submeta['num_main_videos'] = meta_obj.meta_data['num_groups_found']
+
+
+def load_batch_video_features(meta_obj, video_idx: int) -> np.ndarray:
+    """
+    Функция загружает фичи видео из батча (см. compare_batch_to_main_videos): при первом обращении они
+    скачиваются на локальный диск и хранятся там, пока видео не распределено по группам.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        video_idx (int): Индекс видео из списка в мета данных.
+    Returns:
+        features (np.ndarray): Фичи видео.
+    """
+    local_path = str(meta_obj.meta_data['local_features_paths'][video_idx])
+    if not os.path.exists(local_path):
+        meta_obj.fetch_features(video_idx)
+        meta_obj.meta_data['comparison_submeta'][video_idx]['was_current_video_downloaded'] = True
+    return load_features(local_path)
+
+
+def compare_batch_to_main_video(meta_obj, batch: List[int], group_idx: int) -> List[int]:
+    """
+    Функция сравнивает фичи одного главного видео со всеми видео из батча, которые с ним еще не сравнивались.
+    Фичи загружаются, только если решения о паре нет в хранилище оценок схожести: фичи главного видео -
+    в память один раз, фичи видео батча - с локального диска (см. load_batch_video_features).
+    После каждого сравнения мета данные обновляются.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        batch (List[int]): Индексы еще не распределенных по группам видео из списка в мета данных
+                           (в порядке убывания длительности).
+        group_idx (int): Индекс группы, с которой соотносится главное видео.
+    Returns:
+        matched (List[int]): Индексы видео из батча, попавших в группу главного видео.
+    """
+    meta_data = meta_obj.meta_data
+    main_video_idx = meta_data['main_videos_in_groups_indices'][group_idx]
+    candidates = [video_idx for video_idx in batch
+                  if meta_data['comparison_submeta'][video_idx]['next_main_cursor'] == group_idx]
+    if not candidates:
+        return []
+
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"\tComparing main video {group_idx}/{meta_data['num_groups_found']} "
+             f"with {len(candidates)} videos...")
+    main_video_features = None
+    matched = []
+    for video_idx in candidates:
+        submeta = meta_data['comparison_submeta'][video_idx]
+        comparison_result = meta_obj.cached_comparison(video_idx, main_video_idx)
+        if comparison_result is None:
+            if main_video_features is None:
+                main_video_features = meta_obj.load_video_features(main_video_idx)
+            comparison_result = meta_obj.compare_features(video_idx, main_video_idx,
+                                                          load_batch_video_features(meta_obj, video_idx),
+                                                          main_video_features)
+        meta_obj.record_comparison(video_idx, group_idx, comparison_result['are_similar'])
+        if comparison_result['are_similar']:
+            submeta['was_current_video_compared'] = True
+            meta_obj.release_features(video_idx)
+            matched.append(video_idx)
+        meta_obj.update_meta()
+    del main_video_features
+    return matched
+
+
+def compare_batch_to_main_videos(meta_obj, batch: List[int]):
+    """
+    Функция распределяет по группам батч видео, организуя сравнение вокруг главных видео: каждое главное
+    видео сравнивается со всеми еще не распределенными видео из батча. Если после сравнения со всеми главными
+    видео самое длинное из оставшихся видео не попало ни в одну группу, то оно становится главным, и его фичи
+    сравниваются с остальными видео батча. Результат совпадает с последовательным сравнением
+    (MetaData.compare_video_to_main_videos) тех же видео в том же порядке.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        batch (List[int]): Индексы видео из списка в мета данных (в порядке убывания длительности).
+    """
+    unresolved = []
+    for video_idx in batch:
+        extend_submeta(meta_obj, video_idx)
+        submeta = meta_obj.meta_data['comparison_submeta'][video_idx]
+        if submeta['matched_group'] != NO_GROUP:
+            # видео уже попало в группу, но работа была остановлена до завершения его сравнения
+            meta_obj.release_features(video_idx)
+            submeta['was_current_video_compared'] = True
+            continue
+        unresolved.append(video_idx)
+    meta_obj.update_meta()
+
+    new_main_videos = []
+    group_idx = 0
+    while unresolved:
+        while group_idx < meta_obj.meta_data['num_groups_found'] and unresolved:
+            matched = compare_batch_to_main_video(meta_obj, unresolved, group_idx)
+            unresolved = [video_idx for video_idx in unresolved if video_idx not in matched]
+            group_idx += 1
+        if not unresolved:
+            break
+        # самое длинное из оставшихся видео не похоже ни на одно главное видео: оно становится главным
+        video_idx = unresolved.pop(0)
+        meta_obj.add_main_video(video_idx)
+        meta_obj.meta_data['comparison_submeta'][video_idx]['was_current_video_compared'] = True
+        for other_video_idx in unresolved:
+            extend_submeta(meta_obj, other_video_idx)
+        meta_obj.update_meta()
+        # фичи нового главного видео остаются на локальном диске до конца батча, так как оно сразу же
+        # сравнивается с оставшимися видео батча
+        new_main_videos.append(video_idx)
+    for video_idx in new_main_videos:
+        meta_obj.release_features(video_idx)
+
+
+def compare_videos_main_centric(meta_obj, batch_size: int = 64):
+    """
+    Реализация 3 этапа пайплайна с порядком сравнения, организованным вокруг главных видео.
+    Вместо загрузки фич каждого главного видео для каждого видео (O(N*G) загрузок) фичи каждого главного видео
+    загружаются примерно один раз на батч. Результат группировки совпадает с MetaData.compare_videos.
+    После завершения работы функции мета данные обновляются.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        batch_size (int): Количество видео, которые одновременно сравниваются с главными видео
+                          (фичи видео батча, о которых нет решений в хранилище оценок схожести, хранятся
+                          на локальном диске, пока видео не распределены по группам).
+    """
+    pending = []
+    for video_idx in range(meta_obj.meta_data['num_videos']):
+        submeta = meta_obj.meta_data['comparison_submeta'][video_idx]
+        if meta_obj.meta_data['was_video_with_error'][video_idx] or \
+                (submeta['is_initialized'] and submeta['was_current_video_compared']):
+            continue
+        pending.append(video_idx)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start: start + batch_size]
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"Comparing videos {start}-{start + len(batch)}/{len(pending)}:")
+        compare_batch_to_main_videos(meta_obj, batch)
+        log.info("Done.\n----------------------")
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"Peak RSS per stage (bytes): {meta_obj.memory_tracker.summary()}")
@@ -2,22 +2,40 @@
 Модуль содержащий основные содержащий реализацию основных этапов пайплайна решения задачи сравнения и объединения видео.
 """
 import os
-from typing import List, Optional
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
 import logging
 import numpy as np
 
-from video.compare_videos import VideoSimilarityModel  # pylint: disable=import-error
+from db.config import ConfigLoader  # pylint: disable=import-error
+from db.storage import BaseStorage, get_storage  # pylint: disable=import-error
+from meta.submeta import init_submeta, NO_GROUP  # pylint: disable=import-error
+from meta.placement import FeaturePlacement  # pylint: disable=import-error
+from meta.columnar import ColumnarMeta  # pylint: disable=import-error
+from meta.scores import PairScoreStore, hash_features  # pylint: disable=import-error
+from model.padding import features_length  # pylint: disable=import-error
 from utils.manipulate_data import load_data, save_data  # pylint: disable=import-error
-from db.database import MinioDB  # pylint: disable=import-error
-from utils.sort_dict import sort_dict_by_key  # pylint: disable=import-error, ungrouped-imports
 from utils.manipulate_data import load_video as read_video  # pylint: disable=import-error
-from meta.submeta import init_submeta  # pylint: disable=import-error
+from utils.memory import MemoryTracker, MemoryGuard, MemoryRecord  # pylint: disable=import-error
+from utils.memory import (EXTRACTION_BYTES_PER_FRAME, FEATURES_BYTES_PER_FRAME,  # pylint: disable=import-error
+                          DECODED_BYTES_PER_FRAME)
+from utils.probe import probe_video  # pylint: disable=import-error
+from utils.feature_cache import FeatureCache  # pylint: disable=import-error
+from utils.batch_tuner import BatchSizeTuner  # pylint: disable=import-error
+from utils.cpu_profile import CpuProfile  # pylint: disable=import-error
+from utils.compression import (save_features, load_features, load_features_from_stream,  # pylint: disable=import-error
+                               check_codec)
+from video.compare_videos import VideoSimilarityModel  # pylint: disable=import-error
+from video.segments import split_into_segments, stitch_segments  # pylint: disable=import-error
+from video.temporal_index import TemporalIndex  # pylint: disable=import-error
 
 log = logging.getLogger(__name__)
 
 
-# pylint: disable=too-many-arguments, too-many-instance-attributes
+# pylint: disable=too-many-arguments, too-many-instance-attributes, too-many-public-methods
 class MetaData:
     # pylint: disable=trailing-whitespace
     # pylint: disable=line-too-long
@@ -25,54 +43,67 @@ class MetaData:
     Класс, содержащий реализацию основных этапов пайплайна решения задачи сравнения и объединения видео,
     а также, позволяющий в процессе сохранять результаты работы в специальную структуру.
 
-    Структура для отслеживания состояния работы (далее мета данные) представляет собой словарь meta_data со следующими полями:
+    Структура для отслеживания состояния работы (далее мета данные) представляет собой колоночную структуру meta_data
+    (ColumnarMeta, подробнее тут meta/columnar.py: списки флагов хранятся в numpy массивах, а списки строк - в таблице
+    интернированных строк), доступ к которой такой же, как к словарю со следующими полями:
             meta_data['num_videos'] (int): Количество видео в БД.
             meta_data['was_video_downloaded'] (List[bool]): Было ли скачано текущее видео из БД (локальное наличие).
             meta_data['was_video_read'] (List[bool]): Было ли текущее видео считано (переведено в np.ndarray формат).
             meta_data['were_features_extracted'] (List[bool]): Были ли фичи вытянуты из текущего видео и сохранены локально.
-            meta_data['were_features_uploaded'] (List[bool]): Были ли вытянутые фичи загружены в БД.
+            meta_data['were_features_uploaded'] (List[bool]): Был ли пройден этап выгрузки фич (см. политику размещения фич в meta/placement.py).
+            meta_data['are_features_remote'] (List[bool]): Есть ли копия фич во временной папке БД.
             meta_data['remote_videos_paths'] (List[str]): Пути до каждого видео внутри БД.
             meta_data['local_videos_paths'] (List[Optional[str]]): Локальные пути до каждого видео, после их скачивания из БД.
             meta_data['remote_features_paths'] (List[Optional[str]]): Пути до каждого файла с фичами внутри БД.
             meta_data['local_features_paths'] (List[Optional[str]]): Локальные пути до каждого файла с фичами, после их скачивания из БД или перед их подгрузкой в БД.
-            meta_data['videos_duration'] (List[Optional[int]]): Длительность каждого видео в секундах.
+            meta_data['videos_duration'] (np.ndarray): Длительность каждого видео в секундах (-1, если еще неизвестна).
             meta_data['videos_filenames'] (List[str]): Названия файлов видео без расширения.
             meta_data['videos_filenames_w_extensions'] (List[str]): Названия файлов видео c расширением.
             meta_data['was_video_with_error'] (List[str]): Были ли ошибки при работе с видео (не считывается в numpy формат например).
+            meta_data['was_video_probed'] (List[bool]): Были ли прочитаны характеристики видео из заголовков контейнера (см. utils/probe.py).
+            meta_data['probed_videos_duration'] (np.ndarray): Длительность каждого видео в секундах по заголовкам контейнера (-1, если неизвестна).
+            meta_data['videos_fps'] (np.ndarray): fps каждого видео по заголовкам контейнера (nan, если неизвестен).
+            meta_data['videos_width'] (np.ndarray): Ширина кадра каждого видео (-1, если неизвестна).
+            meta_data['videos_height'] (np.ndarray): Высота кадра каждого видео (-1, если неизвестна).
+            meta_data['videos_codec'] (List[Optional[str]]): Кодек каждого видео.
+            meta_data['features_hash'] (List[Optional[str]]): Хэш содержимого фич каждого видео (ключ в хранилище оценок схожести, см. meta/scores.py).
             meta_data['num_groups_found']: Число найденных групп.
             meta_data['main_videos_in_groups_indices']: Индексы главных видео среди всех остальных в meta_data['remote_videos_paths']
             meta_data['main_videos_in_groups_videos_paths'] (List[str]): Пути до каждого главного видео внутри БД.
             meta_data['groups_content_video_paths'] (List[List[str]]): Пути в БД до остальных видео в каждой группе.
-            meta_data['comparison_submeta'] (List[Optional[dict]]): Отдельная структура для каждого видео, чтобы отслеживать этапы его сравнения с главными видео.
+            meta_data['comparison_submeta'] (np.ndarray): Отдельная запись фиксированного размера для каждого видео, чтобы отслеживать этапы его сравнения с главными видео.
                                                           (более подробно описано в submeta.py)
 
     В классе описаны следующие этапы пайплайна:
         0) Инициализация необходимых объектов:
             0.0) Мета данные для отслеживания состояния работы.
-            0.1) База данных Minio, в которой находятся видео.
+            0.1) База данных Minio (или локальная директория, см. db/storage.py), в которой находятся видео.
             0.2) Модель ViSiL для сравнения видео и вытягивания из них фич.
 
         1) Вытягивание фич из видео:
             Итерационный процесс (можно распараллелить). Кроме того скорость на текущем этапе зависит от скорости
             интернета и мощности GPU.
-            1.0) Текущее видео скачивается из БД в локальную директорию.
+            Перед вытягиванием фич характеристики всех видео читаются из заголовков контейнеров без скачивания видео
+            (MetaData.probe_videos), и видео обрабатываются от самых длинных к самым коротким.
+            1.0) Текущее видео скачивается из БД в локальную директорию (если фич видео нет в кэше фич,
+                 см. utils/feature_cache.py, иначе фичи копируются из кэша и переходим к 1.3).
             1.1) Видео считывается из локальной директории.
             1.2) Из видео вытягиваются фичи и они сохраняются в локальную директорию.
-            1.3) Фичи выгружаются во временное место хранения в БД.
-            1.4) Локально удаляются фичи и видео в БД.
+            1.3) Фичи выгружаются во временное место хранения в БД (если этого требует политика размещения фич).
+            1.4) Локально удаляются видео и фичи (если политика размещения фич не требует хранить их локально).
 
         2) Сортировка мета данных:
             Выполняется сортировка по длительностям видео (reversed=True) всех списков (все списки фиксированной длины
             в мета данных отвечают за описание характеристик, связанных с набором видео из базы данных) из словаря
             отвечающего за meta данные с целью применения последующего алгоритма для сравнения видео.
-            (т.е. на основе списка длительностей видео сортируем все остальные)
+            (т.е. на основе списка длительностей видео сортируем все остальные с помощью argsort)
 
         3) Сравнение видео:
             Сравнение осуществляется последовательно, поэтому процесс вряд ли получится распараллелить (за исключением
             может быть шагов 3.1.0 - 3.1.3). Cкорость на текущем этапе зависит от скорости
             интернета и мощности GPU. Кроме того, о том какие именно параметры влияют непосредственно
             на скорость сравнения двух видео описано в video/compare_videos.py.
-            3.0) Фичи текущего видео скачиваются из БД.
+            3.0) Фичи текущего видео скачиваются из БД (или читаются на месте, если они хранятся локально).
                 3.1.0) Скачиваются фичи текущего главное[*] видео из БД (главное видео всегда длиннее текущего).
                 3.1.1) Сравниваются фичи текущего видео и текущего главного видео.
                 3.1.2) Если видео схожи, то текущее видео является подмножеством текущего главного видео. В этом
@@ -86,6 +117,17 @@ class MetaData:
                 3.1.3) Если ни одно главное видео не является надмножеством текущего видео, то текущее видео само
                        становится главным. Далее переходим к (3.0) со следующим видео в качестве текущего.
 
+            Конвейерный режим (meta/pipelined.py run_pipelined) выполняет 1 и 3 этапы одновременно: видео
+            упорядочиваются по длительности из заголовков, и каждое видео сравнивается, как только из него и из всех
+            более длинных видео вытянуты фичи. Общее время работы становится близким к max(1 этап, 3 этап) вместо
+            их суммы.
+
+            Альтернативный порядок сравнения (meta/main_centric.py compare_videos_main_centric) организован вокруг
+            главных видео: берется батч еще не сравненных видео, фичи каждого главного видео загружаются один раз и
+            сравниваются со всеми видео из батча. Результат группировки совпадает с описанным выше.
+
+            Повторная группировка с другим порогом схожести без повторного вытягивания фич - meta/regroup.py.
+
 
     [*]: Главным видео называется самое длинное видео в группе. Предполагается, что все остальные видео в группе
          являются частями главного видео.
@@ -98,8 +140,20 @@ class MetaData:
                  main_bucket_name: str,
                  tmp_bucket_name: str,
                  path_to_model: str,
-                 local_data_save_path: str):
-        # pylint: disable=line-too-long
+                 local_data_save_path: str,
+                 storage_type: Optional[str] = None,
+                 feature_placement: str = FeaturePlacement.REMOTE,
+                 feature_codec: str = 'none',
+                 feature_shuffle: bool = True,
+                 track_memory: bool = True,
+                 trace_allocations: bool = False,
+                 feature_cache_dir: Optional[str] = None,
+                 similarity_backend: str = 'tf',
+                 feature_dims: Optional[int] = None,
+                 top_k_regions: Optional[int] = None,
+                 region_weight_threshold: Optional[float] = None,
+                 cpu_profile: Optional[CpuProfile] = None):
+        # pylint: disable=line-too-long, too-many-locals
         """
         Реализация нулевого этапа пайплайна.
 
@@ -108,16 +162,38 @@ class MetaData:
 
         Описание self объектов:
 
-            self.minio_db (MinioDB): Объект соответствующий базе данных MinioDB.
+            self.db (BaseStorage): Объект соответствующий базе данных (MinioDB или LocalDB).
             self.model (ViSiL): Объект модели ViSiL.
             self.model_threshold (float): Пороговое значение для сравнения двух видео.
             self.model_frames_step (int): Шаг по кадрам для более длинного видео (подробнее тут video/compare_videos.py VideoSimilarityModel.compare_videos)
                         [!Чем больше шаг, тем быстрее работает сравнение, однако точность может упасть!]
-            self.meta_data (dict): Ранее описанная структура для отслеживания состояния работы.
+            self.model_search (str): Выбор кропов длинного видео при сравнении: scan - с шагом model_frames_step,
+                        coarse_to_fine - иерархический поиск (подробнее тут video/compare_videos.py
+                        VideoSimilarityModel.coarse_to_fine_offsets), index - по временному индексу главного видео.
+            self.meta_data (ColumnarMeta): Ранее описанная структура для отслеживания состояния работы.
             self.meta_log_path (str): Локальный путь до файла со структурой.
             self.main_bucket_name (str): Наименование временной директории в БД, где хранятся видео.
             self.tmp_bucket_name (str): Наименование временной директории в БД, куда будут сохраняться фичи из видео.
             self.local_download_path (str): Путь до директории для локального (временного) сохранения данных из БД.
+            self.feature_placement (str): Политика размещения фич (подробнее тут meta/placement.py).
+            self.feature_codec (str): Кодек сжатия фич при сохранении и передаче в БД (подробнее тут utils/compression.py).
+            self.feature_shuffle (bool): Применять ли byte-shuffle к фичам перед сжатием.
+            self.batch_size (Union[int, str]): Размер батча при вытягивании фич (может быть уменьшен self.memory_guard)
+                        или 'auto' - подобрать под текущий хост (подробнее тут utils/batch_tuner.py).
+            self.memmap_features_bytes (Optional[int]): Фичи, размер которых больше, вытягиваются в memory-mapped файл
+                        в локальной директории, а не в память (None - всегда в память).
+            self.segment_duration (int): Длительность сегмента в секундах, видео длиннее обрабатываются по частям.
+            self.segment_workers (int): Количество потоков, считывающих следующие сегменты видео.
+            self.decode_threads (int): Количество потоков cv2 при декодировании видео.
+            self.memory_tracker (MemoryTracker): Отчет о потреблении памяти на каждом этапе для каждого видео.
+            self.memory_guard (MemoryGuard): Защита от нехватки памяти на хосте.
+            self.memory_report_path (str): Локальный путь до файла с отчетом о потреблении памяти.
+            self.score_store (PairScoreStore): Хранилище оценок схожести пар видео (подробнее тут meta/scores.py).
+            self.feature_cache (Optional[FeatureCache]): Кэш фич, общий для разных запусков (подробнее тут
+                                                         utils/feature_cache.py).
+            self.temporal_indices (Dict[str, TemporalIndex]): Временные индексы главных видео по хэшу их фич для
+                                                              model_search='index' (подробнее тут
+                                                              video/temporal_index.py).
 
         Args:
             logs_path (str): Путь до директории со структурой для отслеживания состояния работы.
@@ -126,58 +202,83 @@ class MetaData:
             tmp_bucket_name (str): Наименование временной директории в БД, куда будут сохраняться фичи из видео.
             path_to_model (str): Путь до чекпоинта модели ViSiL.
             local_data_save_path (str): Путь до директории для локального (временного) сохранения данных из БД.
+            storage_type (Optional[str]): Тип хранилища: minio или local (по умолчанию берется STORAGE_TYPE из .env).
+            feature_placement (str): Политика размещения фич: local, remote или write_through.
+            feature_codec (str): Кодек сжатия фич: none, zlib, zstd или lz4.
+            feature_shuffle (bool): Применять ли byte-shuffle к фичам перед сжатием.
+            track_memory (bool): Собирать ли отчет о потреблении памяти.
+            trace_allocations (bool): Включить tracemalloc при сборе отчета (замедляет работу).
+            feature_cache_dir (Optional[str]): Путь до директории кэша фич, общего для разных запусков
+                                               (по умолчанию кэш не используется).
+            similarity_backend (str): Реализация сравнения фич: tf или numpy (подробнее тут video/compare_videos.py
+                                      VideoSimilarityModel).
+            feature_dims (Optional[int]): Размерность векторов регионов после PCA (None - полные 3840, подробнее
+                                          тут video/compare_videos.py VideoSimilarityModel).
+            top_k_regions (Optional[int]): Сколько регионов каждого кадра с наибольшими весами attention хранить
+                                           (None - все).
+            region_weight_threshold (Optional[float]): Порог веса attention, регионы с меньшим весом обнуляются.
+            cpu_profile (Optional[CpuProfile]): Профиль выполнения на CPU одного исполнителя: процесс привязывается к
+                                                его ядрам, а потоки TF и cv2 ограничиваются (подробнее тут
+                                                utils/cpu_profile.py, профиль выбирается select_profile).
         """
 
-        model = VideoSimilarityModel(path_to_model=path_to_model)
+        model = VideoSimilarityModel(path_to_model=path_to_model, similarity_backend=similarity_backend,
+                                     feature_dims=feature_dims, top_k_regions=top_k_regions,
+                                     region_weight_threshold=region_weight_threshold, cpu_profile=cpu_profile)
+        if cpu_profile is not None:
+            cpu_profile.pin()
 
-        db_obj = MinioDB(main_bucket_name, tmp_bucket_name, logs_path, local_data_save_path)
-        self.minio_db: MinioDB = db_obj
+        FeaturePlacement.check(feature_placement)
+        check_codec(feature_codec)
+        if storage_type is None:
+            storage_type = ConfigLoader().storage_type
+        db_obj = get_storage(storage_type, main_bucket_name, tmp_bucket_name, logs_path, local_data_save_path)
+        self.db: BaseStorage = db_obj
 
         if meta_logname not in os.listdir(logs_path):
             remote_videos_paths: List[str] = db_obj.db_get_video_list()
-            meta_data = dict()  # pylint: disable=use-dict-literal
-            meta_data['num_videos']: int = len(remote_videos_paths)
-            meta_data['was_video_downloaded']: List[bool] = [False for _ in range(meta_data['num_videos'])]
-            meta_data['was_video_read']: List[bool] = [False for _ in range(meta_data['num_videos'])]
-            meta_data['were_features_extracted']: List[bool] = [False for _ in range(meta_data['num_videos'])]
-            meta_data['were_features_uploaded']: List[bool] = [False for _ in range(meta_data['num_videos'])]
-            meta_data['remote_videos_paths']: List[str] = remote_videos_paths
-            meta_data['local_videos_paths']: List[Optional[str]] = [None for _ in range(meta_data['num_videos'])]
-            meta_data['remote_features_paths']: List[Optional[str]] = [None for _ in range(meta_data['num_videos'])]
-            meta_data['local_features_paths']: List[Optional[str]] = [None for _ in range(meta_data['num_videos'])]
-            meta_data['videos_duration']: List[Optional[int]] = [None for _ in range(meta_data['num_videos'])]
-            meta_data['videos_filenames']: List[str] = [os.path.split(video_path)[-1].split('.')[0] for video_path in
-                                                        meta_data['remote_videos_paths']]
-            meta_data['videos_filenames_w_extensions']: List[str] = [os.path.split(video_path)[-1] for video_path in
-                                                                     meta_data['remote_videos_paths']]
-            meta_data['was_video_with_error']: List[bool] = [False for _ in range(meta_data['num_videos'])]
-            meta_data['num_groups_found']: int = 0
-            meta_data['main_videos_in_groups_indices']: List[int] = []
-            meta_data['main_videos_in_groups_videos_paths']: List[str] = []
-            meta_data['groups_content_video_paths']: List[str] = []
-            meta_data['comparison_submeta']: List[Optional[dict]] = [None for _ in range(meta_data['num_videos'])]
+            meta_data = ColumnarMeta.from_remote_paths(remote_videos_paths)
         else:
             meta_data = MetaData.load_meta(os.path.join(logs_path, meta_logname))
 
         self.model = model
         self.model_threshold = 0.75
         self.model_frames_step = 100
+        self.model_search = 'scan'
         self.meta_data = meta_data
         self.meta_log_path = os.path.join(logs_path, meta_logname)
         self.main_bucket_name = main_bucket_name
         self.tmp_bucket_name = tmp_bucket_name
         self.local_download_path = local_data_save_path
+        self.feature_placement = feature_placement
+        self.feature_codec = feature_codec
+        self.feature_shuffle = feature_shuffle
+        self.batch_size: Union[int, str] = 32
+        self.memmap_features_bytes: Optional[int] = None
+        self.segment_duration = 600
+        self.segment_workers = 2
+        self.decode_threads = cpu_profile.decode_threads if cpu_profile is not None else 3
+        self.memory_tracker = MemoryTracker(enabled=track_memory, trace_allocations=trace_allocations)
+        self.memory_guard = MemoryGuard()
+        self.memory_report_path = os.path.join(logs_path, 'memory_report.pkl')
+        self.score_store = PairScoreStore(os.path.join(logs_path, 'pair_scores.sqlite'))
+        self.feature_cache = FeatureCache(feature_cache_dir) if feature_cache_dir is not None else None
+        self.model.batch_tuner = BatchSizeTuner(os.path.join(logs_path, 'batch_size_cache.json'),
+                                                memory_guard=self.memory_guard)
+        self.temporal_indices: Dict[str, TemporalIndex] = {}
 
     @staticmethod
-    def load_meta(path_to_meta: str) -> dict:
+    def load_meta(path_to_meta: str) -> ColumnarMeta:
         """
-        Функция чтения мета данных.
+        Функция чтения мета данных. Мета данные предыдущих версий (словарь списков) переводятся в колоночный формат.
         Args:
             path_to_meta (str): Путь до файла с мета данными.
         Returns:
-            meta_data (dict): Считанный словарь с мета данными.
+            meta_data (ColumnarMeta): Считанные мета данные.
         """
         meta_data = load_data(path_to_meta)
+        if isinstance(meta_data, dict):
+            meta_data = ColumnarMeta.from_dict(meta_data)
         return meta_data
 
     def update_meta(self):
@@ -186,6 +287,15 @@ class MetaData:
         """
         save_data(self.meta_data, self.meta_log_path)
 
+    def video_location(self, video_idx: int) -> str:
+        """
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        Returns (str): Локальный путь, по которому скачивается видео.
+        """
+        return os.path.join(str(self.local_download_path),
+                            str(self.meta_data['videos_filenames_w_extensions'][video_idx]))
+
     def download_video(self, video_idx: int):
         """
         Функция загрузки видео из БД по индексу в мета данных.
@@ -193,29 +303,18 @@ class MetaData:
         Args:
             video_idx (int): Индекс видео из списка в мета данных.
         """
-        self.minio_db.db_get_file(str(self.meta_data['remote_videos_paths'][video_idx]))
-        local_video_location = os.path.join(str(self.local_download_path),
-                                            str(self.meta_data['videos_filenames_w_extensions'][video_idx]))
-        self.meta_data['local_videos_paths'][video_idx] = local_video_location
-        self.meta_data['was_video_downloaded'][video_idx] = True
-        self.update_meta()
+        self.db.db_get_file(str(self.meta_data['remote_videos_paths'][video_idx]))
+        self.record_download(video_idx)
 
-    def read_video(self, video_idx: int) -> np.ndarray:
+    def record_download(self, video_idx: int):
         """
-        Функция чтения видео из локальной директории по индексу в мета данных. 
-        После завершения работы функции мета данные обновляются.
+        Функция отмечает в мета данных, что видео скачано. После завершения работы функции мета данные обновляются.
         Args:
             video_idx (int): Индекс видео из списка в мета данных.
-        Returns:
-            video_data (np.ndarray): Считанное видео в формате numpy.
         """
-        video_data = read_video(self.meta_data['local_videos_paths'][video_idx])
-        if not self.meta_data['was_video_read'][video_idx]:
-            self.meta_data['videos_duration'][video_idx] = video_data.shape[0]
-            self.meta_data['was_video_with_error'][video_idx] = video_data.shape[0] == 0
-            self.meta_data['was_video_read'][video_idx] = True
-            self.update_meta()
-        return video_data
+        self.meta_data['local_videos_paths'][video_idx] = self.video_location(video_idx)
+        self.meta_data['was_video_downloaded'][video_idx] = True
+        self.update_meta()
 
     def extract_features_from_video(self, video_idx: int):
         """
@@ -228,39 +327,334 @@ class MetaData:
         if self.meta_data['was_video_with_error'][video_idx]:
             self.meta_data['were_features_extracted'][video_idx] = True
             self.update_meta()
-        else:
-            video_data = self.read_video(video_idx)
-            video_data = self.model.extract_features(video_data, batch_sz=32)
-            features_filename = str(self.meta_data['videos_filenames'][video_idx]) + "_features.pkl"
-            local_path_to_features = os.path.join(str(self.local_download_path), features_filename)
-            remote_path_to_features = features_filename
+            return
+        with self.memory_tracker.track('extract_features', video_idx) as memory_record:
+            num_frames, features = self.compute_features(video_idx, str(self.meta_data['local_videos_paths'][video_idx]),
+                                                         memory_record)
+            self.record_features(video_idx, num_frames, features)
+            del features
+        self.memory_tracker.save(self.memory_report_path)
+
+    def compute_features(self, video_idx: int, local_video_path: str,
+                         memory_record: MemoryRecord) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Функция считывает видео и вытягивает из него фичи. Мета данные не изменяются (результат записывается
+        MetaData.record_features), поэтому функция может выполняться в отдельном потоке (см. meta/pipelined.py).
+        Длинные видео (по длительности из заголовков) обрабатываются по частям
+        (см. MetaData.extract_features_by_segments).
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            local_video_path (str): Локальный путь до видео.
+            memory_record (MemoryRecord): Запись о потреблении памяти, в которую добавляются размеры массивов.
+        Returns:
+            num_frames (int): Количество считанных кадров.
+            features (Optional[np.ndarray]): Фичи видео (None, если не считано ни одного кадра).
+        """
+        if self.meta_data['probed_videos_duration'][video_idx] > self.segment_duration:
+            return self.extract_features_by_segments(video_idx, local_video_path, memory_record)
+        # декодированное видео - самый большой массив этапа, поэтому память проверяется до его чтения
+        # (один кадр в секунду, длительность из заголовков; -1, если неизвестна)
+        self.memory_guard.check(max(int(self.meta_data['probed_videos_duration'][video_idx]), 0) *
+                                DECODED_BYTES_PER_FRAME, 'read_video')
+        video_data = read_video(local_video_path, num_threads=self.decode_threads)
+        memory_record.add_array('video', video_data)
+        num_frames = video_data.shape[0]
+        if num_frames == 0:
+            return 0, None
+        batch_sz = self.extraction_batch_size(num_frames)
+        memory_record.info['batch_size'] = batch_sz
+        features_buffer = None
+        if self.memmap_features_bytes is not None and \
+                num_frames * FEATURES_BYTES_PER_FRAME > self.memmap_features_bytes:
+            features_buffer = np.memmap(self.features_buffer_path(video_idx), dtype=np.float32, mode='w+',
+                                        shape=(features_length(num_frames),) + self.model.features_frame_shape)
+        features = self.model.extract_features(video_data, batch_sz=batch_sz, out=features_buffer)
+        memory_record.add_array('features', features)
+        return num_frames, features
+
+    def extraction_batch_size(self, num_frames: int) -> int:
+        """
+        Args:
+            num_frames (int): Количество кадров, фичи которых будут находиться в памяти.
+        Returns (int): Размер батча при вытягивании фич, помещающийся в доступную память.
+        """
+        return self.memory_guard.fit_batch_size(self.model.resolve_batch_size(self.batch_size),
+                                                EXTRACTION_BYTES_PER_FRAME,
+                                                fixed_bytes=num_frames * FEATURES_BYTES_PER_FRAME)
+
+    def record_features(self, video_idx: int, num_frames: int, features: Optional[np.ndarray]):
+        """
+        Функция записывает в мета данные результат MetaData.compute_features и сохраняет фичи в локальную директорию.
+        После завершения работы функции мета данные обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            num_frames (int): Количество считанных кадров.
+            features (Optional[np.ndarray]): Фичи видео (None, если не считано ни одного кадра).
+        """
+        self.meta_data['videos_duration'][video_idx] = num_frames
+        self.meta_data['was_video_with_error'][video_idx] = num_frames == 0
+        self.meta_data['was_video_read'][video_idx] = True
+        if features is None:
             self.meta_data['were_features_extracted'][video_idx] = True
-            self.meta_data['local_features_paths'][video_idx] = local_path_to_features
-            self.meta_data['remote_features_paths'][video_idx] = remote_path_to_features
-            save_data(video_data, local_path_to_features)
             self.update_meta()
-            del video_data
+            return
+        self.save_video_features(video_idx, features)
+        features_buffer_path = self.features_buffer_path(video_idx)
+        if os.path.exists(features_buffer_path):
+            os.remove(features_buffer_path)
+
+    def features_buffer_path(self, video_idx: int) -> str:
+        """
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        Returns (str): Локальный путь до memory-mapped файла, в который вытягиваются фичи (см. memmap_features_bytes).
+        """
+        return os.path.join(str(self.local_download_path),
+                            f"{self.meta_data['videos_filenames'][video_idx]}_features.mmap")
+
+    def extract_features_by_segments(self, video_idx: int, local_video_path: str,
+                                     memory_record: MemoryRecord) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Функция вытягивает фичи из видео по частям (сегментам по self.segment_duration секунд): каждый сегмент
+        считывается со своей точки перемотки, причем следующие сегменты считываются в отдельных потоках, пока из
+        текущего вытягиваются фичи. Фичи сегментов склеиваются (подробнее тут video/segments.py).
+        В памяти одновременно находится не больше self.segment_workers + 1 сегментов. Мета данные не изменяются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            local_video_path (str): Локальный путь до видео.
+            memory_record (MemoryRecord): Запись о потреблении памяти, в которую добавляются размеры массивов.
+        Returns:
+            num_frames (int): Количество считанных кадров.
+            features (Optional[np.ndarray]): Фичи видео (None, если не считано ни одного кадра).
+        """
+        segments = split_into_segments(int(self.meta_data['probed_videos_duration'][video_idx]),
+                                       self.segment_duration)
+        self.memory_guard.check((self.segment_workers + 1) * self.segment_duration * DECODED_BYTES_PER_FRAME,
+                                'read_video')
+        segments_features = []
+        num_frames = 0
+        with ThreadPoolExecutor(max_workers=self.segment_workers) as executor:
+            segments_left = iter(segments)
+            pending = deque(executor.submit(read_video, local_video_path, start=start, end=end,
+                                            num_threads=self.decode_threads)
+                            for start, end in islice(segments_left, self.segment_workers))
+            while pending:
+                video_data = pending.popleft().result()
+                next_segment = next(segments_left, None)
+                if next_segment is not None:
+                    pending.append(executor.submit(read_video, local_video_path,
+                                                   start=next_segment[0], end=next_segment[1],
+                                                   num_threads=self.decode_threads))
+                num_frames += video_data.shape[0]
+                if video_data.shape[0] == 0:
+                    continue
+                # у коротких сегментов фичи повторяются (см. ViSiL.extract_features), лишнее отрезается
+                segments_features.append(self.model.extract_features(
+                    video_data, batch_sz=self.extraction_batch_size(num_frames))[:video_data.shape[0]])
+                del video_data
+        memory_record.info['num_segments'] = len(segments)
+        if num_frames == 0:
+            return 0, None
+        features = stitch_segments(segments_features)
+        memory_record.add_array('features', features)
+        return num_frames, features
+
+    def save_video_features(self, video_idx: int, features: np.ndarray):
+        """
+        Функция сохраняет фичи видео в локальную директорию. После завершения работы функции мета данные обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            features (np.ndarray): Фичи видео.
+        """
+        self.set_features_paths(video_idx)
+        local_path_to_features = str(self.meta_data['local_features_paths'][video_idx])
+        self.meta_data['were_features_extracted'][video_idx] = True
+        self.meta_data['features_hash'][video_idx] = hash_features(features)
+        save_features(features, local_path_to_features, codec=self.feature_codec, shuffle=self.feature_shuffle)
+        if self.feature_cache is not None:
+            self.feature_cache.put(self.feature_cache_key(video_idx), local_path_to_features,
+                                   {'duration': int(self.meta_data['videos_duration'][video_idx]),
+                                    'features_hash': self.meta_data['features_hash'][video_idx],
+                                    'codec': self.feature_codec})
+        self.update_meta()
+
+    def set_features_paths(self, video_idx: int):
+        """
+        Функция задает локальный путь до фич видео и путь до них во временной папке БД. Мета данные не обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        """
+        features_filename = self.features_filename(video_idx)
+        self.meta_data['local_features_paths'][video_idx] = os.path.join(str(self.local_download_path),
+                                                                         features_filename)
+        self.meta_data['remote_features_paths'][video_idx] = features_filename
+
+    def features_filename(self, video_idx: int, suffix: str = '') -> str:
+        """
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            suffix (str): Суффикс названия (например, номер сегмента, см. distributed/worker.py).
+        Returns (str): Название файла с фичами видео.
+        """
+        features_extension = "pkl" if self.feature_codec == 'none' else self.feature_codec
+        return f"{self.meta_data['videos_filenames'][video_idx]}_features{suffix}.{features_extension}"
+
+    def feature_cache_key(self, video_idx: int) -> str:
+        """
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        Returns (str): Ключ кэша фич для видео (подробнее тут utils/feature_cache.py).
+        """
+        video_stat = self.db.db_stat_file(str(self.meta_data['remote_videos_paths'][video_idx]))
+        return FeatureCache.key(video_stat, self.model.feature_fingerprint)
+
+    def load_cached_features(self, video_idx: int) -> bool:
+        """
+        Функция копирует фичи видео из кэша фич (если они там есть), при этом видео не скачивается.
+        После завершения работы функции мета данные обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        Returns (bool): Были ли фичи в кэше.
+        """
+        self.set_features_paths(video_idx)
+        local_path_to_features = str(self.meta_data['local_features_paths'][video_idx])
+        info = self.feature_cache.get(self.feature_cache_key(video_idx), local_path_to_features)
+        if info is None:
+            return False
+        if info['codec'] != self.feature_codec:
+            save_features(load_features(local_path_to_features), local_path_to_features, codec=self.feature_codec,
+                          shuffle=self.feature_shuffle)
+        self.meta_data['videos_duration'][video_idx] = info['duration']
+        self.meta_data['features_hash'][video_idx] = info['features_hash']
+        for key in ('was_video_downloaded', 'was_video_read', 'were_features_extracted'):
+            self.meta_data[key][video_idx] = True
+        self.update_meta()
+        return True
 
     def upload_features(self, video_idx: int):
         """
         Выгрузка локально расположенных фич видео с индексом video_idx в мета данных в базу данных.  
         После выгрузки функция удаляет локально расположенные фичи, а также само видео. 
+        Выгрузка и удаление фич выполняются в соответствии с политикой размещения фич (см. meta/placement.py).
         После завершения работы функции мета данные обновляются.
         Args:
             video_idx (int): Индекс видео из списка в мета данных.
         """
+        # видео не скачивается, если фичи взяты из кэша фич
+        local_video_path = self.meta_data['local_videos_paths'][video_idx]
         if self.meta_data['was_video_with_error'][video_idx]:
-            self.meta_data['were_features_uploaded'] = True
-            os.remove(str(self.meta_data['local_videos_paths'][video_idx]))
+            self.meta_data['were_features_uploaded'][video_idx] = True
+            if local_video_path is not None:
+                os.remove(str(local_video_path))
             self.update_meta()
         else:
-            # load features in tmp bucket
-            self.minio_db.db_put_file(str(self.meta_data['local_features_paths'][video_idx]))
-            os.remove(str(self.meta_data['local_features_paths'][video_idx]))
-            os.remove(str(self.meta_data['local_videos_paths'][video_idx]))
+            if FeaturePlacement.upload_on_extract(self.feature_placement):
+                # load features in tmp bucket
+                self.db.db_put_file(str(self.meta_data['local_features_paths'][video_idx]),
+                                    keep_local=FeaturePlacement.keep_local(self.feature_placement),
+                                    metadata=self.features_metadata())
+                self.meta_data['are_features_remote'][video_idx] = True
+            if local_video_path is not None:
+                os.remove(str(local_video_path))
             self.meta_data['were_features_uploaded'][video_idx] = True
             self.update_meta()
 
+    def features_metadata(self) -> dict:
+        """
+        Returns (dict): Метаданные объекта с фичами в БД (кодек сжатия и byte-shuffle).
+        """
+        return {'codec': self.feature_codec, 'shuffle': str(self.feature_shuffle)}
+
+    def sync_features(self, video_indices: Optional[List[int]] = None):
+        """
+        Выгрузка в БД локально хранящихся фич, копии которых еще нет во временной папке БД (нужно при
+        политике размещения local перед передачей работы другим узлам или перезапуском на другом узле).
+        После завершения работы функции мета данные обновляются.
+        Args:
+            video_indices (Optional[List[int]]): Индексы видео из списка в мета данных (по умолчанию все).
+        """
+        if video_indices is None:
+            video_indices = range(self.meta_data['num_videos'])
+        for video_idx in video_indices:
+            local_path_to_features = self.meta_data['local_features_paths'][video_idx]
+            if self.meta_data['are_features_remote'][video_idx] or local_path_to_features is None or \
+                    not os.path.exists(str(local_path_to_features)):
+                continue
+            self.db.db_put_file(str(local_path_to_features), keep_local=True, metadata=self.features_metadata())
+            self.meta_data['are_features_remote'][video_idx] = True
+            self.update_meta()
+
+    def probe_videos(self, save_every: int = 100):
+        """
+        Чтение характеристик (длительность, fps, разрешение, кодек) всех видео из заголовков контейнеров
+        без скачивания видео целиком (подробнее тут utils/probe.py).
+        После завершения работы функции мета данные обновляются.
+        Args:
+            save_every (int): Через сколько видео обновлять мета данные.
+        """
+        log.info("Probing videos...")
+        for video_idx in range(self.meta_data['num_videos']):
+            if self.meta_data['was_video_probed'][video_idx]:
+                continue
+            video_info = probe_video(self.db.db_get_url(str(self.meta_data['remote_videos_paths'][video_idx])))
+            if video_info is not None:
+                self.meta_data['probed_videos_duration'][video_idx] = video_info['duration']
+                self.meta_data['videos_fps'][video_idx] = video_info['fps']
+                self.meta_data['videos_width'][video_idx] = video_info['width']
+                self.meta_data['videos_height'][video_idx] = video_info['height']
+                self.meta_data['videos_codec'][video_idx] = video_info['codec']
+            else:
+                # pylint: disable=logging-fstring-interpolation
+                log.warning(f"Couldn't probe video {self.meta_data['remote_videos_paths'][video_idx]}")
+            self.meta_data['was_video_probed'][video_idx] = True
+            if (video_idx + 1) % save_every == 0:
+                self.update_meta()
+        self.update_meta()
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"Probed videos: {np.count_nonzero(self.meta_data['probed_videos_duration'] >= 0)}/"
+                 f"{self.meta_data['num_videos']}")
+
+    def extraction_order(self) -> List[int]:
+        """
+        Returns (List[int]): Индексы видео в порядке вытягивания фич: от самых длинных к самым коротким по длительности
+                             из заголовков (видео с неизвестной длительностью в конце, в исходном порядке).
+        """
+        # stable sort: при равенстве длительностей сохраняется исходный порядок
+        return [int(video_idx) for video_idx in np.argsort(-self.meta_data['probed_videos_duration'], kind='stable')]
+
+    def process_video(self, video_idx: int, extracted: Optional[Tuple[int, Optional[np.ndarray]]] = None):
+        """
+        Реализация 1 этапа пайплайна для одного видео: скачивание, вытягивание фич и их выгрузка
+        (пропускаются шаги, которые уже были выполнены).
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            extracted (Optional[Tuple[int, Optional[np.ndarray]]]): Результат prefetch_features (см.
+                                                                    meta/pipelined.py): видео уже скачано,
+                                                                    и фичи уже вытянуты.
+        """
+        if extracted is not None:
+            self.record_download(video_idx)
+            self.record_features(video_idx, *extracted)
+        if not self.meta_data['was_video_downloaded'][video_idx] and self.feature_cache is not None and \
+                self.load_cached_features(video_idx):
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Features loaded from cache: {self.meta_data['remote_videos_paths'][video_idx]}")
+        if not self.meta_data['was_video_downloaded'][video_idx]:
+            self.download_video(video_idx)
+            # pylint: disable=logging-fstring-interpolation
+            log.info(
+                f"Downloaded video: {np.count_nonzero(self.meta_data['was_video_downloaded']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
+        if not self.meta_data['were_features_extracted'][video_idx]:
+            self.extract_features_from_video(video_idx)
+            # pylint: disable=logging-fstring-interpolation
+            log.info(
+                f"Features extracted: {np.count_nonzero(self.meta_data['were_features_extracted']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
+        if not self.meta_data['were_features_uploaded'][video_idx]:
+            self.upload_features(video_idx)
+            # pylint: disable=logging-fstring-interpolation
+            log.info(
+                f"Uploaded features: {np.count_nonzero(self.meta_data['were_features_uploaded']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
+
     def preprocessing(self):
         """
         Реализация 1 и 2 этапа пайплайна.
@@ -268,25 +662,11 @@ class MetaData:
         После завершения работы функции мета данные обновляются.
         """
         log.info("Реализизация 1 и 2 этапа пайплайна.")
-        for video_idx, _ in enumerate(self.meta_data['remote_videos_paths']):
+        for num_processed, video_idx in enumerate(self.extraction_order()):
             # pylint: disable=logging-fstring-interpolation
-            log.info(f"Обработка видео {video_idx + 1}/{self.meta_data['num_videos']}")
-            if not self.meta_data['was_video_downloaded'][video_idx]:
-                self.download_video(video_idx)
-                # pylint: disable=logging-fstring-interpolation
-                log.info(
-                    f"Downloaded video: {sum(self.meta_data['was_video_downloaded']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
-            if not self.meta_data['were_features_extracted'][video_idx]:
-                self.extract_features_from_video(video_idx)
-                # pylint: disable=logging-fstring-interpolation
-                log.info(
-                    f"Features extracted: {sum(self.meta_data['were_features_extracted']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
-            if not self.meta_data['were_features_uploaded'][video_idx]:
-                self.upload_features(video_idx)
-                # pylint: disable=logging-fstring-interpolation
-                log.info(
-                    f"Uploaded features: {sum(self.meta_data['were_features_uploaded']) + 1}/{self.meta_data['num_videos']}")  # pylint: disable=line-too-long
-        sort_dict_by_key(my_dict=self.meta_data, target_key='videos_duration')
+            log.info(f"Обработка видео {num_processed + 1}/{self.meta_data['num_videos']}")
+            self.process_video(video_idx)
+        self.meta_data.sort_by_key(target_key='videos_duration')
         log.info("1 и 2 этапы пайплайна реализованы.")
         self.update_meta()
 
@@ -296,57 +676,249 @@ class MetaData:
         Args:
             video_idx (int): Индекс видео из списка в мета данных.
         """
-        self.minio_db.db_get_file(str(self.meta_data['remote_features_paths'][video_idx]),
-                                  save_path=str(self.meta_data['local_features_paths'][video_idx]), bucket='tmp')
+        self.db.db_get_file(str(self.meta_data['remote_features_paths'][video_idx]),
+                            save_path=str(self.meta_data['local_features_paths'][video_idx]), bucket='tmp')
+
+    def fetch_features(self, video_idx: int):
+        """
+        Функция обеспечивает локальное наличие фич по индексу в мета данных: если политика размещения фич
+        хранит их локально и они на месте, то они читаются на месте, иначе скачиваются из БД.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        """
+        if FeaturePlacement.keep_local(self.feature_placement) and \
+                os.path.exists(str(self.meta_data['local_features_paths'][video_idx])):
+            return
+        if not self.meta_data['are_features_remote'][video_idx]:
+            log.error("Features are neither on the local disk nor in db!")
+            raise FileNotFoundError(self.meta_data['local_features_paths'][video_idx])
+        self.download_features_from_db(video_idx)
+
+    def load_video_features(self, video_idx: int) -> np.ndarray:
+        """
+        Функция загружает фичи по индексу в мета данных в память: с локального диска, если они там есть, иначе
+        потоком из БД без сохранения на диск (формат фич определяется по метаданным объекта в БД).
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        Returns:
+            features (np.ndarray): Фичи видео.
+        """
+        local_path = str(self.meta_data['local_features_paths'][video_idx])
+        if os.path.exists(local_path):
+            return load_features(local_path)
+        if not self.meta_data['are_features_remote'][video_idx]:
+            log.error("Features are neither on the local disk nor in db!")
+            raise FileNotFoundError(local_path)
+        return self.read_remote_features(str(self.meta_data['remote_features_paths'][video_idx]))
+
+    def read_remote_features(self, remote_path: str) -> np.ndarray:
+        """
+        Функция читает фичи из временной папки БД потоком, без сохранения на диск (формат фич определяется по
+        метаданным объекта в БД).
+        Args:
+            remote_path (str): Путь до фич во временной папке БД.
+        Returns:
+            features (np.ndarray): Фичи видео.
+        """
+        codec = self.db.db_get_metadata(remote_path, bucket='tmp').get('codec')
+        stream = self.db.db_get_stream(remote_path, bucket='tmp')
+        try:
+            return load_features_from_stream(stream, codec=codec)
+        finally:
+            self.db.db_close_stream(stream)
+
+    def release_features(self, video_idx: int):
+        """
+        Функция локально удаляет фичи по индексу в мета данных, если политика размещения фич не требует их хранить.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        """
+        local_path = str(self.meta_data['local_features_paths'][video_idx])
+        if not FeaturePlacement.keep_local(self.feature_placement) and os.path.exists(local_path):
+            os.remove(local_path)
+
+    def compare_features(self, video_idx: int, main_video_idx: int, video_features: np.ndarray,
+                         main_video_features: np.ndarray) -> dict:
+        """
+        Функция сравнивает загруженные в память фичи текущего видео и главного видео (см. load_video_features).
+        Мета данные не обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            main_video_idx (int): Индекс главного видео из списка в мета данных.
+            video_features (np.ndarray): Фичи текущего видео.
+            main_video_features (np.ndarray): Фичи главного видео.
+        Returns:
+            comparison_info (dict): Результат сравнения видео (подробнее тут video/compare_videos.py
+                                    VideoSimilarityModel.compare_videos).
+        """
+        short_video_idx, long_video_idx = self.order_pair(video_idx, main_video_idx)
+        features = {video_idx: video_features, main_video_idx: main_video_features}
+        for idx in (short_video_idx, long_video_idx):
+            if self.meta_data['features_hash'][idx] is None:
+                # фичи, вытянутые до появления хранилища оценок схожести
+                self.meta_data['features_hash'][idx] = hash_features(features[idx])
+        pair_key = (self.meta_data['features_hash'][short_video_idx], self.meta_data['features_hash'][long_video_idx],
+                    self.scores_model_version(), self.model_frames_step)
+        record = self.score_store.get(*pair_key)
+        are_similar = PairScoreStore.decide(record, self.model_threshold)
+        if are_similar is not None:
+            return {'are_similar': are_similar, 'max_similarity': PairScoreStore.max_similarity(record)}
+
+        videos_info = [{'features': features[idx], 'duration': self.meta_data['videos_duration'][idx]}
+                       for idx in (short_video_idx, long_video_idx)]
+        with self.memory_tracker.track('compare_videos', video_idx) as memory_record:
+            memory_record.info['features_bytes'] = video_features.nbytes + main_video_features.nbytes
+            # промежуточный тензор tensordot (9x9 регионов) и первый слой Video_Comparator на пару кадров
+            self.model.similarity_chunk = self.memory_guard.fit_chunk_size(500, 9 * 9 * 4 + 32 * 4,
+                                                                           fixed_bytes=memory_record.info[
+                                                                               'features_bytes'])
+            comparison_result = self.model.compare_videos(*videos_info, self.model_threshold, self.model_frames_step,
+                                                          start_offset=PairScoreStore.resume_offset(
+                                                              record, self.model_threshold),
+                                                          search=self.model_search,
+                                                          temporal_index=self.temporal_index(
+                                                              main_video_idx, main_video_features)
+                                                          if self.model_search == 'index' and
+                                                          long_video_idx == main_video_idx else None)
+        self.memory_tracker.save(self.memory_report_path)
+        self.score_store.put(*pair_key, scores=comparison_result['window_scores'],
+                             next_offset=comparison_result['next_offset'],
+                             is_complete=comparison_result['is_complete'])
+        if record is not None:
+            comparison_result['max_similarity'] = max(comparison_result['max_similarity'],
+                                                      PairScoreStore.max_similarity(record))
+        return comparison_result
+
+    def scores_model_version(self) -> str:
+        """
+        Returns (str): Версия модели для хранилища оценок схожести. Оценки иерархического поиска хранятся отдельно,
+                       так как он просчитывает другие окна и не продолжается с next_offset.
+        """
+        if self.model_search == 'scan':
+            return self.model.model_version
+        return f"{self.model.model_version}:{self.model_search}"
+
+    def temporal_index(self, video_idx: int, features: Optional[np.ndarray] = None) -> TemporalIndex:
+        """
+        Временной индекс видео (строится один раз, когда видео становится главным, или при первом сравнении
+        после перезапуска). Если фичи не переданы, то они загружаются (см. load_video_features).
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            features (Optional[np.ndarray]): Уже загруженные фичи видео.
+        Returns (TemporalIndex): Временной индекс видео.
+        """
+        if self.meta_data['features_hash'][video_idx] is None:
+            features = self.load_video_features(video_idx) if features is None else features
+            self.meta_data['features_hash'][video_idx] = hash_features(features)
+        features_hash = self.meta_data['features_hash'][video_idx]
+        if features_hash not in self.temporal_indices:
+            if features is None:
+                features = self.load_video_features(video_idx)
+            self.temporal_indices[features_hash] = TemporalIndex(
+                features[:self.meta_data['videos_duration'][video_idx]])
+        return self.temporal_indices[features_hash]
+
+    def order_pair(self, video_idx: int, main_video_idx: int):
+        """
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            main_video_idx (int): Индекс главного видео из списка в мета данных.
+        Returns (Tuple[int, int]): Индексы короткого и длинного видео пары. Обычно главное видео длиннее, но при
+                                   конвейерной обработке видео упорядочены по длительности из заголовков, которая
+                                   может немного отличаться от количества считанных кадров.
+        """
+        if self.meta_data['videos_duration'][main_video_idx] < self.meta_data['videos_duration'][video_idx]:
+            return main_video_idx, video_idx
+        return video_idx, main_video_idx
 
-    def compare_video_and_main_video(self, video_idx: int, main_video_idx: int, group_idx_where_main: int) -> dict:
+    def cached_comparison(self, video_idx: int, main_video_idx: int) -> Optional[dict]:
+        """
+        Решение о схожести пары по хранилищу оценок схожести (meta/scores.py) без загрузки фич.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            main_video_idx (int): Индекс главного видео из списка в мета данных.
+        Returns:
+            comparison_info (Optional[dict]): Результат сравнения видео (are_similar и max_similarity) или None,
+                                              если для решения нужно сравнить фичи.
         """
-        Функция сравнивает текущее видео (его фичи) с текущим главным видео (его фичами).
+        short_video_idx, long_video_idx = self.order_pair(video_idx, main_video_idx)
+        short_hash = self.meta_data['features_hash'][short_video_idx]
+        long_hash = self.meta_data['features_hash'][long_video_idx]
+        if short_hash is None or long_hash is None:
+            return None
+        record = self.score_store.get(short_hash, long_hash, self.scores_model_version(), self.model_frames_step)
+        are_similar = PairScoreStore.decide(record, self.model_threshold)
+        if are_similar is None:
+            return None
+        return {'are_similar': are_similar, 'max_similarity': PairScoreStore.max_similarity(record)}
+
+    def compare_video_and_main_video(self, video_idx: int, main_video_idx: int, group_idx_where_main: int,
+                                     video_features: Optional[np.ndarray]) -> dict:
+        """
+        Функция сравнивает текущее видео (его фичи) с текущим главным видео (его фичами). Фичи главного видео
+        читаются потоком из БД (см. load_video_features).
         Предполагается, что главное видео длиннее. После завершения работы функции мета данные обновляются.
         Args:
             video_idx (int): Индекс видео из списка в мета данных.
             main_video_idx (int): Индекс главного видео из списка в мета данных.
             group_idx_where_main (int): Индекс группы с которой соотносится главное видео.
+            video_features (Optional[np.ndarray]): Фичи текущего видео (None - пара уже сравнивалась, и ее решение
+                                                   есть в хранилище оценок схожести).
 
         Returns:
             comparison_info (dict): Результат сравнения видео:
                     comparison_info['are_similar'] (bool): Похожи ли видео.
                     comparison_info['max_similarity'] (float): Максимальная достигнутая оценка схожести
-                    comparison_info['was_main_compared_with_current_before'] (bool): Было ли текущее главное видео
-                                                                                     сравнено с текущим видео ранее.
         """
-        # скачивание
-        if not self.meta_data['comparison_submeta'][video_idx]['was_main_video_downloaded'][group_idx_where_main]:
-            # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
-            log.info(f"\t\tDownloading main video...")
-            self.download_features_from_db(main_video_idx)
-            self.meta_data['comparison_submeta'][video_idx]['was_main_video_downloaded'][group_idx_where_main] = True
-            self.update_meta()
-        if not self.meta_data['comparison_submeta'][video_idx]['was_main_video_compared_with_current'][
-            group_idx_where_main]:
-            # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
-            log.info(f"\t\tComparing main video...")
-            short_video_info = {'features_path': self.meta_data['local_features_paths'][video_idx],
-                                'duration': self.meta_data['videos_duration'][video_idx]}
-            long_video_info = {'features_path': self.meta_data['local_features_paths'][main_video_idx],
-                               'duration': self.meta_data['videos_duration'][main_video_idx]}
-            comparison_result = self.model.compare_videos(short_video_info, long_video_info, self.model_threshold,
-                                                          self.model_frames_step)
-            comparison_result['was_main_compared_with_current_before'] = False
-            os.remove(str(self.meta_data['local_features_paths'][main_video_idx]))
-            self.meta_data['comparison_submeta'][video_idx]['was_main_video_compared_with_current'][
-                group_idx_where_main] = True  # pylint: disable=line-too-long
+        comparison_result = self.cached_comparison(video_idx, main_video_idx)
+        if comparison_result is not None:
+            # пара уже сравнивалась (подробнее тут meta/scores.py)
+            self.record_comparison(video_idx, group_idx_where_main, comparison_result['are_similar'])
             self.update_meta()
-        else:
-            comparison_result = {'was_main_compared_with_current_before': True}
+            return comparison_result
+        # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
+        log.info(f"\t\tComparing main video...")
+        comparison_result = self.compare_features(video_idx, main_video_idx, video_features,
+                                                  self.load_video_features(main_video_idx))
+        self.record_comparison(video_idx, group_idx_where_main, comparison_result['are_similar'])
+        self.update_meta()
         return comparison_result
 
+    def record_comparison(self, video_idx: int, group_idx: int, are_similar: bool):
+        """
+        Функция записывает результат сравнения текущего видео с главным видео группы group_idx: если видео схожи,
+        то текущее видео добавляется в группу, иначе курсор сдвигается на следующее главное видео.
+        Мета данные не обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+            group_idx (int): Индекс группы с которой соотносится главное видео.
+            are_similar (bool): Похожи ли видео.
+        """
+        submeta = self.meta_data['comparison_submeta'][video_idx]
+        if are_similar:
+            self.meta_data['groups_content_video_paths'][group_idx].append(
+                str(self.meta_data['remote_videos_paths'][video_idx]))
+            submeta['matched_group'] = group_idx
+        else:
+            submeta['next_main_cursor'] = group_idx + 1
+
+    def add_main_video(self, video_idx: int):
+        """
+        Функция делает текущее видео главным видео новой группы. Мета данные не обновляются.
+        Args:
+            video_idx (int): Индекс видео из списка в мета данных.
+        """
+        self.meta_data['main_videos_in_groups_indices'].append(video_idx)
+        self.meta_data['main_videos_in_groups_videos_paths'].append(self.meta_data['remote_videos_paths'][video_idx])
+        self.meta_data['groups_content_video_paths'].append([])
+        self.meta_data['num_groups_found'] += 1
+
     def compare_video_to_main_videos(self, video_idx):
         """
         Функция сравнивает текущее видео (его фичи) с текущими главными видео (их фичами).
         Предполагается, что все главные видео длиннее. После завершения работы функции мета данные обновляются.
-        Кроме того, по завершении работы, функция проводит локальное удаление текущего видео, а также
-        оставшихся главных.
+        Фичи текущего видео загружаются в память один раз и только если хотя бы одной пары нет в хранилище
+        оценок схожести.
         Args:
             video_idx: Индекс текущего видео из списка в мета данных.
         """
@@ -356,62 +928,42 @@ class MetaData:
             # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
             log.info("\tCurrent video with error.")
             log.info("----------------------")
-            self.meta_data['was_video_compared'] = True
-            self.update_meta()
             return
 
-        if self.meta_data['comparison_submeta'][video_idx] is None:
+        submeta = self.meta_data['comparison_submeta'][video_idx]
+        if not submeta['is_initialized']:
             # no comparison sybmeta data found
             # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
             log.info("\tInitializing comparison submeta for video...")
-            self.meta_data['comparison_submeta'][video_idx] = init_submeta(
-                main_videos_indices=self.meta_data['main_videos_in_groups_indices'],
-                num_main_videos=self.meta_data['num_groups_found'],
-                video_to_compare_idx=video_idx)
-            self.update_meta()
-
-        if not self.meta_data['comparison_submeta'][video_idx]['was_current_video_downloaded']:
-            # not download of cur video found
-            # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
-            log.info("\tDownloading current video...")
-            self.download_features_from_db(video_idx)
-            self.meta_data['comparison_submeta'][video_idx]['was_current_video_downloaded'] = True
+            init_submeta(submeta, num_main_videos=self.meta_data['num_groups_found'])
             self.update_meta()
 
-        if not self.meta_data['comparison_submeta'][video_idx]['was_current_video_compared']:
+        if not submeta['was_current_video_compared']:
             # cur video was not compared
             # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
             log.info("\tComparing current video and main videos...")
-            for group_idx_where_main, main_video_idx in enumerate(
-                    self.meta_data['comparison_submeta'][video_idx]['main_videos_indices']):
+            video_features = None
+            while submeta['matched_group'] == NO_GROUP and submeta['next_main_cursor'] < submeta['num_main_videos']:
                 # 2nd video is longer!
+                group_idx_where_main = int(submeta['next_main_cursor'])
                 # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
-                log.info(
-                    f"\tComparing main video {group_idx_where_main}/{self.meta_data['comparison_submeta'][video_idx]['num_main_videos']}")  # pylint: disable=line-too-long
-
-                comparison_result = self.compare_video_and_main_video(video_idx, main_video_idx, group_idx_where_main)
-                if not comparison_result['was_main_compared_with_current_before']:
-
-                    if not comparison_result['are_similar']:
-                        self.meta_data['comparison_submeta'][video_idx]["is_current_similar_to_main_videos"][
-                            group_idx_where_main] = False
-                    else:
-                        # are similar
-                        self.meta_data['groups_content_video_paths'][group_idx_where_main].append(
-                            str(self.meta_data['remote_videos_paths'][video_idx]))  # pylint: disable=line-too-long
-                        break
-            if sum(self.meta_data['comparison_submeta'][video_idx]['is_current_similar_to_main_videos']) == 0:
+                log.info(f"\tComparing main video {group_idx_where_main}/{submeta['num_main_videos']}")
+                main_video_idx = self.meta_data['main_videos_in_groups_indices'][group_idx_where_main]
+                if video_features is None and self.cached_comparison(video_idx, main_video_idx) is None:
+                    # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
+                    log.info("\tLoading current video...")
+                    video_features = self.load_video_features(video_idx)
+                self.compare_video_and_main_video(video_idx, main_video_idx, group_idx_where_main, video_features)
+            if submeta['matched_group'] == NO_GROUP:
                 # if video is not in any group
-                self.meta_data['main_videos_in_groups_indices'].append(video_idx)
-                self.meta_data['main_videos_in_groups_videos_paths'].append(
-                    self.meta_data['remote_videos_paths'][video_idx])  # pylint: disable=line-too-long
-                self.meta_data['groups_content_video_paths'].append([])
-                self.meta_data['num_groups_found'] += 1
+                self.add_main_video(video_idx)
+                if self.model_search == 'index' and video_features is not None:
+                    # иначе индекс строится при первом сравнении, решения о котором нет в хранилище оценок
+                    self.temporal_index(video_idx, video_features)
 
             # pylint: disable=logging-fstring-interpolation, f-string-without-interpolation
             log.info("\tUpdating meta for current video...")
-            os.remove(str(self.meta_data['local_features_paths'][video_idx]))
-            self.meta_data['comparison_submeta'][video_idx]['was_current_video_compared'] = True
+            submeta['was_current_video_compared'] = True
             self.update_meta()
 
     def compare_videos(self):
@@ -425,3 +977,5 @@ class MetaData:
             log.info(f"Comparing video {video_idx}/{self.meta_data['num_videos']}:")
             self.compare_video_to_main_videos(video_idx)
             log.info("Done.\n----------------------")
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"Peak RSS per stage (bytes): {self.memory_tracker.summary()}")
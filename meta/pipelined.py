@@ -0,0 +1,97 @@
+"""
+Модуль описывает конвейерный режим пайплайна (1-3 этапы одновременно, подробнее тут meta/meta.py MetaData):
+фичи вытягиваются в отдельном потоке, а сравнение видео начинается, как только из него вытянуты фичи.
+"""
+import queue
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.memory import MemoryRecord  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def prefetch_features(meta_obj, video_idx: int) -> Optional[Tuple[int, Optional[np.ndarray]]]:
+    """
+    Часть 1 этапа пайплайна для одного видео, не изменяющая мета данные: скачивание видео и вытягивание из него
+    фич (выполняется в отдельном потоке, см. run_pipelined). Результат записывается в мета данные
+    MetaData.process_video. Потребление памяти при этом не попадает в отчет, так как high-water mark RSS общий
+    для всех потоков процесса.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        video_idx (int): Индекс видео из списка в мета данных.
+    Returns:
+        extracted (Optional[Tuple[int, Optional[np.ndarray]]]): Количество считанных кадров и фичи видео
+                                                                (см. MetaData.compute_features) или None, если
+                                                                фичи уже вытянуты или есть в кэше фич.
+    """
+    meta_data = meta_obj.meta_data
+    if meta_data['were_features_extracted'][video_idx] or meta_data['was_video_with_error'][video_idx]:
+        return None
+    if not meta_data['was_video_downloaded'][video_idx]:
+        if meta_obj.feature_cache is not None and \
+                meta_obj.feature_cache.contains(meta_obj.feature_cache_key(video_idx)):
+            return None
+        meta_obj.db.db_get_file(str(meta_data['remote_videos_paths'][video_idx]))
+    return meta_obj.compute_features(video_idx, meta_obj.video_location(video_idx),
+                                     MemoryRecord('extract_features', video_idx))
+
+
+def run_pipelined(meta_obj):
+    """
+    Реализация 1-3 этапов пайплайна в конвейерном режиме. Мета данные сортируются по длительности из заголовков
+    (см. MetaData.probe_videos), поэтому 2 этап выполняется до 1. Затем фичи вытягиваются в отдельном потоке
+    от самых длинных видео к самым коротким, а сравнение (3 этап) текущего видео начинается, как только из него
+    вытянуты фичи: к этому моменту все более длинные видео уже обработаны и распределены по группам.
+    Поток вытягивания не изменяет мета данные и отчет о потреблении памяти (см. prefetch_features):
+    результат записывается, сохраняется и выгружается в основном потоке перед сравнением видео.
+    Результат группировки совпадает с MetaData.compare_videos при том же порядке видео.
+    После завершения работы функции мета данные обновляются.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+    """
+    log.info("Реализизация 1-3 этапов пайплайна в конвейерном режиме.")
+    meta_obj.probe_videos()
+    if meta_obj.meta_data['num_groups_found'] == 0:
+        # после начала сравнения порядок видео менять нельзя (группы ссылаются на индексы видео);
+        # сортировка детерминирована, поэтому при перезапуске порядок видео все равно не меняется
+        meta_obj.meta_data.sort_by_key(target_key='probed_videos_duration')
+        meta_obj.update_meta()
+    num_videos = meta_obj.meta_data['num_videos']
+
+    # не больше одного видео с вытянутыми, но еще не сохраненными фичами в очереди
+    ready_videos = queue.Queue(maxsize=1)
+
+    def _extract():
+        try:
+            for video_idx in range(num_videos):
+                # pylint: disable=logging-fstring-interpolation
+                log.info(f"Обработка видео {video_idx + 1}/{num_videos}")
+                ready_videos.put((video_idx, prefetch_features(meta_obj, video_idx)))
+        except Exception as error:  # pylint: disable=broad-except
+            ready_videos.put(error)
+            return
+        ready_videos.put(None)
+
+    extraction_thread = threading.Thread(target=_extract, name='extraction', daemon=True)
+    extraction_thread.start()
+    while True:
+        ready_video = ready_videos.get()
+        if ready_video is None:
+            break
+        if isinstance(ready_video, Exception):
+            raise ready_video
+        video_idx, extracted = ready_video
+        meta_obj.process_video(video_idx, extracted)
+        del ready_video, extracted
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"Comparing video {video_idx}/{num_videos}:")
+        meta_obj.compare_video_to_main_videos(video_idx)
+        log.info("Done.\n----------------------")
+    extraction_thread.join()
+    log.info("1-3 этапы пайплайна реализованы.")
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"Peak RSS per stage (bytes): {meta_obj.memory_tracker.summary()}")
@@ -0,0 +1,44 @@
+"""
+Модуль, описывающий политику размещения фич видео: где хранятся фичи между 1 и 3 этапами пайплайна.
+"""
+
+
+class FeaturePlacement:
+    """
+    Политика размещения фич:
+        local - фичи остаются на локальном диске и читаются на месте на 3 этапе, во временную папку БД
+                они выгружаются только по запросу (MetaData.sync_features), например, для других узлов или
+                для перезапуска на другом узле.
+        remote - фичи выгружаются во временную папку БД и удаляются локально, на 3 этапе они скачиваются
+                 заново (поведение по умолчанию).
+        write_through - фичи выгружаются во временную папку БД, но остаются на локальном диске и
+                        читаются на месте на 3 этапе.
+    """
+    LOCAL = 'local'
+    REMOTE = 'remote'
+    WRITE_THROUGH = 'write_through'
+    POLICIES = (LOCAL, REMOTE, WRITE_THROUGH)
+
+    @staticmethod
+    def check(policy: str):
+        """
+        Проверка, что политика существует.
+        Args:
+            policy (str): Политика размещения фич.
+        """
+        if policy not in FeaturePlacement.POLICIES:
+            raise NameError(f"Feature placement policy {policy} doesn't exist!")
+
+    @staticmethod
+    def upload_on_extract(policy: str) -> bool:
+        """
+        Returns (bool): Нужно ли выгружать фичи в БД сразу после их вытягивания.
+        """
+        return policy in (FeaturePlacement.REMOTE, FeaturePlacement.WRITE_THROUGH)
+
+    @staticmethod
+    def keep_local(policy: str) -> bool:
+        """
+        Returns (bool): Нужно ли хранить фичи на локальном диске до конца 3 этапа.
+        """
+        return policy in (FeaturePlacement.LOCAL, FeaturePlacement.WRITE_THROUGH)
@@ -0,0 +1,41 @@
+"""
+Модуль для повторной группировки видео (3 этап пайплайна, подробнее тут meta/meta.py MetaData) с другим порогом
+схожести без повторного вытягивания фич.
+"""
+import logging
+
+from meta.submeta import init_submeta_table  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def reset_groups(meta_obj):
+    """
+    Функция удаляет результаты 3 этапа пайплайна (группы и состояния сравнения видео). Мета данные не обновляются.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+    """
+    meta_obj.meta_data['num_groups_found'] = 0
+    meta_obj.meta_data['main_videos_in_groups_indices'] = []
+    meta_obj.meta_data['main_videos_in_groups_videos_paths'] = []
+    meta_obj.meta_data['groups_content_video_paths'] = []
+    meta_obj.meta_data['comparison_submeta'] = init_submeta_table(meta_obj.meta_data['num_videos'])
+
+
+def regroup(meta_obj, threshold: float):
+    """
+    Повторная реализация 3 этапа пайплайна с другим порогом схожести. Решения о парах, которые уже
+    сравнивались, принимаются по хранилищу оценок схожести без запуска модели и без чтения фич (подробнее тут
+    meta/scores.py, MetaData.cached_comparison), фичи читаются и модель запускается только для новых пар и
+    недосчитанных окон.
+    После завершения работы функции мета данные обновляются.
+    Args:
+        meta_obj (MetaData): Объект MetaData.
+        threshold (float): Новое пороговое значение для сравнения видео.
+    """
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"Regrouping videos with threshold {threshold}...")
+    meta_obj.model_threshold = threshold
+    reset_groups(meta_obj)
+    meta_obj.update_meta()
+    meta_obj.compare_videos()
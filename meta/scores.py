@@ -0,0 +1,149 @@
+"""
+Модуль, описывающий хранилище оценок схожести пар видео (файл SQLite).
+
+Для каждой пары (фичи короткого видео, фичи длинного видео, версия модели, шаг) хранятся нижняя и верхняя
+граница оценки схожести каждого окна (кропа длинного видео, начинающегося с offset, см. video/compare_videos.py
+VideoSimilarityModel.compare_videos; границы совпадают, если окно было обработано полностью), следующий
+непросчитанный offset и признак того, что просчитаны все окна.
+Фичи идентифицируются по хэшу их содержимого, поэтому записи не зависят от порядка и путей видео.
+
+Это позволяет повторно сгруппировать видео с другим порогом схожести без запуска модели:
+    - если нижняя граница оценки хотя бы одного окна не меньше порога, то видео схожи;
+    - если просчитаны все окна, а верхние границы оценок всех меньше порога, то видео не схожи;
+    - иначе, если порог попадает между границами оценки какого-то окна, то пара сравнивается заново,
+      а если нет (сравнение было остановлено на первом схожем окне при большем пороге), то досчитываются
+      только оставшиеся окна.
+"""
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def hash_features(features: np.ndarray) -> str:
+    """
+    Args:
+        features (np.ndarray): Фичи видео.
+    Returns (str): Хэш содержимого фич (sha1).
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(str((features.dtype.str, features.shape)).encode('utf8'))
+    sha1.update(np.ascontiguousarray(features).data)
+    return sha1.hexdigest()
+
+
+class PairScoreStore:
+    """
+    Хранилище оценок схожести окон для пар видео.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path (str): Путь до файла SQLite.
+        """
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pairs ("
+                                    "short_hash TEXT, long_hash TEXT, model_version TEXT, step INTEGER, "
+                                    "next_offset INTEGER, is_complete INTEGER, "
+                                    "PRIMARY KEY (short_hash, long_hash, model_version, step))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS windows ("
+                                    "short_hash TEXT, long_hash TEXT, model_version TEXT, step INTEGER, "
+                                    "offset INTEGER, score REAL, low REAL, high REAL, "
+                                    "PRIMARY KEY (short_hash, long_hash, model_version, step, offset))")
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(windows)")]
+            if 'low' not in columns:
+                # хранилища, созданные до появления границ оценок: все оценки точные
+                self.connection.execute("ALTER TABLE windows ADD COLUMN low REAL")
+                self.connection.execute("ALTER TABLE windows ADD COLUMN high REAL")
+                self.connection.execute("UPDATE windows SET low = score, high = score")
+
+    def get(self, short_hash: str, long_hash: str, model_version: str, step: int) -> Optional[dict]:
+        """
+        Args:
+            short_hash (str): Хэш фич короткого видео.
+            long_hash (str): Хэш фич длинного видео.
+            model_version (str): Версия модели (см. VideoSimilarityModel.model_version).
+            step (int): Шаг, с которым сдвигается окно по длинному видео.
+        Returns:
+            record (Optional[dict]): Запись о паре (None, если пара еще не сравнивалась):
+                    record['scores'] (Dict[int, Tuple[float, float]]): Нижняя и верхняя граница оценки схожести
+                                                                       просчитанных окон по их offset.
+                    record['next_offset'] (int): Следующий непросчитанный offset.
+                    record['is_complete'] (bool): Просчитаны ли все окна.
+        """
+        key = (short_hash, long_hash, model_version, step)
+        with self.lock:
+            row = self.connection.execute("SELECT next_offset, is_complete FROM pairs WHERE short_hash = ? AND "
+                                          "long_hash = ? AND model_version = ? AND step = ?", key).fetchone()
+            if row is None:
+                return None
+            scores = {offset: (low, high) for offset, low, high in
+                      self.connection.execute("SELECT offset, low, high FROM windows WHERE short_hash = ? AND "
+                                              "long_hash = ? AND model_version = ? AND step = ?", key)}
+        return {'scores': scores, 'next_offset': row[0], 'is_complete': bool(row[1])}
+
+    def put(self, short_hash: str, long_hash: str, model_version: str, step: int,  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            scores: Dict[int, Tuple[float, float]],
+            next_offset: int, is_complete: bool):
+        """
+        Сохранение оценок новых окон пары.
+        Args:
+            short_hash (str): Хэш фич короткого видео.
+            long_hash (str): Хэш фич длинного видео.
+            model_version (str): Версия модели (см. VideoSimilarityModel.model_version).
+            step (int): Шаг, с которым сдвигается окно по длинному видео.
+            scores (Dict[int, Tuple[float, float]]): Нижняя и верхняя граница оценки схожести окон по их offset.
+            next_offset (int): Следующий непросчитанный offset.
+            is_complete (bool): Просчитаны ли все окна.
+        """
+        key = (short_hash, long_hash, model_version, step)
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [key + (int(offset), float(low), float(low), float(high))
+                                         for offset, (low, high) in scores.items()])
+            self.connection.execute("INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?, ?)",
+                                    key + (int(next_offset), int(is_complete)))
+
+    @staticmethod
+    def decide(record: Optional[dict], threshold: float) -> Optional[bool]:
+        """
+        Решение о схожести пары по сохраненным оценкам.
+        Args:
+            record (Optional[dict]): Запись о паре (см. PairScoreStore.get).
+            threshold (float): Пороговое значение для сравнения видео.
+        Returns (Optional[bool]): Схожи ли видео (None, если для решения нужно досчитать окна).
+        """
+        if record is None:
+            return None
+        if any(low >= threshold for low, _ in record['scores'].values()):
+            return True
+        if record['is_complete'] and all(high < threshold for _, high in record['scores'].values()):
+            return False
+        return None
+
+    @staticmethod
+    def resume_offset(record: Optional[dict], threshold: float) -> int:
+        """
+        Args:
+            record (Optional[dict]): Запись о паре (см. PairScoreStore.get).
+            threshold (float): Пороговое значение для сравнения видео.
+        Returns (int): offset, с которого нужно продолжить сравнение пары (0, если порог попадает между
+                       границами оценки какого-то окна и пару нужно сравнить заново).
+        """
+        if record is None or any(low < threshold <= high for low, high in record['scores'].values()):
+            return 0
+        return record['next_offset']
+
+    @staticmethod
+    def max_similarity(record: dict) -> float:
+        """
+        Args:
+            record (dict): Запись о паре (см. PairScoreStore.get).
+        Returns (float): Максимальная достигнутая оценка схожести (нижняя граница).
+        """
+        return max([0] + [low for low, _ in record['scores'].values()])
@@ -2,39 +2,112 @@
 Модуль, для создания структуры, позволяющей,
  хранить дополнительную информацию о состоянии текущего
  видео при сравнении с другими (главными).
+
+Состояние каждого видео хранится в одной записи фиксированного размера (numpy structured array), размер
+которой не зависит от количества главных видео: так как главные видео сравниваются с текущим по порядку,
+достаточно хранить индекс следующего главного видео (курсор) и индекс группы, в которую попало видео.
 """
-from typing import List
+from typing import List, Optional
+
+import numpy as np
+
+SUBMETA_DTYPE = np.dtype([('is_initialized', bool),
+                          ('was_current_video_downloaded', bool),
+                          ('was_current_video_compared', bool),
+                          ('num_main_videos', np.int32),
+                          ('next_main_cursor', np.int32),
+                          ('matched_group', np.int32)])
 
+NO_GROUP = -1
 
-def init_submeta(main_videos_indices: List[int], video_to_compare_idx: int, num_main_videos: int) -> dict:
+
+def init_submeta_table(num_videos: int) -> np.ndarray:
+    """
+    Создание таблицы состояний сравнения для всех видео (ни одно состояние еще не инициализировано).
+    Args:
+        num_videos (int): Количество видео.
+    Returns:
+        submeta_table (np.ndarray): Массив записей SUBMETA_DTYPE.
+    """
+    submeta_table = np.zeros(num_videos, dtype=SUBMETA_DTYPE)
+    submeta_table['matched_group'] = NO_GROUP
+    return submeta_table
+
+
+def init_submeta(submeta: np.void, num_main_videos: int):
     """
     Инициализация структуры, позволяющей,
     хранить дополнительную информацию о состоянии текущего
     видео при сравнении с главными видео.
 
     Args:
-        main_videos_indices (List[int]): Массив индексов из meta соответствующих главным видео.
-        video_to_compare_idx (int): Индекс из meta текущего видео, которое будет сравниваться с главными.
-        num_main_videos (int): Текущее количество главных видео.
+        submeta (np.void): Запись из таблицы init_submeta_table (изменяется на месте).
+        num_main_videos (int): Текущее количество главных видео (с ними и будет сравниваться видео:
+                               это первые num_main_videos индексов в meta_data['main_videos_in_groups_indices']).
 
+    Поля записи:
+        is_initialized (bool): Была ли структура инициализирована.
+        was_current_video_downloaded (bool): Было ли текущее видео скачано из БД на локальный диск (только при
+                                             сравнении батчами, см. meta/main_centric.py).
+        was_current_video_compared (bool): Было ли текущее видео сравнено со всеми главными видео.
+        num_main_videos (int): Количество главных видео, с которыми сравнивается текущее.
+        next_main_cursor (int): Индекс группы следующего главного видео, с которым нужно сравнить текущее
+                                (со всеми предыдущими текущее видео уже сравнено и не схоже).
+        matched_group (int): Индекс группы, в которую попало текущее видео (NO_GROUP, если такой нет).
+    """
+    submeta['is_initialized'] = True
+    submeta['was_current_video_downloaded'] = False
+    submeta['was_current_video_compared'] = False
+    submeta['num_main_videos'] = num_main_videos
+    submeta['next_main_cursor'] = 0
+    submeta['matched_group'] = NO_GROUP
 
+
+def submeta_from_legacy(legacy_submeta: List[Optional[dict]]) -> np.ndarray:
+    """
+    Перевод состояний сравнения из формата предыдущих версий (словарь со списками флагов длины num_main_videos
+    для каждого видео) в таблицу записей.
+    Args:
+        legacy_submeta (List[Optional[dict]]): Состояния сравнения в старом формате.
+    Returns:
+        submeta_table (np.ndarray): Массив записей SUBMETA_DTYPE.
+    """
+    submeta_table = init_submeta_table(len(legacy_submeta))
+    for video_idx, legacy in enumerate(legacy_submeta):
+        if legacy is None:
+            continue
+        submeta = submeta_table[video_idx]
+        init_submeta(submeta, legacy['num_main_videos'])
+        submeta['was_current_video_downloaded'] = legacy['was_current_video_downloaded']
+        submeta['was_current_video_compared'] = legacy['was_current_video_compared']
+        cursor = 0
+        for was_compared, is_similar in zip(legacy['was_main_video_compared_with_current'],
+                                            legacy['is_current_similar_to_main_videos']):
+            if not was_compared:
+                break
+            if is_similar:
+                # если видео не успело попасть в группу до остановки, то сравнение с этим главным видео повторится
+                if legacy['was_current_video_compared']:
+                    submeta['matched_group'] = cursor
+                break
+            cursor += 1
+        submeta['next_main_cursor'] = cursor
+    return submeta_table
+
+
+def upgrade_submeta_table(submeta_table: np.ndarray) -> np.ndarray:
+    """
+    Перевод таблицы записей, сохраненной с другим набором полей (например, с удаленным полем
+    was_cursor_main_downloaded), в SUBMETA_DTYPE.
+    Args:
+        submeta_table (np.ndarray): Массив записей.
     Returns:
-        Словарь со следующими ключами:
-            was_current_video_downloaded (bool): Было ли текущее видео скачано из БД (локальное наличие).
-            was_current_video_compared (bool): Было ли текущее видео сравнено со всеми главными видео.
-            current_video_idx (int): Индекс текущего видео в meta.
-            main_videos_indices (List[int]): Массив индексов из meta соответствующих главным видео.
-            was_main_video_downloaded (List[bool]): Было ли главное видео скачано из БД (локальное наличие).
-            was_main_video_compared_with_current (List[bool]): Было ли текущее видео сравнено с главным.
-            is_current_similar_to_main_videos (List[bool]): Результат сравнения текущего видео с главным.
-            num_main_videos (int): Текущее количество главных видео.
-    """
-
-    return {'was_current_video_downloaded': False,
-            'was_current_video_compared': False,
-            'current_video_idx': video_to_compare_idx,
-            'main_videos_indices': main_videos_indices,
-            'was_main_video_downloaded': [False for _ in range(num_main_videos)],
-            'was_main_video_compared_with_current': [False for _ in range(num_main_videos)],
-            'is_current_similar_to_main_videos': [True for _ in range(num_main_videos)],
-            'num_main_videos': num_main_videos}
+        submeta_table (np.ndarray): Массив записей SUBMETA_DTYPE.
+    """
+    if submeta_table.dtype == SUBMETA_DTYPE:
+        return submeta_table
+    upgraded = init_submeta_table(len(submeta_table))
+    for name in SUBMETA_DTYPE.names:
+        if name in submeta_table.dtype.names:
+            upgraded[name] = submeta_table[name]
+    return upgraded
@@ -0,0 +1,83 @@
+"""
+Модуль для однократного экспорта модели ViSiL в замороженные графы (frozen graph): переменные заменяются
+константами, поэтому при следующих запусках граф не строится в Python, чекпоинт и pca.npz не читаются, а
+в памяти процесса нет переменных и их инициализаторов.
+
+Графы вытягивания фич (extractor.pb: вход input, выход region_vectors) и сравнения (similarity.pb: входы query
+и target, выход similarity) сохраняются отдельно в поддиректорию frozen директории чекпоинта, так что процессы,
+которым нужно только сравнение, загружают только маленький граф. Рядом сохраняется manifest.json с отпечатком
+конфигурации модели (см. utils/fingerprint.py), замороженные графы используются, только если он совпадает
+(см. video/compare_videos.py VideoSimilarityModel.build_model).
+
+Модуль импортирует TF только при экспорте.
+"""
+import os
+import json
+from typing import Optional
+
+FROZEN_DIRNAME = 'frozen'
+MANIFEST_FILENAME = 'manifest.json'
+# часть модели -> (строить граф вытягивания фич, строить граф сравнения, имя выходного узла)
+PARTS = {'extractor': (True, False, 'region_vectors'),
+         'similarity': (False, True, 'similarity')}
+
+
+def frozen_dir(model_dir: str) -> str:
+    """Путь до директории с замороженными графами."""
+    return os.path.join(model_dir, FROZEN_DIRNAME)
+
+
+def read_manifest(model_dir: str) -> Optional[dict]:
+    """
+    Args:
+        model_dir (str): Путь до директории с чекпоинтом модели.
+    Returns (Optional[dict]): Описание экспортированных графов (None, если экспорта не было).
+    """
+    manifest_path = os.path.join(frozen_dir(model_dir), MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(model_dir: str, manifest: dict):
+    """
+    Args:
+        model_dir (str): Путь до директории с чекпоинтом модели.
+        manifest (dict): Описание экспортированных графов (см. read_manifest).
+    """
+    manifest_path = os.path.join(frozen_dir(model_dir), MANIFEST_FILENAME)
+    with open(manifest_path + '.part', 'w', encoding='utf8') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + '.part', manifest_path)
+
+
+def export_frozen_graphs(model_dir: str, fingerprint: str, stamp: str, **visil_kwargs):
+    """
+    Экспорт замороженных графов вытягивания фич и сравнения.
+    Args:
+        model_dir (str): Путь до директории с чекпоинтом модели.
+        fingerprint (str): Отпечаток конфигурации модели.
+        stamp (str): Дешевый отпечаток конфигурации модели по размерам и времени изменения файлов, при совпадении
+                     которого fingerprint не пересчитывается (см. utils/fingerprint.py).
+        **visil_kwargs: Параметры ViSiL (dims, top_k_regions и т.д.).
+    """
+    # pylint: disable=import-error, import-outside-toplevel
+    import tensorflow as tf
+    from model.visil import ViSiL
+
+    export_dir = frozen_dir(model_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    for part, (build_extractor, build_similarity, output_name) in PARTS.items():
+        with tf.Graph().as_default() as graph:
+            model = ViSiL(model_dir, build_extractor=build_extractor, build_similarity=build_similarity,
+                          **visil_kwargs)
+            tf.identity(model.region_vectors if build_extractor else model.similarity, name=output_name)
+            graph_def = tf.graph_util.convert_variables_to_constants(model.sess, graph.as_graph_def(),
+                                                                     [output_name])
+            graph_def = tf.graph_util.remove_training_nodes(graph_def, protected_nodes=[output_name])
+            model.sess.close()
+        tf.io.write_graph(graph_def, export_dir, f"{part}.pb", as_text=False)
+    # manifest записывается последним, поэтому недописанные графы не загружаются
+    write_manifest(model_dir, {'fingerprint': fingerprint, 'stamp': stamp, 'parts': list(PARTS),
+                               'visil_kwargs': visil_kwargs})
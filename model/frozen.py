@@ -0,0 +1,54 @@
+"""
+ViSiL, загружаемый из замороженных графов (см. model/export.py) вместо построения графа и чтения чекпоинта.
+"""
+import os
+import logging
+
+import tensorflow as tf
+
+from .visil import ViSiL
+from .export import frozen_dir, PARTS
+
+log = logging.getLogger(__name__)
+
+
+# pylint: disable=too-many-instance-attributes
+class FrozenViSiL(ViSiL):
+    """
+    ViSiL с теми же методами вытягивания фич и сравнения (extract_features, calculate_video_similarity),
+    но графы которого загружаются из extractor.pb и similarity.pb.
+    """
+
+    def __init__(self, model_dir, build_extractor=True, build_similarity=True, session_config=None):
+        """
+        Args:
+            model_dir (str): Путь до директории с чекпоинтом модели (и поддиректорией frozen).
+            build_extractor (bool): Загружать ли граф вытягивания фич.
+            build_similarity (bool): Загружать ли граф сравнения.
+            session_config (Optional[dict]): Дополнительные параметры tf.ConfigProto (см. utils/cpu_profile.py).
+        """
+        # pylint: disable=super-init-not-called
+        self.net = 'resnet'
+        self.load_queries = False
+        self.build_extractor = build_extractor
+        self.build_similarity = build_similarity
+        graph = tf.Graph()
+        with graph.as_default():
+            for part, (part_extractor, part_similarity, _) in PARTS.items():
+                if (part_extractor and build_extractor) or (part_similarity and build_similarity):
+                    graph_def = tf.GraphDef()
+                    with tf.gfile.GFile(os.path.join(frozen_dir(model_dir), f"{part}.pb"), 'rb') as graph_file:
+                        graph_def.ParseFromString(graph_file.read())
+                    # графы импортируются в свои области имен, так как безымянные операции в них совпадают
+                    tf.import_graph_def(graph_def, name=part)
+        if build_extractor:
+            self.frames = graph.get_tensor_by_name('extractor/input:0')
+            self.region_vectors = graph.get_tensor_by_name('extractor/region_vectors:0')
+        if build_similarity:
+            self.query = graph.get_tensor_by_name('similarity/query:0')
+            self.target = graph.get_tensor_by_name('similarity/target:0')
+            self.similarity = graph.get_tensor_by_name('similarity/similarity:0')
+        log.info(f'Frozen graphs loaded from {frozen_dir(model_dir)}')  # pylint: disable=logging-fstring-interpolation
+        config = tf.ConfigProto(allow_soft_placement=True, **(session_config or {}))
+        config.gpu_options.allow_growth = True
+        self.sess = tf.Session(graph=graph, config=config)
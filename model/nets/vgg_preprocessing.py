@@ -335,6 +335,39 @@ def preprocess_for_eval(image, output_height, output_width, resize_side):
     return _mean_image_subtraction(image, [_R_MEAN, _G_MEAN, _B_MEAN])
 
 
+def preprocess_for_eval_batch(images, output_height, output_width, resize_side):
+    """Preprocesses a batch of images of the same size for evaluation.
+
+    Equivalent to `preprocess_for_eval` applied to every image, but without
+    per-image control flow: the batch is resized at once (the resize is skipped
+    when the smallest side already equals `resize_side`, e.g. for frames read by
+    utils/manipulate_data.py load_video), cropped with a single slice and
+    centered with a broadcast subtraction.
+
+    Args:
+      images: A 4-D `Tensor` of shape [batch, height, width, 3].
+      output_height: The height of the images after preprocessing.
+      output_width: The width of the images after preprocessing.
+      resize_side: The smallest side of the images for aspect-preserving resizing.
+
+    Returns:
+      A batch of preprocessed images.
+    """
+    shape = tf.shape(images)
+    height, width = shape[1], shape[2]
+    new_height, new_width = _smallest_size_at_least(height, width, resize_side)
+    images = tf.cond(tf.logical_and(tf.equal(new_height, height), tf.equal(new_width, width)),
+                     lambda: tf.to_float(images),
+                     lambda: tf.image.resize_bilinear(images, [new_height, new_width],
+                                                      align_corners=False))
+    offset_height = (new_height - output_height) // 2
+    offset_width = (new_width - output_width) // 2
+    images = tf.slice(images, tf.stack([0, offset_height, offset_width, 0]),
+                      tf.stack([-1, output_height, output_width, -1]))
+    images.set_shape([None, output_height, output_width, 3])
+    return images - tf.constant([_R_MEAN, _G_MEAN, _B_MEAN], dtype=tf.float32)
+
+
 def preprocess_image(image, output_height, output_width, is_training=False,
                      resize_side_min=_RESIZE_SIDE_MIN,
                      resize_side_max=_RESIZE_SIDE_MAX):
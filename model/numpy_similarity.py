@@ -0,0 +1,169 @@
+"""
+Модуль, описывающий реализацию головы сравнения ViSiL (frame_to_frame_similarity и video_to_video_similarity из
+model/visil.py) на NumPy: для сравнения фич не нужны ни граф ResNet, ни сессия TF.
+
+Схожесть регионов считается одним матричным умножением (многопоточный BLAS), свертки Video_Comparator - через
+im2col и матричное умножение. Веса Video_Comparator берутся из чекпоинта модели (для этого один раз нужен TF)
+и сохраняются рядом с ним в npz, после чего TF не импортируется вовсе.
+"""
+import os
+import logging
+from typing import Dict
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+WEIGHTS_FILENAME = 'video_comparator.npz'
+# слои Video_Comparator (см. model/layers.py) и формы их ядер (высота, ширина, входные и выходные каналы)
+LAYERS_SHAPES = {'conv1': (3, 3, 1, 32), 'conv2': (3, 3, 32, 64), 'conv3': (3, 3, 64, 128), 'fconv': (1, 1, 128, 1)}
+
+
+def load_checkpoint_weights(model_dir: str) -> Dict[str, np.ndarray]:
+    """
+    Чтение весов Video_Comparator из чекпоинта TF. Имена переменных keras зависят от порядка создания слоев,
+    поэтому слои определяются по формам ядер.
+    Args:
+        model_dir (str): Путь до директории с чекпоинтом модели.
+    Returns (Dict[str, np.ndarray]): Ядра ({слой}_kernel) и смещения ({слой}_bias) слоев.
+    """
+    import tensorflow as tf  # pylint: disable=import-error, import-outside-toplevel
+
+    reader = tf.train.load_checkpoint(model_dir)
+    weights = {}
+    for name, shape in reader.get_variable_to_shape_map().items():
+        if not name.startswith('video_comparator') or not name.endswith('kernel'):
+            continue
+        for layer, layer_shape in LAYERS_SHAPES.items():
+            if tuple(shape) == layer_shape:
+                weights[f"{layer}_kernel"] = reader.get_tensor(name)
+                weights[f"{layer}_bias"] = reader.get_tensor(name[:-len('kernel')] + 'bias')
+    missing = [layer for layer in LAYERS_SHAPES if f"{layer}_kernel" not in weights]
+    if missing:
+        raise ValueError(f"Layers {missing} of video comparator weren't found in checkpoint {model_dir}!")
+    return weights
+
+
+def symmetric_pad(sim: np.ndarray) -> np.ndarray:
+    """Дополнение карты на 1 с каждой стороны отражением (как tf.pad с mode='SYMMETRIC')."""
+    return np.pad(sim, ((1, 1), (1, 1), (0, 0)), mode='symmetric')
+
+
+def conv2d(sim: np.ndarray, kernel: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    """
+    Свертка без дополнения (padding='VALID') через im2col.
+    Args:
+        sim (np.ndarray): Карта (высота x ширина x каналы).
+        kernel (np.ndarray): Ядро (высота x ширина x входные каналы x выходные каналы).
+        bias (np.ndarray): Смещение (выходные каналы).
+    Returns (np.ndarray): Карта (высота - высота ядра + 1 x ширина - ширина ядра + 1 x выходные каналы).
+    """
+    kernel_h, kernel_w, channels, out_channels = kernel.shape
+    out_h, out_w = sim.shape[0] - kernel_h + 1, sim.shape[1] - kernel_w + 1
+    strides = sim.strides
+    patches = np.lib.stride_tricks.as_strided(sim, shape=(out_h, out_w, kernel_h, kernel_w, channels),
+                                              strides=(strides[0], strides[1]) + strides, writeable=False)
+    out = np.dot(patches.reshape(out_h * out_w, kernel_h * kernel_w * channels),
+                 kernel.reshape(kernel_h * kernel_w * channels, out_channels))
+    out += bias
+    return out.reshape(out_h, out_w, out_channels)
+
+
+def max_pool(sim: np.ndarray) -> np.ndarray:
+    """Max pooling 2x2 с шагом 2 без дополнения (как MaxPool2D([2, 2], 2))."""
+    height, width = sim.shape[0] // 2, sim.shape[1] // 2
+    return sim[:height * 2, :width * 2].reshape(height, 2, width, 2, sim.shape[2]).max(axis=(1, 3))
+
+
+def chamfer_similarity(sim: np.ndarray, max_axis: int, mean_axis: int) -> np.ndarray:
+    """Chamfer similarity (как model/similarity.py chamfer_similarity)."""
+    return sim.max(axis=max_axis, keepdims=True).mean(axis=mean_axis, keepdims=True).squeeze((max_axis, mean_axis))
+
+
+class NumpySimilarity:
+    """
+    Голова сравнения ViSiL на NumPy (с Video_Comparator или без него, как в ViSiL).
+    """
+
+    def __init__(self, model_dir: str, similarity_function: str = 'chamfer', video_comparator: bool = True):
+        """
+        Args:
+            model_dir (str): Путь до директории с чекпоинтом модели.
+            similarity_function (str): chamfer или symmetric_chamfer (как в ViSiL).
+            video_comparator (bool): Применять ли Video_Comparator (ViSiL отключает его для фич уменьшенной
+                                     размерности, тогда видео сравниваются только chamfer similarity).
+        """
+        if similarity_function not in ('chamfer', 'symmetric_chamfer'):
+            raise NameError(f"Similarity function {similarity_function} doesn't exist!")
+        self.similarity_function = similarity_function
+        self.weights = None
+        if not video_comparator:
+            return
+        weights_path = os.path.join(model_dir, WEIGHTS_FILENAME)
+        if os.path.exists(weights_path):
+            weights = dict(np.load(weights_path))
+        else:
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Exporting video comparator weights to {weights_path}...")
+            weights = load_checkpoint_weights(model_dir)
+            np.savez(weights_path, **weights)
+        self.weights = {name: value.astype(np.float32) for name, value in weights.items()}
+
+    def _similarity(self, sim: np.ndarray, axes) -> np.ndarray:
+        """Chamfer или symmetric chamfer similarity по осям axes (максимум по первой, среднее по второй)."""
+        if self.similarity_function == 'chamfer':
+            return chamfer_similarity(sim, axes[0], axes[1])
+        return (chamfer_similarity(sim, axes[0], axes[1]) + chamfer_similarity(sim, axes[1], axes[0])) / 2
+
+    def frame_to_frame_similarity(self, query: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            query (np.ndarray): Фичи первого видео (кадры x регионы x размерность).
+            target (np.ndarray): Фичи второго видео (кадры x регионы x размерность).
+        Returns (np.ndarray): Матрица схожести кадров (кадры первого видео x кадры второго видео).
+        """
+        query_frames, query_regions, dims = query.shape
+        target_frames, target_regions, _ = target.shape
+        # одно матричное умножение вместо tensordot: (кадры x регионы) x (кадры x регионы)
+        regions_sim = np.dot(query.reshape(-1, dims).astype(np.float32, copy=False),
+                             target.reshape(-1, dims).astype(np.float32, copy=False).T)
+        regions_sim = regions_sim.reshape((query_frames, query_regions, target_frames, target_regions))
+        query_valid = np.any(query != 0, axis=-1)
+        target_valid = np.any(target != 0, axis=-1)
+        if self.similarity_function == 'chamfer' and not (query_valid.all() and target_valid.all()):
+            # обнуленные регионы (см. ViSiL с region_weight_threshold) не участвуют ни в максимуме по регионам
+            # второго видео, ни в среднем по регионам первого (как ViSiL.masked_chamfer_similarity)
+            regions_sim[~np.broadcast_to(target_valid[np.newaxis, np.newaxis], regions_sim.shape)] = -np.inf
+            frames_sim = regions_sim.max(axis=3)
+            frames_sim[np.isinf(frames_sim)] = 0
+            weights = query_valid[..., np.newaxis].astype(np.float32)
+            return (frames_sim * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1.)
+        return self._similarity(regions_sim, (3, 1))
+
+    def video_comparator(self, sim: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            sim (np.ndarray): Матрица схожести кадров.
+        Returns (np.ndarray): Уточненная матрица схожести (размеры уменьшены в 4 раза), ограниченная [-1, 1].
+        """
+        sim = sim[..., np.newaxis]
+        for layer in ('conv1', 'conv2', 'conv3'):
+            sim = np.maximum(conv2d(symmetric_pad(sim), self.weights[f"{layer}_kernel"],
+                                    self.weights[f"{layer}_bias"]), 0)
+            if layer != 'conv3':
+                sim = max_pool(sim)
+        sim = conv2d(sim, self.weights['fconv_kernel'], self.weights['fconv_bias'])
+        return np.clip(sim[..., 0], -1., 1.)
+
+    def calculate_video_similarity(self, query: np.ndarray, target: np.ndarray) -> float:
+        """
+        Схожесть видео (как ViSiL.calculate_video_similarity).
+        Args:
+            query (np.ndarray): Фичи первого видео.
+            target (np.ndarray): Фичи второго видео.
+        Returns (float): Оценка схожести.
+        """
+        sim = self.frame_to_frame_similarity(query, target)
+        if self.weights is not None:
+            sim = self.video_comparator(sim)
+        return float(self._similarity(sim, (1, 0)))
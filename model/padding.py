@@ -0,0 +1,14 @@
+"""
+Padding of short videos: features of videos shorter than MIN_FEATURES_LEN frames are repeated (see
+ViSiL.extract_features). Shared with the segment stitching in video/segments.py, so it doesn't import TF.
+"""
+
+MIN_FEATURES_LEN = 4
+
+
+def features_length(num_frames):
+    """Length of the features of a video with num_frames frames after short videos are repeated."""
+    length = max(num_frames, 1)
+    while length < MIN_FEATURES_LEN:
+        length *= 2
+    return length
@@ -4,6 +4,7 @@ import logging
 
 from .layers import PCA_layer, Attention_layer, Video_Comparator
 from .similarity import chamfer_similarity, symmetric_chamfer_similarity
+from .padding import features_length
 
 log = logging.getLogger(__name__)
 
@@ -12,7 +13,9 @@ class ViSiL(object):
 
     def __init__(self, model_dir, net='resnet', load_queries=False,
                  dims=None, whitening=True, attention=True, video_comparator=True,
-                 queries_number=None, gpu_id=0, similarity_function='chamfer'):
+                 queries_number=None, gpu_id=0, similarity_function='chamfer',
+                 top_k_regions=None, region_weight_threshold=None,
+                 build_extractor=True, build_similarity=True, session_config=None):
 
         self.net = net
         if self.net not in ['resnet', 'i3d']:
@@ -20,16 +23,19 @@ class ViSiL(object):
                             'Supported options: resnet or i3d'.format(self.net))
 
         self.load_queries = load_queries
-        if whitening or dims is not None:
+        # only the needed sub-graphs are built: feature extraction (backbone, PCA, attention) and/or comparison
+        self.build_extractor = build_extractor
+        self.build_similarity = build_similarity
+        if build_extractor and (whitening or dims is not None):
             self.PCA = PCA_layer(dims=dims, whitening=whitening, net=self.net)
-        if attention:
+        if build_extractor and attention:
             if whitening and dims is None:
                 self.att = Attention_layer(shape=400 if self.net == 'i3d' else 3840)
             else:
                 log.warning('Attention layer has been deactivated. '
                             'It works only with Whitening layer of {} dimensions. '.
                             format(400 if self.net == 'i3d' else 3840))
-        if video_comparator:
+        if build_similarity and video_comparator:
             if whitening and attention and dims is None:
                 self.vid_comp = Video_Comparator()
             else:
@@ -37,6 +43,16 @@ class ViSiL(object):
                             'It works only with Whitening layer of {} dimensions '
                             'and Attention layer. '.format(400 if self.net == 'i3d' else 3840))
 
+        # only the top_k_regions regions with the highest attention weights are kept for every frame;
+        # regions with weights below region_weight_threshold (except the best one) are zeroed and masked out
+        self.top_k_regions = top_k_regions
+        self.region_weight_threshold = region_weight_threshold
+        if build_extractor and (top_k_regions is not None or region_weight_threshold is not None) and \
+                not hasattr(self, 'att'):
+            raise Exception('[ERROR] Region pruning requires the Attention layer.')
+        if region_weight_threshold is not None and similarity_function != 'chamfer':
+            raise Exception('[ERROR] Region weight threshold is supported only with chamfer similarity.')
+
         if similarity_function == 'chamfer':
             self.f2f_sim = lambda x: chamfer_similarity(x, max_axis=2, mean_axis=1)
             self.v2v_sim = lambda x: chamfer_similarity(x, max_axis=1, mean_axis=0)
@@ -47,41 +63,44 @@ class ViSiL(object):
             raise Exception('[ERROR] Not implemented similarity function: {}. '
                             'Supported options: chamfer or symmetric_chamfer'.format(similarity_function))
 
-        self.frames = tf.placeholder(tf.uint8, shape=(None, None, None, 3), name='input')
-        with tf.device('/cpu:0'):
-            if self.net == 'resnet':
-                processed_frames = self.preprocess_resnet(self.frames)
-
-        with tf.device('/gpu:%i' % gpu_id):
-            self.region_vectors = self.extract_region_vectors(processed_frames)
-            if self.load_queries:
-                log.info('Queries will be loaded to the gpu')
-                self.queries = [tf.Variable(np.zeros((1, 9, 3840)), dtype=tf.float32,
-                                            validate_shape=False) for _ in range(queries_number)]
-                self.target = tf.placeholder(tf.float32, [None, None, None], name='target')
-                self.similarities = []
-                for q in self.queries:
-                    sim_matrix = self.frame_to_frame_similarity(q, self.target)
-                    similarity = self.video_to_video_similarity(sim_matrix)
-                    self.similarities.append(similarity)
-            else:
-                log.info('Queries will NOT be loaded to the gpu')
-                self.query = tf.placeholder(tf.float32, [None, None, None], name='query')
-                self.target = tf.placeholder(tf.float32, [None, None, None], name='target')
-                self.sim_matrix = self.frame_to_frame_similarity(self.query, self.target)
-                self.similarity = self.video_to_video_similarity(self.sim_matrix)
+        if build_extractor:
+            self.frames = tf.placeholder(tf.uint8, shape=(None, None, None, 3), name='input')
+            with tf.device('/cpu:0'):
+                if self.net == 'resnet':
+                    processed_frames = self.preprocess_resnet(self.frames)
+            with tf.device('/gpu:%i' % gpu_id):
+                self.region_vectors = self.extract_region_vectors(processed_frames)
+
+        if build_similarity:
+            with tf.device('/gpu:%i' % gpu_id):
+                if self.load_queries:
+                    log.info('Queries will be loaded to the gpu')
+                    self.queries = [tf.Variable(np.zeros((1, 9, 3840)), dtype=tf.float32,
+                                                validate_shape=False) for _ in range(queries_number)]
+                    self.target = tf.placeholder(tf.float32, [None, None, None], name='target')
+                    self.similarities = []
+                    for q in self.queries:
+                        sim_matrix = self.frame_to_frame_similarity(q, self.target)
+                        similarity = self.video_to_video_similarity(sim_matrix)
+                        self.similarities.append(similarity)
+                else:
+                    log.info('Queries will NOT be loaded to the gpu')
+                    self.query = tf.placeholder(tf.float32, [None, None, None], name='query')
+                    self.target = tf.placeholder(tf.float32, [None, None, None], name='target')
+                    self.sim_matrix = self.frame_to_frame_similarity(self.query, self.target)
+                    self.similarity = self.video_to_video_similarity(self.sim_matrix)
 
         init = self.load_model(model_dir)
-        config = tf.ConfigProto(allow_soft_placement=True)
+        # session_config: extra tf.ConfigProto fields, e.g. thread pool sizes for CPU execution
+        config = tf.ConfigProto(allow_soft_placement=True, **(session_config or {}))
         config.gpu_options.allow_growth = True
         self.sess = tf.Session(config=config)
         self.sess.run(init)
 
     def preprocess_resnet(self, video):
         from .nets import vgg_preprocessing
-        video = tf.map_fn(lambda x: vgg_preprocessing.preprocess_for_eval(x, 224, 224, 256), video,
-                          parallel_iterations=100, dtype=tf.float32, swap_memory=True)
-        return video
+        # all frames of a batch have the same size, so they are preprocessed at once
+        return vgg_preprocessing.preprocess_for_eval_batch(video, 224, 224, 256)
 
     def region_pooling(self, video):
         if self.net == 'resnet':
@@ -112,13 +131,40 @@ class ViSiL(object):
             logits = tf.nn.l2_normalize(self.PCA(logits), -1, epsilon=1e-15)
         if hasattr(self, 'att'):
             logits, weights = self.att(logits)
+            if self.top_k_regions is not None or self.region_weight_threshold is not None:
+                logits = self.prune_regions(logits, tf.squeeze(weights, -1))
+        return logits
+
+    def prune_regions(self, logits, weights):
+        k = self.top_k_regions if self.top_k_regions is not None else tf.shape(weights)[1]
+        k = tf.minimum(k, tf.shape(weights)[1])
+        top_weights, indices = tf.nn.top_k(weights, k)
+        logits = tf.gather(logits, indices, batch_dims=1)
+        if self.region_weight_threshold is not None:
+            keep = tf.logical_or(top_weights >= self.region_weight_threshold,
+                                 tf.equal(tf.range(k), 0)[tf.newaxis])
+            logits = logits * tf.cast(keep, logits.dtype)[..., tf.newaxis]
         return logits
 
     def frame_to_frame_similarity(self, query, target):
         tensor_dot = tf.tensordot(query, tf.transpose(target), axes=1)
+        if self.region_weight_threshold is not None:
+            return self.masked_chamfer_similarity(tensor_dot, query, target)
         sim_matrix = self.f2f_sim(tensor_dot)
         return sim_matrix
 
+    def masked_chamfer_similarity(self, tensor_dot, query, target):
+        # zeroed regions are excluded from the max over target regions and from the mean over query regions
+        query_mask = tf.cast(tf.reduce_any(tf.not_equal(query, 0), axis=-1), tf.float32)
+        target_mask = tf.reduce_any(tf.not_equal(target, 0), axis=-1)
+        target_mask = tf.transpose(target_mask)[tf.newaxis, tf.newaxis]
+        sim = tf.where(tf.broadcast_to(target_mask, tf.shape(tensor_dot)), tensor_dot,
+                       tf.fill(tf.shape(tensor_dot), -np.inf))
+        sim = tf.reduce_max(sim, axis=2)
+        sim = tf.where(tf.is_inf(sim), tf.zeros_like(sim), sim)
+        query_mask = query_mask[..., tf.newaxis]
+        return tf.reduce_sum(sim * query_mask, axis=1) / tf.maximum(tf.reduce_sum(query_mask, axis=1), 1.)
+
     def video_to_video_similarity(self, sim):
         if hasattr(self, 'vid_comp'):
             sim = self.vid_comp(sim)
@@ -135,16 +181,30 @@ class ViSiL(object):
         tf_init = tf.global_variables_initializer()
         return tf_init
 
-    def extract_features(self, frames, batch_sz):
-        features = []
-        for b in range(frames.shape[0] // batch_sz + 1):
-            batch = frames[b * batch_sz: (b + 1) * batch_sz]
-            if batch.shape[0] > 0:
-                if batch.shape[0] >= batch_sz or self.net == 'resnet':
-                    features.append(self.sess.run(self.region_vectors, feed_dict={self.frames: batch}))
-        features = np.concatenate(features, axis=0)
-        while features.shape[0] < 4:
-            features = np.concatenate([features, features], axis=0)
+    @staticmethod
+    def features_length(num_frames):
+        # short videos are repeated until they have at least MIN_FEATURES_LEN frames (see model/padding.py)
+        return features_length(num_frames)
+
+    def extract_features(self, frames, batch_sz, out=None):
+        # the last incomplete batch is dropped for i3d
+        num_frames = frames.shape[0] if self.net == 'resnet' else frames.shape[0] // batch_sz * batch_sz
+        if num_frames == 0:
+            raise ValueError('[ERROR] No frames to extract features from.')
+        features = out
+        for start in range(0, num_frames, batch_sz):
+            batch_features = self.sess.run(self.region_vectors,
+                                           feed_dict={self.frames: frames[start: min(start + batch_sz, num_frames)]})
+            if features is None:
+                # output is written in place, so peak memory equals the size of the final features
+                features = np.empty((self.features_length(num_frames),) + batch_features.shape[1:],
+                                    dtype=batch_features.dtype)
+            features[start: start + batch_features.shape[0]] = batch_features
+            del batch_features
+        filled = num_frames
+        while filled < features.shape[0]:
+            features[filled: 2 * filled] = features[:min(filled, features.shape[0] - filled)]
+            filled *= 2
         return features
 
     def set_queries(self, queries):
@@ -0,0 +1,169 @@
+"""
+Модуль для подбора размера батча при вытягивании фич (ViSiL.extract_features) под текущий хост.
+
+Размеры батча перебираются по возрастанию на синтетических кадрах, для каждого измеряется скорость (кадров
+в секунду); перебор останавливается при нехватке памяти (OOM), при выходе за бюджет памяти MemoryGuard или когда
+скорость перестает расти. Выбранный размер кэшируется в json по ключу хоста, так что подбор выполняется один раз
+на хост. Если при вытягивании фич все же случается OOM, батч уменьшается вдвое, а кэш обновляется.
+"""
+import os
+import json
+import time
+import socket
+import logging
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from utils.memory import MemoryGuard, EXTRACTION_BYTES_PER_FRAME  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+# Функция вытягивания фич: (кадры, размер батча) -> фичи (как ViSiL.extract_features).
+ExtractFn = Callable[[np.ndarray, int], np.ndarray]
+
+
+def is_oom_error(error: BaseException) -> bool:
+    """
+    Args:
+        error (BaseException): Исключение.
+    Returns (bool): Вызвано ли исключение нехваткой памяти (MemoryError или tf.errors.ResourceExhaustedError;
+                    TF не импортируется, чтобы модуль работал и без него).
+    """
+    return isinstance(error, MemoryError) or type(error).__name__ == 'ResourceExhaustedError'
+
+
+def host_key() -> str:
+    """Ключ хоста в кэше: имя хоста, количество ядер и видимые GPU."""
+    return f"{socket.gethostname()}:{os.cpu_count()}:{os.environ.get('CUDA_VISIBLE_DEVICES', 'all')}"
+
+
+def extract_with_backoff(extract_fn: ExtractFn, frames: np.ndarray, batch_sz: int,
+                         on_backoff: Optional[Callable[[int], None]] = None) -> np.ndarray:
+    """
+    Вытягивание фич с уменьшением батча вдвое при нехватке памяти.
+    Args:
+        extract_fn (ExtractFn): Функция вытягивания фич.
+        frames (np.ndarray): Кадры видео.
+        batch_sz (int): Размер батча.
+        on_backoff (Optional[Callable[[int], None]]): Вызывается с новым размером батча после его уменьшения.
+    Returns (np.ndarray): Фичи видео.
+    """
+    while True:
+        try:
+            return extract_fn(frames, batch_sz)
+        except Exception as error:  # pylint: disable=broad-except
+            if not is_oom_error(error) or batch_sz == 1:
+                raise
+            batch_sz //= 2
+            log.warning(f"Out of memory during extraction, batch size reduced to {batch_sz}.")  # pylint: disable=logging-fstring-interpolation
+            if on_backoff is not None:
+                on_backoff(batch_sz)
+
+
+class BatchSizeTuner:
+    """
+    Подбор и кэширование размера батча для текущего хоста.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None,
+                 candidates: Sequence[int] = (1, 2, 4, 8, 16, 32, 64, 128),
+                 frame_shape: Sequence[int] = (256, 256, 3), min_speedup: float = 1.05,
+                 memory_guard: Optional[MemoryGuard] = None):
+        """
+        Args:
+            cache_path (Optional[str]): Путь до json с выбранными размерами батча по хостам (None - не сохранять).
+            candidates (Sequence[int]): Проверяемые размеры батча.
+            frame_shape (Sequence[int]): Форма кадра (как после utils/manipulate_data.py load_video).
+            min_speedup (float): Во сколько раз должна вырасти скорость, чтобы продолжить перебор.
+            memory_guard (Optional[MemoryGuard]): Проверка доступной памяти.
+        """
+        self.cache_path = cache_path
+        self.candidates = sorted(candidates)
+        self.frame_shape = tuple(frame_shape)
+        self.min_speedup = min_speedup
+        self.memory_guard = memory_guard if memory_guard is not None else MemoryGuard()
+        self._batch_size: Optional[int] = None
+
+    def _load_cache(self) -> Dict[str, int]:
+        """Чтение кэша (пустой словарь, если его нет)."""
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path, encoding='utf8') as cache_file:
+            return json.load(cache_file)
+
+    def _save_cache(self):
+        """Запись выбранного размера батча в кэш."""
+        if self.cache_path is None:
+            return
+        cache = self._load_cache()
+        cache[host_key()] = self._batch_size
+        with open(self.cache_path + '.part', 'w', encoding='utf8') as cache_file:
+            json.dump(cache, cache_file, indent=2)
+        os.replace(self.cache_path + '.part', self.cache_path)
+
+    def measure(self, extract_fn: ExtractFn, batch_sz: int) -> float:
+        """
+        Args:
+            extract_fn (ExtractFn): Функция вытягивания фич.
+            batch_sz (int): Размер батча.
+        Returns (float): Скорость вытягивания фич (кадров в секунду) на двух батчах синтетических кадров
+                         (первый запуск с новым размером батча не учитывается: в нем выделяется память).
+        """
+        frames = np.random.randint(0, 256, size=(2 * batch_sz,) + self.frame_shape, dtype=np.uint8)
+        extract_fn(frames[:batch_sz], batch_sz)
+        start = time.perf_counter()
+        extract_fn(frames, batch_sz)
+        return frames.shape[0] / max(time.perf_counter() - start, 1e-9)
+
+    def tune(self, extract_fn: ExtractFn) -> int:
+        """
+        Подбор размера батча на текущем хосте.
+        Args:
+            extract_fn (ExtractFn): Функция вытягивания фич.
+        Returns (int): Размер батча с наибольшей скоростью.
+        """
+        budget = self.memory_guard.budget()
+        best_batch_sz, best_speed = self.candidates[0], 0.
+        for batch_sz in self.candidates:
+            if budget is not None and batch_sz * EXTRACTION_BYTES_PER_FRAME > budget:
+                break
+            try:
+                speed = self.measure(extract_fn, batch_sz)
+            except Exception as error:  # pylint: disable=broad-except
+                if not is_oom_error(error):
+                    raise
+                break
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Batch size {batch_sz}: {speed:.1f} frames/s")
+            if speed < best_speed * self.min_speedup:
+                if speed > best_speed:
+                    best_batch_sz, best_speed = batch_sz, speed
+                break
+            best_batch_sz, best_speed = batch_sz, speed
+        return best_batch_sz
+
+    def batch_size(self, extract_fn: ExtractFn) -> int:
+        """
+        Args:
+            extract_fn (ExtractFn): Функция вытягивания фич (вызывается только при подборе).
+        Returns (int): Размер батча для текущего хоста (из кэша или подобранный при первом вызове).
+        """
+        if self._batch_size is None:
+            self._batch_size = self._load_cache().get(host_key())
+        if self._batch_size is None:
+            self._batch_size = self.tune(extract_fn)
+            # pylint: disable=logging-fstring-interpolation
+            log.info(f"Batch size {self._batch_size} selected for host {host_key()}")
+            self._save_cache()
+        return self._batch_size
+
+    def reduce(self, batch_sz: int):
+        """
+        Запоминание уменьшенного после OOM размера батча (только если размер батча уже был выбран).
+        Args:
+            batch_sz (int): Новый размер батча.
+        """
+        if self._batch_size is not None and batch_sz < self._batch_size:
+            self._batch_size = batch_sz
+            self._save_cache()
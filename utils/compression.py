@@ -0,0 +1,205 @@
+"""
+Модуль для сжатия фич видео при их сохранении и передаче в БД и обратно.
+
+Сжатый файл с фичами состоит из заголовка (magic, длина и json с параметрами: кодек, byte-shuffle, dtype,
+shape, размер куска) и потока, сжатого выбранным кодеком. Массив сжимается и распаковывается кусками по
+chunk_rows кадров, поэтому в памяти никогда не находятся одновременно две полные копии массива.
+Файлы без заголовка считаются обычным pickle (как сохраняет save_data).
+"""
+import json
+import zlib
+import pickle
+import struct
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from utils.manipulate_data import load_data, save_data  # pylint: disable=import-error
+
+MAGIC = b'VSFC'
+CODECS = ('none', 'zlib', 'zstd', 'lz4')
+READ_BLOCK_SIZE = 1024 ** 2
+
+
+def check_codec(codec: str):
+    """
+    Проверка, что кодек существует и нужная библиотека установлена.
+    Args:
+        codec (str): Кодек (none, zlib, zstd или lz4).
+    """
+    if codec not in CODECS:
+        raise NameError(f"Codec {codec} doesn't exist!")
+    # pylint: disable=import-outside-toplevel, unused-import
+    if codec == 'zstd':
+        import zstandard
+    elif codec == 'lz4':
+        import lz4.frame
+
+
+class _Compressor:
+    """Потоковый компрессор с единым интерфейсом для всех кодеков."""
+
+    def __init__(self, codec: str):
+        # pylint: disable=import-outside-toplevel
+        self.codec = codec
+        self.header = b''
+        if codec == 'zlib':
+            self.compressor = zlib.compressobj(6)
+        elif codec == 'zstd':
+            import zstandard
+            self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        elif codec == 'lz4':
+            import lz4.frame
+            self.compressor = lz4.frame.LZ4FrameCompressor()
+            self.header = self.compressor.begin()
+        else:
+            raise NameError(f"Codec {codec} doesn't exist!")
+
+    def compress(self, data) -> bytes:
+        """Сжатие очередного куска данных."""
+        compressed = self.compressor.compress(data)
+        if self.header:
+            compressed, self.header = self.header + compressed, b''
+        return compressed
+
+    def flush(self) -> bytes:
+        """Завершение потока."""
+        return self.compressor.flush()
+
+
+def _get_decompressor(codec: str):
+    """Потоковый декомпрессор (у всех кодеков есть метод decompress(data) -> bytes)."""
+    # pylint: disable=import-outside-toplevel
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == 'lz4':
+        import lz4.frame
+        return lz4.frame.LZ4FrameDecompressor()
+    raise NameError(f"Codec {codec} doesn't exist!")
+
+
+def _shuffle(chunk: np.ndarray) -> bytes:
+    """Byte-shuffle: сначала идут первые байты всех чисел, затем вторые и т.д. (лучше сжимаются float)."""
+    return np.ascontiguousarray(chunk).view(np.uint8).reshape(-1, chunk.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, out: np.ndarray):
+    """Обратное преобразование к _shuffle с записью результата в out."""
+    itemsize = out.dtype.itemsize
+    shuffled = np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1)
+    out.reshape(-1).view(np.uint8).reshape(-1, itemsize)[...] = shuffled.T
+
+
+def save_features(features: np.ndarray, save_path: str, codec: str = 'none', shuffle: bool = True,
+                  chunk_rows: int = 64):
+    """
+    Сохранение фич видео (со сжатием, если codec не none).
+    Args:
+        features (np.ndarray): Фичи видео.
+        save_path (str): Путь до файла.
+        codec (str): Кодек (none, zlib, zstd или lz4).
+        shuffle (bool): Применять ли byte-shuffle перед сжатием.
+        chunk_rows (int): Количество кадров в одном куске при потоковом сжатии.
+    """
+    if codec == 'none':
+        save_data(features, save_path)
+        return
+
+    header = json.dumps({'codec': codec,
+                         'shuffle': shuffle,
+                         'dtype': features.dtype.str,
+                         'shape': list(features.shape),
+                         'chunk_rows': chunk_rows}).encode('utf8')
+    compressor = _Compressor(codec)
+    with open(save_path, 'wb') as output:
+        output.write(MAGIC)
+        output.write(struct.pack('<I', len(header)))
+        output.write(header)
+        for start in range(0, features.shape[0], chunk_rows):
+            chunk = features[start: start + chunk_rows]
+            data = _shuffle(chunk) if shuffle else np.ascontiguousarray(chunk).tobytes()
+            output.write(compressor.compress(data))
+        output.write(compressor.flush())
+
+
+def _read_header(stream: BinaryIO) -> dict:
+    """
+    Чтение заголовка сжатого файла с фичами (MAGIC уже прочитан из потока).
+    Returns:
+        header (dict): Параметры сжатия.
+    """
+    header_len = struct.unpack('<I', stream.read(4))[0]
+    return json.loads(stream.read(header_len).decode('utf8'))
+
+
+def load_features_from_stream(stream: BinaryIO, codec: Optional[str] = None) -> np.ndarray:
+    """
+    Потоковая распаковка фич (например, напрямую из потока БД, см. BaseStorage.db_get_stream).
+    Распакованные данные сразу записываются в заранее выделенный массив.
+    Args:
+        stream (BinaryIO): Поток с фичами (сжатыми save_features или обычным pickle).
+        codec (Optional[str]): Кодек из метаданных объекта в БД (см. BaseStorage.db_get_metadata): none - обычный
+                               pickle, None - формат определяется по заголовку (объекты без метаданных).
+    Returns:
+        features (np.ndarray): Фичи видео.
+    """
+    if codec == 'none':
+        return pickle.load(stream)
+    magic = stream.read(len(MAGIC))
+    if magic != MAGIC:
+        if codec is not None:
+            raise ValueError("Stream doesn't contain compressed features!")
+        return pickle.loads(magic + stream.read())
+    header = _read_header(stream)
+    if codec is not None and header['codec'] != codec:
+        raise ValueError(f"Features are compressed with {header['codec']}, not with {codec}!")
+
+    features = np.empty(header['shape'], dtype=np.dtype(header['dtype']))
+    flat_bytes = features.reshape(-1).view(np.uint8)
+    row_bytes = int(np.prod(header['shape'][1:], dtype=np.int64)) * features.dtype.itemsize
+    chunk_bytes = header['chunk_rows'] * row_bytes
+    decompressor = _get_decompressor(header['codec'])
+
+    pending = bytearray()
+    offset = 0
+
+    def _flush_chunk(data):
+        nonlocal offset
+        if header['shuffle']:
+            _unshuffle(data, features.reshape(-1)[offset // features.dtype.itemsize:
+                                                  (offset + len(data)) // features.dtype.itemsize])
+        else:
+            flat_bytes[offset: offset + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        offset += len(data)
+
+    while True:
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        pending += decompressor.decompress(block)
+        while len(pending) >= chunk_bytes > 0:
+            _flush_chunk(bytes(pending[:chunk_bytes]))
+            del pending[:chunk_bytes]
+    if pending:
+        _flush_chunk(bytes(pending))
+    if offset != flat_bytes.shape[0]:
+        raise ValueError("Compressed features are truncated!")
+    return features
+
+
+def load_features(load_path: str) -> np.ndarray:
+    """
+    Чтение фич видео: сжатых save_features или обычного pickle.
+    Args:
+        load_path (str): Путь до файла.
+    Returns:
+        features (np.ndarray): Фичи видео.
+    """
+    with open(load_path, 'rb') as data:
+        if data.read(len(MAGIC)) != MAGIC:
+            return load_data(load_path)
+        data.seek(0)
+        return load_features_from_stream(data)
@@ -0,0 +1,230 @@
+"""
+Модуль, описывающий профиль выполнения ViSiL на CPU: количество потоков TF (intra_op и inter_op), количество
+потоков декодирования видео cv2, ядра, к которым привязывается процесс, и количество независимых процессов
+(исполнителей) с моделью на один процессор (socket).
+
+По умолчанию TF создает пулы потоков по числу всех ядер, и вместе с потоками декодирования cv2 ядра оказываются
+перегружены. Профиль делит ядра каждого процессора между исполнителями без пересечений. Лучший профиль для хоста
+выбирается бенчмарком (суммарная скорость вытягивания фич всеми исполнителями одновременно) и кэшируется в json по
+ключу хоста (см. utils/batch_tuner.py host_key).
+
+Каждый исполнитель - отдельный процесс (например, distributed/worker.py) со своим профилем
+CpuProfile.for_worker(индекс исполнителя), переданным в MetaData.
+"""
+import os
+import json
+import time
+import glob
+import queue
+import logging
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.batch_tuner import host_key  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DECODE_THREADS = 3  # как в utils/manipulate_data.py load_video
+
+
+class CpuProfile:
+    """
+    Профиль выполнения на CPU.
+    """
+
+    def __init__(self, cores: List[List[int]], intra_op_threads: int, inter_op_threads: int,
+                 decode_threads: int = DEFAULT_DECODE_THREADS):
+        """
+        Args:
+            cores (List[List[int]]): Ядра каждого исполнителя (количество исполнителей - len(cores)).
+            intra_op_threads (int): Количество потоков внутри операции TF.
+            inter_op_threads (int): Количество одновременно выполняемых операций TF.
+            decode_threads (int): Количество потоков cv2 при декодировании видео.
+        """
+        self.cores = cores
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.decode_threads = decode_threads
+
+    @property
+    def num_workers(self) -> int:
+        """Количество исполнителей."""
+        return len(self.cores)
+
+    def for_worker(self, worker_idx: int) -> 'CpuProfile':
+        """
+        Args:
+            worker_idx (int): Индекс исполнителя.
+        Returns (CpuProfile): Профиль одного исполнителя.
+        """
+        return CpuProfile([self.cores[worker_idx]], self.intra_op_threads, self.inter_op_threads,
+                          self.decode_threads)
+
+    def session_config(self) -> dict:
+        """
+        Returns (dict): Параметры tf.ConfigProto (GPU не используется).
+        """
+        return {'intra_op_parallelism_threads': self.intra_op_threads,
+                'inter_op_parallelism_threads': self.inter_op_threads,
+                'device_count': {'GPU': 0}}
+
+    def pin(self, worker_idx: int = 0):
+        """
+        Привязка текущего процесса к ядрам исполнителя (если ОС это поддерживает).
+        Args:
+            worker_idx (int): Индекс исполнителя.
+        """
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cores[worker_idx])
+
+    def to_dict(self) -> dict:
+        """Профиль в виде словаря (для кэша)."""
+        return {'cores': self.cores, 'intra_op_threads': self.intra_op_threads,
+                'inter_op_threads': self.inter_op_threads, 'decode_threads': self.decode_threads}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'CpuProfile':
+        """Профиль из словаря (см. to_dict)."""
+        return CpuProfile(**data)
+
+
+def _read_int(path: str) -> Optional[int]:
+    """Чтение числа из файла sysfs."""
+    try:
+        with open(path, encoding='utf8') as data:
+            return int(data.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def detect_topology() -> List[List[int]]:
+    """
+    Returns (List[List[int]]): Доступные процессу логические ядра, сгруппированные по процессорам (socket).
+                               Если топологию прочитать не удалось, то все ядра считаются одним процессором.
+    """
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else \
+        list(range(os.cpu_count() or 1))
+    sockets: Dict[int, List[int]] = {}
+    for cpu in available:
+        socket_id = _read_int(f"/sys/devices/system/cpu/cpu{cpu}/topology/physical_package_id")
+        sockets.setdefault(socket_id if socket_id is not None else 0, []).append(cpu)
+    if not glob.glob('/sys/devices/system/cpu/cpu*/topology'):
+        return [available]
+    return [sockets[socket_id] for socket_id in sorted(sockets)]
+
+
+def candidate_profiles(topology: List[List[int]], min_cores_per_worker: int = 2) -> List[CpuProfile]:
+    """
+    Профили для бенчмарка: на каждом процессоре 1, 2, 4, ... исполнителей с равными долями его ядер,
+    1 или 2 одновременно выполняемых операции TF. Четверть ядер исполнителя (хотя бы одно) отдается декодированию
+    видео, остальные - потокам TF, чтобы потоки cv2 и TF не делили одни и те же ядра.
+    Args:
+        topology (List[List[int]]): Ядра по процессорам (см. detect_topology).
+        min_cores_per_worker (int): Минимальное количество ядер на исполнителя.
+    Returns (List[CpuProfile]): Профили.
+    """
+    profiles = []
+    socket_size = min(len(cores) for cores in topology)
+    workers_per_socket = 1
+    while workers_per_socket == 1 or socket_size // workers_per_socket >= min_cores_per_worker:
+        cores_per_worker = max(socket_size // workers_per_socket, 1)
+        cores = [socket_cores[i * cores_per_worker: (i + 1) * cores_per_worker]
+                 for socket_cores in topology for i in range(workers_per_socket)]
+        decode_threads = max(cores_per_worker // 4, 1)
+        for inter_op_threads in (1, 2):
+            profiles.append(CpuProfile(cores, intra_op_threads=max(cores_per_worker - decode_threads, 1),
+                                       inter_op_threads=inter_op_threads, decode_threads=decode_threads))
+        workers_per_socket *= 2
+    return profiles
+
+
+def _benchmark_worker(path_to_model: str, profile: CpuProfile, worker_idx: int, workload: Tuple[int, int], results):
+    """
+    Процесс бенчмарка: вытягивание фич из синтетических кадров (количество кадров и размер батча - workload)
+    с профилем исполнителя worker_idx.
+    """
+    # pylint: disable=import-outside-toplevel
+    from video.compare_videos import VideoSimilarityModel  # pylint: disable=import-error
+
+    num_frames, batch_sz = workload
+    profile.pin(worker_idx)
+    model = VideoSimilarityModel(path_to_model, cpu_profile=profile.for_worker(worker_idx))
+    frames = np.random.randint(0, 256, size=(num_frames, 256, 256, 3), dtype=np.uint8)
+    model.extract_features(frames[:batch_sz], batch_sz=batch_sz)
+    start = time.perf_counter()
+    model.extract_features(frames, batch_sz=batch_sz)
+    results.put(num_frames / max(time.perf_counter() - start, 1e-9))
+
+
+def benchmark_profile(path_to_model: str, profile: CpuProfile, num_frames: int = 64, batch_sz: int = 16,
+                      timeout: float = 600.) -> float:
+    """
+    Args:
+        path_to_model (str): Путь до директории с чекпоинтом модели.
+        profile (CpuProfile): Профиль.
+        num_frames (int): Количество кадров, из которых вытягивает фичи каждый исполнитель.
+        batch_sz (int): Размер батча.
+        timeout (float): Сколько секунд ждать результаты исполнителей.
+    Returns (float): Суммарная скорость вытягивания фич всеми исполнителями (кадров в секунду). Скорость
+                     исполнителя, который завершился с ошибкой (например, из-за нехватки памяти) или не успел
+                     за timeout, считается нулевой.
+    """
+    # отдельные процессы, так как пулы потоков TF создаются один раз на процесс
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_benchmark_worker,
+                               args=(path_to_model, profile, worker_idx, (num_frames, batch_sz), results))
+               for worker_idx in range(profile.num_workers)]
+    for worker in workers:
+        worker.start()
+    speeds = []
+    deadline = time.monotonic() + timeout
+    while len(speeds) < len(workers) and time.monotonic() < deadline:
+        try:
+            speeds.append(results.get(timeout=1.))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers) and results.empty():
+                break
+    for worker in workers:
+        worker.join(timeout=1.)
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+        if worker.exitcode != 0:
+            # pylint: disable=logging-fstring-interpolation
+            log.warning(f"Benchmark worker exited with code {worker.exitcode}, its speed is counted as 0")
+    return float(sum(speeds))
+
+
+def select_profile(path_to_model: str, cache_path: Optional[str] = None) -> CpuProfile:
+    """
+    Выбор профиля с наибольшей суммарной скоростью вытягивания фич на текущем хосте.
+    Args:
+        path_to_model (str): Путь до директории с чекпоинтом модели.
+        cache_path (Optional[str]): Путь до json с выбранными профилями по хостам (None - не сохранять).
+    Returns (CpuProfile): Профиль.
+    """
+    cache = {}
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, encoding='utf8') as cache_file:
+            cache = json.load(cache_file)
+    if host_key() in cache:
+        return CpuProfile.from_dict(cache[host_key()])
+
+    best_profile, best_speed = None, -1.
+    for profile in candidate_profiles(detect_topology()):
+        speed = benchmark_profile(path_to_model, profile)
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"{profile.num_workers} workers, intra_op={profile.intra_op_threads}, "
+                 f"inter_op={profile.inter_op_threads}: {speed:.1f} frames/s")
+        if speed > best_speed:
+            best_profile, best_speed = profile, speed
+
+    if cache_path is not None:
+        cache[host_key()] = best_profile.to_dict()
+        with open(cache_path + '.part', 'w', encoding='utf8') as cache_file:
+            json.dump(cache, cache_file, indent=2)
+        os.replace(cache_path + '.part', cache_path)
+    return best_profile
@@ -0,0 +1,87 @@
+"""
+Модуль, описывающий кэш фич в локальной (или общей сетевой) директории, общий для разных запусков и разных папок
+с видео. Ключ кэша состоит из идентификатора содержимого видео (ETag и размер, см. BaseStorage.db_stat_file)
+и отпечатка конфигурации модели (см. utils/fingerprint.py), поэтому фичи переиспользуются только для того же
+видео и той же модели, а переименование или копирование видео в другую папку кэш не сбрасывает.
+
+Для каждого ключа хранится файл с фичами (в формате save_features) и json с информацией о нем.
+"""
+import os
+import json
+import shutil
+import hashlib
+from typing import Dict, Optional
+
+INFO_SUFFIX = '.json'
+
+
+class FeatureCache:
+    """
+    Кэш фич, адресуемый содержимым видео.
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir (str): Путь до директории кэша.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(video_stat: Dict[str, str], fingerprint: str) -> str:
+        """
+        Args:
+            video_stat (Dict[str, str]): Идентификатор содержимого видео (см. BaseStorage.db_stat_file).
+            fingerprint (str): Отпечаток конфигурации модели.
+        Returns (str): Ключ кэша.
+        """
+        return hashlib.sha1(f"{video_stat['etag']}:{video_stat['size']}:{fingerprint}".encode('utf8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Путь до файла с фичами (файлы раскладываются по поддиректориям, чтобы их не было слишком много в одной)."""
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def contains(self, key: str) -> bool:
+        """
+        Args:
+            key (str): Ключ кэша.
+        Returns (bool): Есть ли фичи в кэше.
+        """
+        return os.path.exists(self._path(key) + INFO_SUFFIX)
+
+    def get(self, key: str, save_path: str) -> Optional[dict]:
+        """
+        Копирование фич из кэша.
+        Args:
+            key (str): Ключ кэша.
+            save_path (str): Путь, по которому нужно сохранить фичи.
+        Returns:
+            info (Optional[dict]): Информация о фичах, переданная в FeatureCache.put (None, если фич нет в кэше).
+        """
+        path = self._path(key)
+        if not os.path.exists(path + INFO_SUFFIX):
+            return None
+        with open(path + INFO_SUFFIX, encoding='utf8') as info_file:
+            info = json.load(info_file)
+        tmp_path = save_path + '.part'
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, save_path)
+        return info
+
+    def put(self, key: str, features_path: str, info: dict):
+        """
+        Сохранение фич в кэш. Файл с информацией записывается последним, поэтому недописанные фичи
+        из кэша не читаются.
+        Args:
+            key (str): Ключ кэша.
+            features_path (str): Путь до файла с фичами.
+            info (dict): Информация о фичах (длительность видео, кодек и т.д.).
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(features_path, path + '.part')
+        os.replace(path + '.part', path)
+        with open(path + INFO_SUFFIX + '.part', 'w', encoding='utf8') as info_file:
+            json.dump(info, info_file)
+        os.replace(path + INFO_SUFFIX + '.part', path + INFO_SUFFIX)
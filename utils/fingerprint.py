@@ -0,0 +1,57 @@
+"""
+Модуль для вычисления отпечатка (fingerprint) конфигурации модели: фичи, вытянутые моделью с одинаковым
+отпечатком из одного и того же видео, совпадают (см. utils/feature_cache.py).
+
+Отпечаток по содержимому чекпоинта (сотни МБ весов) дорого считать при каждом запуске, поэтому он сохраняется
+при экспорте замороженных графов вместе с дешевым отпечатком по размерам и времени изменения файлов (content=False,
+см. model/export.py), и пока дешевый отпечаток не изменился, используется сохраненный.
+"""
+import os
+import json
+import hashlib
+from typing import Sequence
+
+READ_BLOCK_SIZE = 1024 ** 2
+
+
+def fingerprint_directory(path: str, exclude: Sequence[str] = (), content: bool = True) -> str:
+    """
+    Хэш содержимого всех файлов директории (например, чекпоинта модели и pca.npz).
+    Args:
+        path (str): Путь до директории.
+        exclude (Sequence[str]): Имена файлов и поддиректорий, которые не учитываются (например, артефакты,
+                                 получаемые из самого чекпоинта).
+        content (bool): Хэшировать содержимое файлов или только их размеры и время изменения.
+    Returns (str): Хэш (sha1).
+    """
+    sha1 = hashlib.sha1()
+    for root, dirs, filenames in os.walk(path):
+        dirs[:] = sorted(dirname for dirname in dirs if dirname not in exclude)
+        for filename in sorted(filenames):
+            if filename in exclude:
+                continue
+            file_path = os.path.join(root, filename)
+            sha1.update(os.path.relpath(file_path, path).encode('utf8'))
+            if not content:
+                file_stat = os.stat(file_path)
+                sha1.update(f"{file_stat.st_size}:{file_stat.st_mtime_ns}".encode('utf8'))
+                continue
+            with open(file_path, 'rb') as data:
+                for block in iter(lambda: data.read(READ_BLOCK_SIZE), b''):  # pylint: disable=cell-var-from-loop
+                    sha1.update(block)
+    return sha1.hexdigest()
+
+
+def model_fingerprint(path_to_model: str, settings: dict, exclude: Sequence[str] = (), content: bool = True) -> str:
+    """
+    Отпечаток конфигурации модели.
+    Args:
+        path_to_model (str): Путь до директории с чекпоинтом модели.
+        settings (dict): Настройки, влияющие на фичи (сеть, PCA, attention, частота считывания кадров и т.д.).
+        exclude (Sequence[str]): Имена файлов и поддиректорий, которые не учитываются (см. fingerprint_directory).
+        content (bool): По содержимому файлов или только по их размерам и времени изменения.
+    Returns (str): Отпечаток (sha1).
+    """
+    sha1 = hashlib.sha1(fingerprint_directory(path_to_model, exclude, content).encode('utf8'))
+    sha1.update(json.dumps(settings, sort_keys=True).encode('utf8'))
+    return sha1.hexdigest()
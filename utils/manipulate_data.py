@@ -2,9 +2,15 @@
 Модуль, выполняющий локальное считывание и сохранение данных.
 """
 import pickle
+import logging
 import cv2
 import numpy as np
 
+log = logging.getLogger(__name__)
+
+# запас перед нужным кадром при неточной перемотке (обычно больше интервала между ключевыми кадрами)
+SEEK_PREROLL_SECONDS = 10
+
 
 def save_data(data, save_path):
     """Сохранение объекта в pickle"""
@@ -36,17 +42,66 @@ def center_crop(frame, desired_size):
     return frame[top: top + desired_size, left: left + desired_size, :]
 
 
-def load_video(video, all_frames=False):
-    """Функция для считывания локального видео в np.ndarray"""
-    cv2.setNumThreads(3)  # pylint: disable=no-member
+def seek_frame(cap, count, fps):
+    """
+    Перемотка видео на кадр count. Если cv2 попал не точно в кадр, то видео перематывается по времени на
+    SEEK_PREROLL_SECONDS раньше (декодер начинает с ближайшего предыдущего ключевого кадра), и кадры до count
+    пропускаются последовательно только от позиции, на которую попала перемотка. С начала видео кадры пропускаются,
+    только если и эта позиция оказалась после count.
+
+    Args:
+        cap (cv2.VideoCapture): Открытое видео.
+        count (int): Номер кадра.
+        fps (float): Количество кадров в секунду.
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, count)  # pylint: disable=no-member
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # pylint: disable=no-member
+    if position == count:
+        return
+    # pylint: disable=logging-fstring-interpolation
+    log.warning(f"Inexact seek to frame {count} (landed on {position}), skipping frames sequentially")
+    if not 0 <= position < count:
+        cap.set(cv2.CAP_PROP_POS_MSEC, max(count / fps - SEEK_PREROLL_SECONDS, 0) * 1000)  # pylint: disable=no-member
+        position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # pylint: disable=no-member
+        if not 0 <= position <= count:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # pylint: disable=no-member
+            position = 0
+    for _ in range(count - position):
+        if not cap.grab():
+            break
+
+
+def load_video(video, all_frames=False, start=0, end=None, num_threads=3):
+    """
+    Функция для считывания локального видео в np.ndarray (один кадр в секунду, если all_frames=False).
+    Кадры декодируются все (grab), а в np.ndarray переводятся только нужные (retrieve).
+
+    Args:
+        video (str): Путь до видео.
+        all_frames (bool): Считывать ли все кадры.
+        start (int): Номер секунды (т.е. считанного кадра при all_frames=False), с которой начинать считывание.
+                     Если перемотка не попала точно в нужный кадр, кадры до start пропускаются последовательно
+                     от ближайшей предшествующей позиции (см. seek_frame, проверка совпадения с чтением всего
+                     видео - video/segments_check.py).
+        end (Optional[int]): Номер секунды, до которой считывать (по умолчанию до конца видео).
+        num_threads (int): Количество потоков cv2 (см. utils/cpu_profile.py CpuProfile.decode_threads).
+    """
+    cv2.setNumThreads(num_threads)  # pylint: disable=no-member
     cap = cv2.VideoCapture(video)  # pylint: disable=no-member
     fps = cap.get(cv2.CAP_PROP_FPS)  # pylint: disable=no-member
     if fps > 144 or fps is None:
         fps = 25
+    step = max(round(fps), 1)
+    count = start * step
+    if count > 0:
+        seek_frame(cap, count, fps)
     frames = []
-    count = 0
     while cap.isOpened():
-        if int(count % round(fps)) == 0 or all_frames:
+        if end is not None and count >= end * step:
+            break
+        if not cap.grab():
+            break
+        if int(count % step) == 0 or all_frames:
             _, frame = cap.retrieve()
             if isinstance(frame, np.ndarray):
                 frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # pylint: disable=no-member
@@ -0,0 +1,298 @@
+"""
+Модуль для учета потребления памяти на этапах пайплайна, а также для защиты от нехватки памяти (OOM).
+"""
+import time
+import pickle
+import resource
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional, Dict, List
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Грубая оценка памяти, которая нужна ResNet-50 (ViSiL) на один кадр 224x224 при вытягивании фич.
+EXTRACTION_BYTES_PER_FRAME = 64 * 1024 ** 2
+# Форма и размер фич одного кадра: 9 регионов по 3840 float32.
+FEATURES_FRAME_SHAPE = (9, 3840)
+FEATURES_BYTES_PER_FRAME = 9 * 3840 * 4
+# Размер одного кадра после load_video: 256x256x3 uint8.
+DECODED_BYTES_PER_FRAME = 256 * 256 * 3
+
+
+def _read_proc_status_kb(field: str) -> Optional[int]:
+    """Чтение поля (в килобайтах) из /proc/self/status."""
+    try:
+        with open('/proc/self/status', encoding='utf8') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def get_rss_bytes() -> int:
+    """Текущий RSS процесса в байтах."""
+    rss_kb = _read_proc_status_kb('VmRSS')
+    if rss_kb is None:
+        return get_peak_rss_bytes()
+    return rss_kb * 1024
+
+
+def get_peak_rss_bytes() -> int:
+    """Максимальный RSS процесса в байтах (high-water mark)."""
+    hwm_kb = _read_proc_status_kb('VmHWM')
+    if hwm_kb is None:
+        # на linux ru_maxrss в килобайтах
+        hwm_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return hwm_kb * 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сброс high-water mark RSS процесса (поддерживается ядром linux).
+    Returns: True | False - удалось ли сбросить.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='utf8') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def get_available_memory_bytes() -> Optional[int]:
+    """Объем доступной на хосте памяти в байтах (MemAvailable из /proc/meminfo)."""
+    try:
+        with open('/proc/meminfo', encoding='utf8') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+# pylint: disable=too-few-public-methods
+class MemoryRecord:
+    """
+    Запись о потреблении памяти на одном этапе для одного видео.
+    """
+
+    def __init__(self, stage: str, video_idx: Optional[int]):
+        self.stage = stage
+        self.video_idx = video_idx
+        self.arrays: Dict[str, int] = {}
+        self.info: dict = {}
+
+    def add_array(self, name: str, array: np.ndarray):
+        """
+        Учет размера numpy массива, созданного на этапе.
+        Args:
+            name (str): Название массива в отчете.
+            array (np.ndarray): Массив.
+        """
+        self.arrays[name] = int(array.nbytes)
+
+
+class MemoryTracker:
+    """
+    Класс собирает отчет о потреблении памяти для каждого этапа и каждого видео: максимальный RSS (high-water mark),
+    пиковое потребление по tracemalloc, объем памяти выделенной numpy, а также размеры крупных numpy массивов.
+    """
+
+    def __init__(self, enabled: bool = True, trace_allocations: bool = False, top_allocations: int = 5):
+        """
+        Args:
+            enabled (bool): Собирать ли отчет.
+            trace_allocations (bool): Включить tracemalloc (заметно замедляет работу, но показывает
+                                      места выделения памяти и объем памяти, выделенной numpy).
+            top_allocations (int): Количество мест с наибольшим выделением памяти в отчете.
+        """
+        self.enabled = enabled
+        self.trace_allocations = trace_allocations
+        self.top_allocations = top_allocations
+        self.records: List[dict] = []
+        self.num_saved = 0
+        if self.enabled and self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def track(self, stage: str, video_idx: Optional[int] = None):
+        """
+        Контекстный менеджер, замеряющий память внутри блока.
+        Вложенные замеры не поддерживаются, так как high-water mark RSS сбрасывается в начале каждого замера.
+        Args:
+            stage (str): Название этапа.
+            video_idx (Optional[int]): Индекс видео из списка в мета данных.
+        """
+        record = MemoryRecord(stage, video_idx)
+        if not self.enabled:
+            yield record
+            return
+
+        is_peak_local = reset_peak_rss()
+        rss_start = get_rss_bytes()
+        if self.trace_allocations and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        start_time = time.time()
+        try:
+            yield record
+        finally:
+            entry = {'stage': stage,
+                     'video_idx': video_idx,
+                     'duration_sec': time.time() - start_time,
+                     'rss_start': rss_start,
+                     'rss_end': get_rss_bytes(),
+                     'rss_peak': get_peak_rss_bytes(),
+                     'is_rss_peak_local': is_peak_local,
+                     'arrays': dict(record.arrays)}
+            entry.update(record.info)
+            if self.trace_allocations:
+                entry.update(self._tracemalloc_stats())
+            self.records.append(entry)
+
+    def _tracemalloc_stats(self) -> dict:
+        """Статистика tracemalloc: пиковое потребление, объем памяти numpy и места с наибольшим выделением."""
+        _, python_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        numpy_domain = getattr(np.lib, 'tracemalloc_domain', None)
+        numpy_bytes = None
+        if numpy_domain is not None:
+            numpy_snapshot = snapshot.filter_traces([tracemalloc.DomainFilter(True, numpy_domain)])
+            numpy_bytes = sum(stat.size for stat in numpy_snapshot.statistics('filename'))
+        top_stats = snapshot.statistics('lineno')[:self.top_allocations]
+        return {'python_peak': python_peak,
+                'numpy_bytes': numpy_bytes,
+                'top_allocations': [str(stat) for stat in top_stats]}
+
+    def summary(self) -> Dict[str, int]:
+        """
+        Returns (Dict[str, int]): Максимальный RSS для каждого этапа по всем видео.
+        """
+        return _summary(self.records)
+
+    def save(self, save_path: str):
+        """
+        Дозапись в отчет записей, появившихся после предыдущего сохранения (каждая запись - отдельный pickle),
+        поэтому сохранение после каждого видео не перезаписывает весь отчет. Отчет читается load_report.
+        Args:
+            save_path (str): Путь до файла с отчетом.
+        """
+        if not self.enabled:
+            return
+        with open(save_path, 'ab') as output:
+            for entry in self.records[self.num_saved:]:
+                pickle.dump(entry, output)
+        self.num_saved = len(self.records)
+
+    @staticmethod
+    def load_report(load_path: str) -> dict:
+        """
+        Args:
+            load_path (str): Путь до файла с отчетом.
+        Returns (dict): Записи отчета (records) и максимальный RSS для каждого этапа (summary).
+        """
+        records = []
+        with open(load_path, 'rb') as data:
+            while True:
+                try:
+                    records.append(pickle.load(data))
+                except EOFError:
+                    break
+        return {'records': records, 'summary': _summary(records)}
+
+
+def _summary(records: List[dict]) -> Dict[str, int]:
+    """Максимальный RSS для каждого этапа по записям отчета."""
+    peaks: Dict[str, int] = {}
+    for entry in records:
+        peaks[entry['stage']] = max(peaks.get(entry['stage'], 0), entry['rss_peak'])
+    return peaks
+
+
+class MemoryGuard:
+    """
+    Класс проверяет, хватит ли на хосте памяти на следующий шаг, и при необходимости уменьшает
+    объем работы (размер батча, размер куска при сравнении) или отказывается ее выполнять до того,
+    как процесс будет убит OOM killer'ом.
+    """
+
+    def __init__(self, reserve_bytes: int = 512 * 1024 ** 2):
+        """
+        Args:
+            reserve_bytes (int): Объем памяти, который всегда должен оставаться свободным.
+        """
+        self.reserve_bytes = reserve_bytes
+
+    def budget(self) -> Optional[int]:
+        """
+        Returns (Optional[int]): Объем памяти, который можно занять, или None, если его не удалось определить.
+        """
+        available = get_available_memory_bytes()
+        if available is None:
+            return None
+        return max(0, available - self.reserve_bytes)
+
+    def check(self, required_bytes: int, stage: str):
+        """
+        Отказ от выполнения шага, если для него не хватит памяти.
+        Args:
+            required_bytes (int): Оценка объема памяти, необходимого шагу.
+            stage (str): Название шага (для сообщения об ошибке).
+        """
+        budget = self.budget()
+        if budget is not None and required_bytes > budget:
+            log.error(f"Not enough memory for {stage}: required {required_bytes} bytes, "  # pylint: disable=logging-fstring-interpolation
+                      f"available {budget} bytes.")
+            raise MemoryError(f"Not enough memory for {stage}")
+
+    def fit_batch_size(self, batch_sz: int, bytes_per_item: int, fixed_bytes: int = 0) -> int:
+        """
+        Подбор размера батча, который поместится в память: батч уменьшается вдвое, пока не поместится.
+        Args:
+            batch_sz (int): Желаемый размер батча.
+            bytes_per_item (int): Оценка памяти на один элемент батча.
+            fixed_bytes (int): Память, которая нужна независимо от размера батча.
+        Returns:
+            batch_sz (int): Размер батча, который помещается в память.
+        """
+        budget = self.budget()
+        if budget is None:
+            return batch_sz
+        if fixed_bytes + bytes_per_item > budget:
+            log.error("Not enough memory even for a batch of size 1.")
+            raise MemoryError("Not enough memory even for a batch of size 1")
+        fitted_batch_sz = batch_sz
+        while fitted_batch_sz > 1 and fixed_bytes + fitted_batch_sz * bytes_per_item > budget:
+            fitted_batch_sz //= 2
+        if fitted_batch_sz != batch_sz:
+            log.warning(f"Batch size downgraded from {batch_sz} to {fitted_batch_sz} to fit in memory.")  # pylint: disable=logging-fstring-interpolation
+        return fitted_batch_sz
+
+    def fit_chunk_size(self, chunk_sz: int, bytes_per_chunk_item: int, fixed_bytes: int = 0) -> int:
+        """
+        Подбор размера куска при сравнении видео (см. VideoSimilarityModel.calculate_similarity).
+        Память под промежуточный тензор tensordot растет квадратично от размера куска.
+        Args:
+            chunk_sz (int): Желаемый размер куска (в кадрах).
+            bytes_per_chunk_item (int): Оценка памяти на одну пару кадров в куске.
+            fixed_bytes (int): Память, которая нужна независимо от размера куска (например, загруженные фичи).
+        Returns:
+            chunk_sz (int): Размер куска, который помещается в память.
+        """
+        budget = self.budget()
+        if budget is None:
+            return chunk_sz
+        if fixed_bytes > budget:
+            log.error("Not enough memory to load features for comparison.")
+            raise MemoryError("Not enough memory to load features for comparison")
+        fitted_chunk_sz = chunk_sz
+        while fitted_chunk_sz > 1 and fixed_bytes + fitted_chunk_sz ** 2 * bytes_per_chunk_item > budget:
+            fitted_chunk_sz //= 2
+        if fitted_chunk_sz != chunk_sz:
+            log.warning(f"Comparison chunk downgraded from {chunk_sz} to {fitted_chunk_sz} to fit in memory.")  # pylint: disable=logging-fstring-interpolation
+        return fitted_chunk_sz
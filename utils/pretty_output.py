@@ -1,7 +1,9 @@
 """
 Модуль для приведения выходных данных к читаемому виду.
 """
-from utils.manipulate_data import load_data  # pylint: disable=import-error
+import numpy as np
+
+from meta.meta import MetaData  # pylint: disable=import-error
 
 
 def get_groups(meta_data: dict) -> dict:
@@ -13,7 +15,7 @@ def get_groups(meta_data: dict) -> dict:
         ok_resp[main_video] = meta_data['groups_content_video_paths'][idx]
     resp = {
         'failed_to_process_videos': [meta_data['remote_videos_paths'][i] for i in range(meta_data['num_videos']) if
-                                     meta_data['was_video_with_error']],
+                                     meta_data['was_video_with_error'][i]],
         'successful_comparison': ok_resp
     }
     return resp
@@ -29,8 +31,8 @@ def output_prettifier(path_to_output_meta: str,
     """
     with open(save_path, "w", encoding="utf8") as out:
 
-        meta_data = load_data(path_to_output_meta)
-        out.write(f"Сделано {len([i for i in meta_data['comparison_submeta'] if i is not None])} видео.\n")
+        meta_data = MetaData.load_meta(path_to_output_meta)
+        out.write(f"Сделано {np.count_nonzero(meta_data['comparison_submeta']['is_initialized'])} видео.\n")
         resp = get_groups(meta_data)
         good = resp['successful_comparison']
         for key, arr in good.items():
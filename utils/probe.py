@@ -0,0 +1,145 @@
+"""
+Модуль для быстрого чтения характеристик видео (длительность, fps, разрешение, кодек) из заголовков контейнера
+без декодирования кадров. Видео читается по пути или по ссылке (ffprobe и cv2 читают только нужные байты
+с помощью range запросов), поэтому его не нужно скачивать целиком.
+"""
+import json
+import math
+import shutil
+import logging
+import subprocess
+from typing import List, Optional
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FPS = 25  # как в utils/manipulate_data.py load_video
+MAX_FPS = 144
+PROBE_TIMEOUT = 60
+
+
+def normalize_fps(fps: Optional[float]) -> float:
+    """
+    Значение fps, которое использует load_video (некорректные значения заменяются на DEFAULT_FPS).
+    Args:
+        fps (Optional[float]): fps из заголовка видео.
+    Returns (float): fps.
+    """
+    if fps is None or fps <= 0 or fps > MAX_FPS or math.isnan(fps):
+        return DEFAULT_FPS
+    return fps
+
+
+def sampled_duration(frame_count: int, fps: float) -> int:
+    """
+    Количество кадров, которое считает load_video (один кадр на каждые round(fps) кадров),
+    т.е. длительность видео в секундах в том виде, в котором она хранится в мета данных.
+    Args:
+        frame_count (int): Количество кадров в видео.
+        fps (float): fps видео.
+    Returns (int): Длительность видео.
+    """
+    return int(math.ceil(frame_count / max(round(normalize_fps(fps)), 1)))
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[float]:
+    """Перевод fps из формата ffprobe ('30000/1001') в число."""
+    if not rate:
+        return None
+    numerator, _, denominator = rate.partition('/')
+    try:
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _probe_ffprobe(video: str) -> Optional[dict]:
+    """Чтение характеристик видео с помощью ffprobe (None, если ffprobe не смог прочитать видео)."""
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration',
+               '-show_entries', 'format=duration', '-of', 'json', video]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT,
+                                check=True)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as error:
+        log.warning(f"ffprobe failed for {video}: {error}")  # pylint: disable=logging-fstring-interpolation
+        return None
+    output = json.loads(result.stdout.decode('utf8') or '{}')
+    if not output.get('streams'):
+        return None
+    stream = output['streams'][0]
+    fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+    seconds = stream.get('duration') or output.get('format', {}).get('duration')
+    if stream.get('nb_frames', 'N/A') != 'N/A':
+        frame_count = int(stream['nb_frames'])
+    elif seconds is not None and fps:
+        frame_count = int(round(float(seconds) * fps))
+    else:
+        return None
+    return {'frame_count': frame_count,
+            'fps': fps,
+            'width': int(stream.get('width', 0)),
+            'height': int(stream.get('height', 0)),
+            'codec': stream.get('codec_name')}
+
+
+def _probe_cv2(video: str) -> Optional[dict]:
+    """Чтение характеристик видео из свойств cv2.VideoCapture (None, если видео не открылось)."""
+    # pylint: disable=no-member
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        return None
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\0 ') or None
+    info = {'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            'fps': cap.get(cv2.CAP_PROP_FPS),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'codec': codec}
+    cap.release()
+    if info['frame_count'] <= 0:
+        return None
+    return info
+
+
+def probe_video(video: str) -> Optional[dict]:
+    """
+    Чтение характеристик видео из заголовков контейнера (ffprobe, если он установлен, иначе cv2).
+    Args:
+        video (str): Путь до видео или ссылка на него.
+    Returns:
+        video_info (Optional[dict]): Характеристики видео (None, если их не удалось прочитать):
+                video_info['duration'] (int): Длительность видео в секундах (в том виде, в котором ее считает
+                                              load_video).
+                video_info['fps'] (float): fps видео.
+                video_info['width'] (int): Ширина кадра.
+                video_info['height'] (int): Высота кадра.
+                video_info['codec'] (Optional[str]): Кодек видео.
+    """
+    video_info = _probe_ffprobe(video) if shutil.which('ffprobe') else None
+    if video_info is None:
+        video_info = _probe_cv2(video)
+    if video_info is None:
+        return None
+    video_info['duration'] = sampled_duration(video_info.pop('frame_count'), video_info['fps'])
+    return video_info
+
+
+def bin_pack(durations: List[int], num_bins: int) -> List[List[int]]:
+    """
+    Распределение видео между num_bins исполнителями так, чтобы суммарные длительности были близки
+    (жадный алгоритм LPT: очередное самое длинное видео отдается наименее загруженному исполнителю).
+    Args:
+        durations (List[int]): Длительности видео.
+        num_bins (int): Количество исполнителей.
+    Returns:
+        bins (List[List[int]]): Индексы видео для каждого исполнителя (в порядке убывания длительности).
+    """
+    bins = [[] for _ in range(num_bins)]
+    loads = [0] * num_bins
+    for idx in sorted(range(len(durations)), key=lambda i: durations[i], reverse=True):
+        bin_idx = loads.index(min(loads))
+        bins[bin_idx].append(idx)
+        loads[bin_idx] += max(durations[idx], 0)
+    return bins
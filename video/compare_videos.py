@@ -1,10 +1,23 @@
 """
 Модуль позволяющий сравнивать два видео, а также обрабатывать их.
 """
+import os
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
 import numpy as np
-import tensorflow as tf
-from model.visil import ViSiL  # pylint: disable=import-error
-from utils.manipulate_data import load_data  # pylint: disable=import-error
+from model.numpy_similarity import NumpySimilarity, WEIGHTS_FILENAME  # pylint: disable=import-error
+from model.export import FROZEN_DIRNAME, read_manifest, export_frozen_graphs  # pylint: disable=import-error
+from utils.compression import load_features  # pylint: disable=import-error
+from utils.fingerprint import model_fingerprint  # pylint: disable=import-error
+from utils.batch_tuner import BatchSizeTuner, extract_with_backoff  # pylint: disable=import-error
+from utils.cpu_profile import CpuProfile  # pylint: disable=import-error
+from utils.memory import FEATURES_FRAME_SHAPE  # pylint: disable=import-error
+from video.temporal_index import TemporalIndex, frame_descriptors  # pylint: disable=import-error
+
+if TYPE_CHECKING:
+    from model.visil import ViSiL  # pylint: disable=import-error
+
+MIN_COARSE_LEN = 4  # минимальная длина прореженных фич (как в model/visil.py ViSiL.extract_features)
 
 
 class VideoSimilarityModel:
@@ -12,28 +25,205 @@ class VideoSimilarityModel:
     Класс позволяющий обрабатывать и сравнивать видео.
     """
 
-    def __init__(self, path_to_model: str):
+    def __init__(self, path_to_model: str, similarity_backend: str = 'tf', feature_dims: Optional[int] = None,
+                 top_k_regions: Optional[int] = None, region_weight_threshold: Optional[float] = None,
+                 cpu_profile: Optional[CpuProfile] = None):
         """
         Иннициализация класса для сравнения видео.
         Args:
             path_to_model: Путь до модели, осуществляющей сравнение видео.
+            similarity_backend (str): Реализация сравнения фич: tf - сессия ViSiL, numpy - голова сравнения
+                                      на NumPy (подробнее тут model/numpy_similarity.py). TF импортируется,
+                                      а графы ViSiL строятся только при первом использовании (граф вытягивания
+                                      фич и граф сравнения - отдельно), поэтому при numpy для сравнения фич TF
+                                      не нужен вовсе.
+            feature_dims (Optional[int]): Размерность векторов регионов после PCA (например, 256, 512 или 1024;
+                                          None - полные 3840). При уменьшенной размерности ViSiL отключает attention
+                                          и Video_Comparator, и видео сравниваются только chamfer similarity, поэтому
+                                          порог схожести нужно подбирать заново (см. video/dims_benchmark.py).
+            top_k_regions (Optional[int]): Сколько регионов каждого кадра с наибольшими весами attention хранить
+                                           (None - все 9). Размер фич и стоимость сравнения уменьшаются в 9/k раз.
+            region_weight_threshold (Optional[float]): Регионы с весом attention меньше порога (кроме лучшего)
+                                                       обнуляются и не участвуют в сравнении.
+            cpu_profile (Optional[CpuProfile]): Профиль выполнения на CPU (потоки TF, GPU не используется; подробнее
+                                                тут utils/cpu_profile.py). None - настройки TF по умолчанию.
+        """
+        if similarity_backend not in ('tf', 'numpy'):
+            raise NameError(f"Similarity backend {similarity_backend} doesn't exist!")
+        self.similarity_backend = similarity_backend
+        self.feature_dims = feature_dims
+        self.top_k_regions = top_k_regions
+        self.region_weight_threshold = region_weight_threshold
+        self.cpu_profile = cpu_profile
+        self._extractor = None
+        self._tf_similarity = None
+        self._numpy_similarity = None
+        # размер куска при сравнении, если будет слишком большим, то будет проблема с памятью
+        self.similarity_chunk = 500
+        # запас дешевой оценки схожести кропов (см. calibrate_proxy), None - кропы не отсекаются
+        self.proxy_margin = None
+        # параметры иерархического поиска сдвига (см. coarse_to_fine_offsets)
+        self.coarse_factor = 10
+        self.coarse_top_k = 3
+        self.refine_step = 5
+        # параметры поиска сдвига по временному индексу (см. video/temporal_index.py)
+        self.index_top_k = 5
+        self.index_tolerance = 2
+        self.checkpoint_name = os.path.basename(os.path.normpath(path_to_model))
+        self.path_to_model = path_to_model
+        # настройки, от которых зависят фичи (считывание кадров см. в utils/manipulate_data.py load_video)
+        self.feature_settings = {'net': 'resnet', 'dims': feature_dims, 'whitening': True,
+                                 'attention': feature_dims is None, 'top_k_regions': top_k_regions,
+                                 'region_weight_threshold': region_weight_threshold,
+                                 'frames_per_second': 1, 'frame_size': 256, 'crop_size': 224}
+        self._feature_fingerprint = None
+        # подбор размера батча для batch_sz='auto' (кэш по хостам задается в MetaData)
+        self.batch_tuner = BatchSizeTuner()
+
+    @property
+    def visil_kwargs(self) -> dict:
+        """
+        Параметры ViSiL, задаваемые VideoSimilarityModel.
+        """
+        return {'dims': self.feature_dims, 'top_k_regions': self.top_k_regions,
+                'region_weight_threshold': self.region_weight_threshold}
+
+    def build_model(self, build_extractor: bool, build_similarity: bool) -> 'ViSiL':
+        """
+        Построение части модели ViSiL в отдельном графе TF со своей сессией. Если модель с той же конфигурацией
+        была экспортирована (см. export_frozen_graphs), то граф загружается из замороженного графа.
+        Args:
+            build_extractor (bool): Строить ли граф вытягивания фич (ResNet-50, PCA, attention).
+            build_similarity (bool): Строить ли граф сравнения фич (Video_Comparator).
+        Returns (ViSiL): Модель ViSiL.
+        """
+        # pylint: disable=import-error, import-outside-toplevel
+        session_config = self.cpu_profile.session_config() if self.cpu_profile is not None else None
+        if self.frozen_graphs_exported:
+            from model.frozen import FrozenViSiL
+            return FrozenViSiL(self.path_to_model, build_extractor=build_extractor,
+                               build_similarity=build_similarity, session_config=session_config)
+
+        import tensorflow as tf
+        from model.visil import ViSiL  # pylint: disable=redefined-outer-name
+
+        with tf.Graph().as_default():
+            return ViSiL(self.path_to_model, build_extractor=build_extractor, build_similarity=build_similarity,
+                         session_config=session_config, **self.visil_kwargs)
+
+    @property
+    def frozen_graphs_exported(self) -> bool:
+        """
+        Экспортированы ли замороженные графы с текущей конфигурацией модели (см. export_frozen_graphs).
+        """
+        manifest = read_manifest(self.path_to_model)
+        return manifest is not None and manifest['fingerprint'] == self.feature_fingerprint
+
+    def export_frozen_graphs(self):
+        """
+        Однократный экспорт замороженных графов вытягивания фич и сравнения в директорию чекпоинта
+        (подробнее тут model/export.py). Последующие запуски с той же конфигурацией загружают их.
+        """
+        export_frozen_graphs(self.path_to_model, self.feature_fingerprint, self._checkpoint_stamp(),
+                             **self.visil_kwargs)
+
+    def _checkpoint_stamp(self) -> str:
+        """
+        Дешевый отпечаток конфигурации модели по размерам и времени изменения файлов чекпоинта
+        (подробнее тут utils/fingerprint.py).
+        """
+        return model_fingerprint(self.path_to_model, self.feature_settings,
+                                 exclude=(FROZEN_DIRNAME, WEIGHTS_FILENAME), content=False)
+
+    @property
+    def extractor(self) -> 'ViSiL':
+        """
+        Модель ViSiL для вытягивания фич (строится при первом обращении).
+        """
+        if self._extractor is None:
+            self._extractor = self.build_model(build_extractor=True, build_similarity=False)
+        return self._extractor
+
+    @property
+    def similarity_model(self):
+        """
+        Модель, сравнивающая фичи (ViSiL или NumpySimilarity, см. similarity_backend).
+        """
+        if self.similarity_backend == 'tf':
+            if self._tf_similarity is None:
+                self._tf_similarity = self.build_model(build_extractor=False, build_similarity=True)
+            return self._tf_similarity
+        if self._numpy_similarity is None:
+            self._numpy_similarity = NumpySimilarity(self.path_to_model,
+                                                     video_comparator=self.feature_dims is None)
+        return self._numpy_similarity
+
+    @property
+    def feature_fingerprint(self) -> str:
+        """
+        Отпечаток конфигурации модели для кэша фич (подробнее тут utils/fingerprint.py). Содержимое чекпоинта
+        хэшируется, только если файлы чекпоинта изменились после экспорта замороженных графов (или экспорта не было).
+        """
+        if self._feature_fingerprint is None:
+            manifest = read_manifest(self.path_to_model)
+            if manifest is not None and manifest.get('stamp') == self._checkpoint_stamp():
+                self._feature_fingerprint = manifest['fingerprint']
+            else:
+                # артефакты, получаемые из чекпоинта, в отпечаток не входят
+                self._feature_fingerprint = model_fingerprint(self.path_to_model, self.feature_settings,
+                                                              exclude=(FROZEN_DIRNAME, WEIGHTS_FILENAME))
+        return self._feature_fingerprint
+
+    @property
+    def model_version(self) -> str:
+        """
+        Версия модели для хранилища оценок схожести (см. meta/scores.py).
+        Размер куска при сравнении в версию не входит: он подбирается по доступной памяти. Реализация сравнения
+        (similarity_backend) тоже не входит: оценки tf и numpy совпадают с точностью до ошибок округления
+        (проверка на фичах своих видео - video/similarity_check.py).
+        """
+        if self.feature_dims is None:
+            return f"visil:{self.checkpoint_name}"
+        return f"visil:{self.checkpoint_name}:pca{self.feature_dims}"
+
+    @property
+    def features_frame_shape(self) -> Tuple[int, int]:
+        """
+        Форма фич одного кадра (регионы x размерность).
+        """
+        return self.top_k_regions or FEATURES_FRAME_SHAPE[0], self.feature_dims or FEATURES_FRAME_SHAPE[1]
+
+    def resolve_batch_size(self, batch_sz: Union[int, str]) -> int:
         """
-        tf.reset_default_graph()
-        self.model = ViSiL(path_to_model)
+        Args:
+            batch_sz (Union[int, str]): Размер батча или 'auto' - подобрать под текущий хост
+                                        (подробнее тут utils/batch_tuner.py).
+        Returns (int): Размер батча.
+        """
+        if batch_sz == 'auto':
+            return self.batch_tuner.batch_size(
+                lambda frames, size: self.extractor.extract_features(frames, batch_sz=size))
+        return batch_sz
 
-    def extract_features(self, np_video: np.ndarray, batch_sz: int = 32):
+    def extract_features(self, np_video: np.ndarray, batch_sz: Union[int, str] = 32,
+                         out: Optional[np.ndarray] = None):
         """
         Функция использующая модель ViSiL, чтобы вытянуть фичи из видео.
-        Если batch_sz достаточно маленький, то это может вызвать проблемы с памятью.
+        Если batch_sz слишком большой, то это может вызвать проблемы с памятью: при нехватке памяти батч
+        уменьшается вдвое (для batch_sz='auto' уменьшенный размер запоминается).
 
         Args:
             np_video (np.ndarray): Видео представленное в numpy формате.
-            batch_sz (int): Размер батча.
+            batch_sz (Union[int, str]): Размер батча или 'auto' (см. resolve_batch_size).
+            out (Optional[np.ndarray]): Массив (например, np.memmap), в который записываются фичи; его длина -
+                                        model/padding.py features_length(количество кадров). None - массив создается.
 
         Returns:
             Фичи, вытянутые из видео.
         """
-        features = self.model.extract_features(np_video, batch_sz=batch_sz)
+        features = extract_with_backoff(
+            lambda frames, size: self.extractor.extract_features(frames, batch_sz=size, out=out),
+            np_video, self.resolve_batch_size(batch_sz), on_backoff=self.batch_tuner.reduce)
         return features
 
     def calculate_similarity(self, features_1: np.ndarray, features_2: np.ndarray) -> float:
@@ -48,24 +238,175 @@ class VideoSimilarityModel:
             weighted_average_sim_score (float): Оценка схожести фич.
 
         """
+        return self.calculate_similarity_bounds(features_1, features_2)[0]
+
+    def calculate_similarity_bounds(self, features_1: np.ndarray, features_2: np.ndarray,
+                                    similarity_threshold: Optional[float] = None) -> Tuple[float, float]:
+        """
+        Оценивание похожести частей видео по их фичам с ранней остановкой. Оценка каждого куска лежит в [-1, 1]
+        (выход Video_Comparator ограничен clip_by_value), поэтому после обработки части кусков итоговое взвешенное
+        среднее лежит в [S - R, S + R], где S - текущая сумма, а R - суммарный вес оставшихся кусков. Как только
+        весь этот отрезок оказывается по одну сторону от similarity_threshold, решение уже не может измениться,
+        и оставшиеся куски не обрабатываются.
+
+        Args:
+            features_1 (np.ndarray): Фичи части первого видео, представленные в numpy формате.
+            features_2 (np.ndarray): Фичи части второго видео, представленные в numpy формате.
+            similarity_threshold (Optional[float]): Пороговое значение (None - обработать все куски).
+
+        Returns:
+            bounds (Tuple[float, float]): Нижняя и верхняя граница оценки схожести фич (совпадают, если были
+                                          обработаны все куски).
+        """
 
         weighted_average_sim_score = 0
-        step = 500  # шаг с которым идет итерация по циклу, если будет слишком большим, то будет проблема с памятью
+        step = self.similarity_chunk  # шаг с которым идет итерация по циклу
         len_features = len(features_1)
+        remaining_weight = 1.
 
         for start in range(0, len_features, step):  # step 5000 is almost max valid
             features_1_crop = features_1[start: start + step, ...]
             features_2_crop = features_2[start: start + step, ...]
             len_crop = len(features_1_crop)
 
-            similarity = self.model.calculate_video_similarity(features_1_crop, features_2_crop)
+            similarity = self.similarity_model.calculate_video_similarity(features_1_crop, features_2_crop)
             weighted_average_sim_score += similarity * (len_crop / len_features)
+            remaining_weight -= len_crop / len_features
+            del features_1_crop, features_2_crop
+            if similarity_threshold is not None and remaining_weight > 0 and \
+                    (weighted_average_sim_score + remaining_weight < similarity_threshold or
+                     weighted_average_sim_score - remaining_weight >= similarity_threshold):
+                return (float(weighted_average_sim_score - remaining_weight),
+                        float(weighted_average_sim_score + remaining_weight))
+
+        del features_1, features_2
+        return float(weighted_average_sim_score), float(weighted_average_sim_score)
+
+    @staticmethod
+    def frame_descriptors(features: np.ndarray) -> np.ndarray:
+        """
+        Дескриптор каждого кадра: нормированное среднее векторов его регионов.
+        Args:
+            features (np.ndarray): Фичи видео (кадры x регионы x размерность).
+        Returns (np.ndarray): Дескрипторы кадров (кадры x размерность).
+        """
+        return frame_descriptors(features)
+
+    def proxy_scores(self, short_video_features: np.ndarray, long_video_features: np.ndarray,
+                     offsets: List[int]) -> np.ndarray:
+        """
+        Дешевая оценка схожести кропов длинного видео с коротким видео: chamfer similarity дескрипторов кадров
+        (одно матричное умножение на пару видео вместо Video_Comparator на каждый кроп).
+        Args:
+            short_video_features (np.ndarray): Фичи короткого видео.
+            long_video_features (np.ndarray): Фичи длинного видео.
+            offsets (List[int]): Индексы начала кропов длинного видео.
+        Returns (np.ndarray): Оценка для каждого кропа.
+        """
+        frames_sim = np.dot(self.frame_descriptors(short_video_features),
+                            self.frame_descriptors(long_video_features).T)
+        crop_len = short_video_features.shape[0]
+        return np.array([frames_sim[:, i: i + crop_len].max(axis=1).mean() for i in offsets])
+
+    def calibrate_proxy(self, pairs: List[Tuple[np.ndarray, np.ndarray]], quantile: float = 1.) -> float:
+        """
+        Калибровка дешевой оценки (см. VideoSimilarityModel.proxy_scores): запас proxy_margin выбирается так,
+        чтобы на проверочных парах оценка модели не превышала дешевую оценку больше, чем на запас. Кропы, у которых
+        дешевая оценка + запас меньше порога, при сравнении не обрабатываются моделью. При quantile=1 решения
+        на проверочных парах с отсечением и без него совпадают. Отсечение статистическое, поэтому по умолчанию
+        оно выключено (proxy_margin = None).
+        Args:
+            pairs (List[Tuple[np.ndarray, np.ndarray]]): Проверочные пары фич одинаковой длины (например, короткое
+                                                         видео и кроп длинного).
+            quantile (float): Квантиль разностей оценок, используемый как запас.
+        Returns (float): Запас proxy_margin.
+        """
+        residuals = [self.calculate_similarity(long_crop_features, short_features) -
+                     self.proxy_scores(short_features, long_crop_features, [0])[0]
+                     for short_features, long_crop_features in pairs]
+        self.proxy_margin = float(np.quantile(residuals, quantile))
+        return self.proxy_margin
 
-        del features_1, features_2, features_1_crop, features_2_crop
-        return weighted_average_sim_score
+    def coarse_to_fine_offsets(self, short_video_features: np.ndarray, long_video_features: np.ndarray,
+                               short_duration: int, long_duration: int, step: int) -> List[int]:
+        """
+        Иерархический поиск сдвига короткого видео внутри длинного. Сначала фичи обоих видео прореживаются
+        по времени в factor раз (factor <= self.coarse_factor, прореженные фичи короткого видео не короче
+        MIN_COARSE_LEN), и кропы прореженного длинного видео сравниваются с прореженным коротким со сдвигом
+        в coarse_stride прореженных кадров. Затем вокруг self.coarse_top_k лучших грубых сдвигов выбираются сдвиги
+        в исходном разрешении с шагом self.refine_step.
+
+        Стоимость сравнения кропа пропорциональна квадрату его длины, поэтому грубый кроп в factor^2 раз дешевле,
+        а грубый проход в factor^3 * coarse_stride раз дешевле сканирования с шагом 1. coarse_stride выбирается так,
+        чтобы factor^3 * coarse_stride >= step, т.е. грубый проход не дороже сканирования с шагом step. Если вместе
+        с уточнением кропов выходит не меньше, чем при сканировании с шагом step (короткое видео короче
+        2 * MIN_COARSE_LEN секунд, или длинное видео ненамного длиннее короткого), то возвращаются кропы
+        сканирования с шагом step.
+        Args:
+            short_video_features (np.ndarray): Фичи короткого видео.
+            long_video_features (np.ndarray): Фичи длинного видео.
+            short_duration (int): Длительность короткого видео.
+            long_duration (int): Длительность длинного видео.
+            step (int): Шаг сканирования, с которым сравнивается стоимость поиска.
+        Returns (List[int]): Индексы начала кропов длинного видео в порядке убывания грубой оценки (или кропы
+                             сканирования с шагом step и кроп в конце длинного видео).
+        """
+        max_offset = long_duration - short_duration
+        if max_offset < 0:
+            return []
+        plan = self.coarse_search_plan(short_duration, max_offset, step)
+        if plan is None:
+            # кроп в конце длинного видео проверяется и при равных длительностях видео
+            return list(range(0, max_offset, step)) + [max_offset]
+        factor, coarse_stride, refine_shifts = plan
+        offsets = []
+        for coarse_start in self.best_coarse_starts(short_video_features[:short_duration:factor],
+                                                    long_video_features[:long_duration:factor], coarse_stride):
+            for offset in [coarse_start * factor + shift for shift in refine_shifts]:
+                if 0 <= offset <= max_offset and offset not in offsets:
+                    offsets.append(offset)
+        return offsets
+
+    def best_coarse_starts(self, coarse_short: np.ndarray, coarse_long: np.ndarray, coarse_stride: int) -> List[int]:
+        """
+        Грубый проход иерархического поиска сдвига (см. coarse_to_fine_offsets).
+        Args:
+            coarse_short (np.ndarray): Прореженные фичи короткого видео.
+            coarse_long (np.ndarray): Прореженные фичи длинного видео.
+            coarse_stride (int): Шаг, с которым сдвигается кроп прореженного длинного видео.
+        Returns (List[int]): Индексы начала self.coarse_top_k лучших кропов прореженного длинного видео.
+        """
+        coarse_starts = list(range(0, coarse_long.shape[0] - coarse_short.shape[0] + 1, coarse_stride))
+        coarse_scores = [self.calculate_similarity(coarse_long[i: i + coarse_short.shape[0]], coarse_short)
+                         for i in coarse_starts]
+        return [coarse_starts[int(coarse_idx)] for coarse_idx in np.argsort(coarse_scores)[::-1][:self.coarse_top_k]]
+
+    def coarse_search_plan(self, short_duration: int, max_offset: int,
+                           step: int) -> Optional[Tuple[int, int, List[int]]]:
+        """
+        Параметры иерархического поиска сдвига (см. coarse_to_fine_offsets).
+        Args:
+            short_duration (int): Длительность короткого видео.
+            max_offset (int): Наибольший индекс начала кропа длинного видео.
+            step (int): Шаг сканирования, с которым сравнивается стоимость поиска.
+        Returns (Optional[Tuple[int, int, List[int]]]): Во сколько раз прореживаются фичи, шаг грубого прохода
+                                                        в прореженных кадрах и сдвиги уточняемых кропов относительно
+                                                        лучших грубых (None, если сканирование с шагом step дешевле).
+        """
+        factor = max(1, min(self.coarse_factor, short_duration // MIN_COARSE_LEN))
+        coarse_stride = max(1, -(-step // factor ** 3))
+        spacing = factor * coarse_stride
+        refine_shifts = [0] + [sign * shift for shift in range(self.refine_step, spacing // 2 + 1, self.refine_step)
+                               for sign in (-1, 1)]
+        # стоимость в кропах исходного разрешения
+        search_cost = (max_offset // spacing + 1) / factor ** 2 + self.coarse_top_k * len(refine_shifts)
+        if factor == 1 or search_cost >= -(-max_offset // step) + 1:
+            return None
+        return factor, coarse_stride, refine_shifts
 
     def compare_videos(self, short_video_info: dict, long_video_info: dict, similarity_threshold: float,
-                       step: int) -> dict:
+                       step: int, start_offset: int = 0, search: str = 'scan',
+                       temporal_index: Optional[TemporalIndex] = None) -> dict:
         """
         Сравнение видео. Подразумевается, что long_video длиннее, чем short_video.
         Чем меньше step (шаг), тем точнее сравнение, но и тем медленнее будет выполняться функция.
@@ -75,37 +416,92 @@ class VideoSimilarityModel:
         и если схожесть больше чем similarity_threshold, то считаем видео равными. Если же не схожи, то
         берем следующий кроп из длинного видео начиная с индекса 0 + step и т.д.
 
+        При search='coarse_to_fine' кропы выбираются иерархическим поиском (см. coarse_to_fine_offsets), если он
+        дешевле сканирования с шагом step: сдвиг ищется точнее, чем с шагом step. Кроме того, рассматривается и
+        случай равных длительностей видео.
+
+        При search='index' моделью проверяются только index_top_k сдвигов, набравших больше всего голосов
+        во временном индексе длинного видео (подробнее тут video/temporal_index.py).
+
         Args:
             short_video_info (dict): Информация о коротком видео:
-                                            short_video_info['features_path'] (str): Локальный путь до фич видео.
+                                            short_video_info['features_path'] (str): Локальный путь до фич видео
+                                                                                (если не заданы features).
                                             short_video_info['duration'] (int): Длительность видео в секундах.
+                                            short_video_info['features'] (np.ndarray): Уже загруженные фичи видео
+                                                                                       (необязательно).
             long_video_info (dict): Информация о длинном видео:
-                                            long_video_info['features_path'] (str): Локальный путь до фич видео.
+                                            long_video_info['features_path'] (str): Локальный путь до фич видео
+                                                                               (если не заданы features).
                                             long_video_info['duration'] (int): Длительность видео в секундах.
+                                            long_video_info['features'] (np.ndarray): Уже загруженные фичи видео
+                                                                                      (необязательно).
             similarity_threshold (float): Пороговое значение для сравнения видео.
             step (int): Шаг с которым сдвигается индекс начала кропа из длинного видео (см. подробнее в описании).
+            start_offset (int): Индекс начала первого кропа (чтобы досчитать сравнение, остановленное ранее;
+                                только при search='scan').
+            search (str): Выбор кропов: scan - с шагом step, coarse_to_fine - иерархический поиск,
+                          index - по временному индексу.
+            temporal_index (Optional[TemporalIndex]): Временной индекс длинного видео для search='index'
+                                                      (None - индекс строится по фичам длинного видео).
 
         Returns:
             comparison_info (dict): Результат сравнения видео:
                                         comparison_info['are_similar'] (bool): Похожи ли видео.
                                         comparison_info['max_similarity'] (float): Максимальный достигнутая оценка
-                                                                                    схожести
+                                                                                    схожести (нижняя граница)
+                                        comparison_info['window_scores'] (Dict[int, Tuple[float, float]]): Нижняя
+                                                и верхняя граница оценки схожести каждого кропа по индексу начала
+                                                (кропы обрабатываются не полностью, если решение уже известно,
+                                                см. calculate_similarity_bounds и proxy_margin).
+                                        comparison_info['next_offset'] (int): Индекс начала следующего
+                                                                              непросчитанного кропа (0, если
+                                                                              search не scan).
+                                        comparison_info['is_complete'] (bool): Просчитаны ли все кропы.
 
         """
 
-        short_video_features = load_data(short_video_info['features_path'])
-        long_video_features = load_data(long_video_info['features_path'])
+        short_video_features = short_video_info['features'] if 'features' in short_video_info \
+            else load_features(short_video_info['features_path'])
+        long_video_features = long_video_info['features'] if 'features' in long_video_info \
+            else load_features(long_video_info['features_path'])
 
-        comparison_info = {'are_similar': False, 'max_similarity': 0}
+        comparison_info = {'are_similar': False, 'max_similarity': 0, 'window_scores': {},
+                           'next_offset': start_offset if search == 'scan' else 0, 'is_complete': True}
 
-        for i in range(0, long_video_info['duration'] - short_video_info['duration'], step):
+        if search == 'scan':
+            offsets = list(range(start_offset, long_video_info['duration'] - short_video_info['duration'], step))
+        elif search == 'coarse_to_fine':
+            offsets = self.coarse_to_fine_offsets(short_video_features, long_video_features,
+                                                  short_video_info['duration'], long_video_info['duration'], step)
+        elif search == 'index':
+            if temporal_index is None:
+                temporal_index = TemporalIndex(long_video_features[:long_video_info['duration']])
+            offsets = temporal_index.candidate_offsets(short_video_features[:short_video_info['duration']],
+                                                       long_video_info['duration'] - short_video_info['duration'],
+                                                       self.index_top_k, self.index_tolerance)
+        else:
+            raise NameError(f"Search {search} doesn't exist!")
+        proxy_upper_bounds = None
+        if self.proxy_margin is not None and offsets:
+            proxy_upper_bounds = self.proxy_scores(short_video_features, long_video_features, offsets) + \
+                self.proxy_margin
+        for offset_idx, i in enumerate(offsets):
+            if search == 'scan':
+                comparison_info['next_offset'] = i + step
+            if proxy_upper_bounds is not None and proxy_upper_bounds[offset_idx] < similarity_threshold:
+                comparison_info['window_scores'][i] = (-1., float(min(proxy_upper_bounds[offset_idx], 1.)))
+                continue
             long_video_crop_features = long_video_features[i: i + short_video_info['duration'], ...]
-            similarity = self.calculate_similarity(long_video_crop_features, short_video_features)
+            similarity, similarity_upper_bound = self.calculate_similarity_bounds(
+                long_video_crop_features, short_video_features, similarity_threshold)
             del long_video_crop_features
+            comparison_info['window_scores'][i] = (similarity, similarity_upper_bound)
             if similarity > comparison_info['max_similarity']:
                 comparison_info['max_similarity'] = similarity
             if similarity >= similarity_threshold:
                 comparison_info['are_similar'] = True
+                comparison_info['is_complete'] = offset_idx + 1 == len(offsets)
                 break
         del short_video_features, long_video_features
         return comparison_info
@@ -0,0 +1,146 @@
+"""
+Сравнение режимов уменьшенной размерности фич (VideoSimilarityModel с feature_dims) с полными фичами:
+объем хранения (и передачи) фич, время сравнения и потеря точности группировки.
+
+Фичи уменьшенной размерности получаются из уже вытянутых полных фич без запуска ResNet: PCA_layer упорядочивает
+компоненты по убыванию дисперсии, а attention умножает каждый вектор региона на положительный вес, поэтому
+нормированные первые dims компонент полного вектора совпадают с вектором, который вытянул бы ViSiL с dims.
+
+Точность оценивается по решениям о схожести пар: решения полной модели (с Video_Comparator) считаются эталоном,
+а для каждой размерности подбирается порог chamfer similarity, при котором решения совпадают чаще всего.
+"""
+import os
+import time
+import logging
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from model.numpy_similarity import NumpySimilarity  # pylint: disable=import-error
+from utils.compression import save_features, load_features  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {'threshold': 0.75, 'step': 100, 'codec': 'zlib'}
+
+
+def reduce_feature_dims(features: np.ndarray, dims: Optional[int]) -> np.ndarray:
+    """
+    Args:
+        features (np.ndarray): Полные фичи видео (кадры x регионы x 3840).
+        dims (Optional[int]): Размерность (None - без изменений).
+    Returns (np.ndarray): Фичи уменьшенной размерности (как у ViSiL с dims).
+    """
+    if dims is None:
+        return features
+    features = features[..., :dims]
+    return features / np.maximum(np.linalg.norm(features, axis=-1, keepdims=True), 1e-15)
+
+
+def max_window_similarity(head: NumpySimilarity, short_features: np.ndarray, long_features: np.ndarray,
+                          step: int) -> float:
+    """
+    Args:
+        head (NumpySimilarity): Голова сравнения.
+        short_features (np.ndarray): Фичи короткого видео.
+        long_features (np.ndarray): Фичи длинного видео.
+        step (int): Шаг по кадрам длинного видео (как в VideoSimilarityModel.compare_videos).
+    Returns (float): Максимальная оценка схожести кропов длинного видео с коротким видео.
+    """
+    crop_len = short_features.shape[0]
+    return max(head.calculate_video_similarity(long_features[i: i + crop_len], short_features)
+               for i in range(0, long_features.shape[0] - crop_len + 1, step))
+
+
+def best_threshold(scores: np.ndarray, reference: np.ndarray) -> float:
+    """
+    Args:
+        scores (np.ndarray): Оценки схожести пар.
+        reference (np.ndarray): Эталонные решения о схожести пар.
+    Returns (float): Порог, при котором решения по оценкам чаще всего совпадают с эталонными.
+    """
+    candidates = np.unique(scores)
+    agreement = [np.mean((scores >= threshold) == reference) for threshold in candidates]
+    return float(candidates[int(np.argmax(agreement))])
+
+
+def measure_dims(model_dir: str, full_features: List[np.ndarray], pairs: List[Tuple[int, int]],
+                 dims: Optional[int], settings: dict) -> Tuple[np.ndarray, int, float]:
+    """
+    Args:
+        model_dir (str): Путь до директории с чекпоинтом модели (для весов Video_Comparator).
+        full_features (List[np.ndarray]): Полные фичи видео (в порядке возрастания длины).
+        pairs (List[Tuple[int, int]]): Пары индексов (короткое видео, длинное видео).
+        dims (Optional[int]): Размерность (None - полные фичи с Video_Comparator).
+        settings (dict): Параметры бенчмарка (см. DEFAULT_SETTINGS).
+    Returns (Tuple[np.ndarray, int, float]): Оценки схожести пар, суммарный размер файлов фич и время сравнения
+                                             всех пар в секундах.
+    """
+    head = NumpySimilarity(model_dir, video_comparator=dims is None)
+    videos_features = [reduce_feature_dims(features, dims) for features in full_features]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        total_bytes = 0
+        for idx, features in enumerate(videos_features):
+            path = os.path.join(tmp_dir, f"{idx}_features")
+            save_features(features, path, codec=settings['codec'])
+            total_bytes += os.path.getsize(path)
+
+    start = time.perf_counter()
+    scores = np.array([max_window_similarity(head, videos_features[i], videos_features[j], settings['step'])
+                       for i, j in pairs])
+    return scores, total_bytes, time.perf_counter() - start
+
+
+def run_benchmark(features_paths: List[str], model_dir: str, dims_list: Sequence[Optional[int]] = (None, 1024, 512, 256),
+                  settings: Optional[dict] = None) -> List[Dict[str, float]]:
+    """
+    Args:
+        features_paths (List[str]): Пути до полных фич видео (например, локальные фичи после 1 этапа).
+        model_dir (str): Путь до директории с чекпоинтом модели (для весов Video_Comparator).
+        dims_list (Sequence[Optional[int]]): Проверяемые размерности (None - полные фичи с Video_Comparator).
+        settings (Optional[dict]): Параметры бенчмарка, заменяющие DEFAULT_SETTINGS: threshold (порог схожести
+                                   полной модели), step (шаг по кадрам длинного видео) и codec (кодек сжатия фич
+                                   при оценке объема хранения).
+    Returns:
+        results (List[Dict[str, float]]): Для каждой размерности: dims, bytes (суммарный размер файлов фич),
+                                          compare_seconds (время сравнения всех пар), threshold (порог),
+                                          agreement, precision и recall (относительно полной модели).
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    full_features = sorted((load_features(path) for path in features_paths), key=lambda features: features.shape[0])
+    pairs = [(i, j) for j in range(len(full_features)) for i in range(j)]
+    reference = None
+    results = []
+    for dims in dims_list:
+        scores, total_bytes, compare_seconds = measure_dims(model_dir, full_features, pairs, dims, settings)
+        if dims is None:
+            dims_threshold = settings['threshold']
+        elif reference is None:
+            raise ValueError("Full features (None) must be the first in dims_list!")
+        else:
+            dims_threshold = best_threshold(scores, reference)
+        decisions = scores >= dims_threshold
+        if reference is None:
+            reference = decisions
+        true_positives = np.sum(decisions & reference)
+        results.append({'dims': dims or 3840, 'bytes': total_bytes, 'compare_seconds': compare_seconds,
+                        'threshold': dims_threshold, 'agreement': float(np.mean(decisions == reference)),
+                        'precision': float(true_positives / max(np.sum(decisions), 1)),
+                        'recall': float(true_positives / max(np.sum(reference), 1))})
+        # pylint: disable=logging-fstring-interpolation
+        log.info(f"dims={results[-1]['dims']}: {total_bytes} bytes, {compare_seconds:.1f} s, "
+                 f"threshold={dims_threshold:.3f}, agreement={results[-1]['agreement']:.3f}")
+    return results
+
+
+if __name__ == '__main__':
+    from logging.config import dictConfig
+    from utils.logger import LOGGING_CONFIG
+
+    dictConfig(LOGGING_CONFIG)
+    features_dir = "saved_data/"
+    run_benchmark([os.path.join(features_dir, filename) for filename in sorted(os.listdir(features_dir))
+                   if '_features.' in filename],
+                  model_dir="model/model_checkpoint/")
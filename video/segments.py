@@ -0,0 +1,51 @@
+"""
+Модуль для вытягивания фич из длинного видео по частям (сегментам по времени).
+
+Каждый сегмент считывается со своей точки перемотки (см. utils/manipulate_data.py load_video с параметрами
+start и end) и обрабатывается независимо. Фичи ViSiL вычисляются для каждого кадра отдельно, а границы сегментов
+совпадают с секундами, на которых считываются кадры, поэтому склеенные фичи сегментов совпадают с фичами,
+вытянутыми из всего видео сразу.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from model.padding import MIN_FEATURES_LEN  # pylint: disable=import-error
+
+
+def split_into_segments(duration: int, segment_duration: int) -> List[Tuple[int, int]]:
+    """
+    Разбиение видео на сегменты.
+    Args:
+        duration (int): Длительность видео в секундах.
+        segment_duration (int): Длительность сегмента в секундах.
+    Returns:
+        segments (List[Tuple[int, int]]): Начало и конец (не включительно) каждого сегмента в секундах.
+                                          Конец последнего сегмента - None (до конца видео), так как длительность
+                                          из заголовков может быть неточной.
+    """
+    starts = list(range(0, max(duration, 1), segment_duration))
+    return [(start, start + segment_duration) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+def pad_features(features: np.ndarray) -> np.ndarray:
+    """
+    Повторение фич, пока их не станет хотя бы MIN_FEATURES_LEN (как в ViSiL.extract_features).
+    Args:
+        features (np.ndarray): Фичи видео.
+    Returns (np.ndarray): Фичи видео.
+    """
+    while features.shape[0] < MIN_FEATURES_LEN:
+        features = np.concatenate([features, features], axis=0)
+    return features
+
+
+def stitch_segments(segments_features: List[np.ndarray]) -> np.ndarray:
+    """
+    Склейка фич сегментов в фичи всего видео.
+    Args:
+        segments_features (List[np.ndarray]): Фичи каждого сегмента (без повторения коротких сегментов).
+    Returns (np.ndarray): Фичи видео.
+    """
+    return pad_features(np.concatenate([features for features in segments_features if features.shape[0] > 0],
+                                       axis=0))
@@ -0,0 +1,76 @@
+"""
+Проверка вытягивания фич по частям на реальном видео: фичи, склеенные из сегментов (каждый сегмент считывается
+со своей точки перемотки, см. video/segments.py), сравниваются с фичами, вытянутыми из всего видео сразу.
+Перемотка cv2 (CAP_PROP_POS_FRAMES) может быть неточной для некоторых контейнеров и кодеков, поэтому проверку
+стоит запускать на видео из своей БД перед включением вытягивания по частям.
+"""
+import sys
+import logging
+
+import numpy as np
+
+from video.segments import split_into_segments, stitch_segments  # pylint: disable=import-error
+from utils.manipulate_data import load_video  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def segments_features(model, video_path: str, num_frames: int, segment_duration: int, batch_sz: int) -> np.ndarray:
+    """
+    Args:
+        model (VideoSimilarityModel): Модель.
+        video_path (str): Путь до видео.
+        num_frames (int): Количество кадров видео.
+        segment_duration (int): Длительность сегмента в секундах.
+        batch_sz (int): Размер батча.
+    Returns (np.ndarray): Фичи, склеенные из фич сегментов (без повторения коротких видео).
+    """
+    features = []
+    for start, end in split_into_segments(num_frames, segment_duration):
+        segment_data = load_video(video_path, start=start, end=end)
+        if segment_data.shape[0] > 0:
+            features.append(model.extract_features(segment_data, batch_sz=batch_sz)[:segment_data.shape[0]])
+    return stitch_segments(features)[:sum(segment_features.shape[0] for segment_features in features)]
+
+
+def check_segments(video_path: str, model_dir: str, segment_duration: int = 60, batch_sz: int = 32,
+                   atol: float = 1e-4) -> dict:
+    """
+    Args:
+        video_path (str): Путь до видео.
+        model_dir (str): Путь до директории с чекпоинтом модели.
+        segment_duration (int): Длительность сегмента в секундах.
+        batch_sz (int): Размер батча.
+        atol (float): Допустимое отличие фич (фичи кадров вычисляются независимо, поэтому отличия возможны только
+                      из-за порядка вычислений в батче).
+    Returns (dict): Количество кадров всего видео (num_frames) и склеенных сегментов (segments_num_frames),
+                    максимальное отличие фич (max_abs_diff) и совпадают ли фичи (is_exact).
+    """
+    # pylint: disable=import-outside-toplevel
+    from video.compare_videos import VideoSimilarityModel  # pylint: disable=import-error
+
+    model = VideoSimilarityModel(model_dir)
+    video_data = load_video(video_path)
+    num_frames = video_data.shape[0]
+    features = model.extract_features(video_data, batch_sz=batch_sz)[:num_frames]
+    del video_data
+
+    stitched_features = segments_features(model, video_path, num_frames, segment_duration, batch_sz)
+    segments_num_frames = stitched_features.shape[0]
+    max_abs_diff = float(np.max(np.abs(features - stitched_features))) \
+        if segments_num_frames == num_frames else float('inf')
+    result = {'num_frames': num_frames, 'segments_num_frames': segments_num_frames, 'max_abs_diff': max_abs_diff,
+              'is_exact': max_abs_diff <= atol}
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"{video_path}: {num_frames} frames, {segments_num_frames} frames in segments, "
+             f"max abs diff {max_abs_diff:.2e}")
+    return result
+
+
+if __name__ == '__main__':
+    from logging.config import dictConfig
+    from utils.logger import LOGGING_CONFIG
+
+    dictConfig(LOGGING_CONFIG)
+    check_result = check_segments(sys.argv[1], model_dir="model/model_checkpoint/")
+    sys.exit(0 if check_result['is_exact'] else 1)
@@ -0,0 +1,70 @@
+"""
+Проверка совпадения оценок схожести головы сравнения на NumPy (model/numpy_similarity.py) и в TF
+(ViSiL.calculate_video_similarity) на одних и тех же фичах реальных видео: видео сравнивается с самим собой,
+с первой половиной и с другим видео (если оно задано). Проверку стоит запускать перед переходом на
+similarity_backend='numpy' (оценки обоих бэкендов попадают в одно хранилище оценок схожести, см. meta/scores.py).
+"""
+import sys
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils.manipulate_data import load_video  # pylint: disable=import-error
+
+log = logging.getLogger(__name__)
+
+
+def similarity_pairs(model, video_path: str, other_video_path: Optional[str],
+                     batch_sz: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Args:
+        model (VideoSimilarityModel): Модель.
+        video_path (str): Путь до видео.
+        other_video_path (Optional[str]): Путь до другого видео (None - только пары из первого видео).
+        batch_sz (int): Размер батча.
+    Returns (List[Tuple[np.ndarray, np.ndarray]]): Пары фич (query, target).
+    """
+    features = model.extract_features(load_video(video_path), batch_sz=batch_sz)
+    pairs = [(features, features), (features[:max(features.shape[0] // 2, 1)], features)]
+    if other_video_path is not None:
+        other_features = model.extract_features(load_video(other_video_path), batch_sz=batch_sz)
+        pairs += [(other_features, features), (features, other_features)]
+    return pairs
+
+
+def check_similarity(video_path: str, model_dir: str, other_video_path: Optional[str] = None,
+                     batch_sz: int = 32, atol: float = 1e-4) -> List[Tuple[float, float]]:
+    """
+    Args:
+        video_path (str): Путь до видео.
+        model_dir (str): Путь до директории с чекпоинтом модели.
+        other_video_path (Optional[str]): Путь до другого видео.
+        batch_sz (int): Размер батча.
+        atol (float): Допустимое отличие оценок (оценки лежат в [-1, 1], отличия возможны только из-за порядка
+                      вычислений).
+    Returns (List[Tuple[float, float]]): Оценки TF и NumPy для каждой пары (AssertionError, если они отличаются
+                                         больше допустимого).
+    """
+    # pylint: disable=import-outside-toplevel
+    from video.compare_videos import VideoSimilarityModel  # pylint: disable=import-error
+
+    model = VideoSimilarityModel(model_dir, similarity_backend='tf')
+    pairs = similarity_pairs(model, video_path, other_video_path, batch_sz)
+    tf_scores = [float(model.similarity_model.calculate_video_similarity(query, target)) for query, target in pairs]
+    model.similarity_backend = 'numpy'
+    numpy_scores = [model.similarity_model.calculate_video_similarity(query, target) for query, target in pairs]
+    # pylint: disable=logging-fstring-interpolation
+    log.info(f"tf: {tf_scores}, numpy: {numpy_scores}, "
+             f"max abs diff {float(np.max(np.abs(np.subtract(tf_scores, numpy_scores)))):.2e}")
+    np.testing.assert_allclose(numpy_scores, tf_scores, rtol=0, atol=atol)
+    return list(zip(tf_scores, numpy_scores))
+
+
+if __name__ == '__main__':
+    from logging.config import dictConfig
+    from utils.logger import LOGGING_CONFIG
+
+    dictConfig(LOGGING_CONFIG)
+    check_similarity(sys.argv[1], model_dir="model/model_checkpoint/",
+                     other_video_path=sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,122 @@
+"""
+Модуль, описывающий временной инвертированный индекс кадров видео для поиска сдвига короткого видео внутри
+длинного (главного) видео.
+
+Дескрипторы кадров длинного видео (нормированное среднее векторов регионов) квантуются k-means, и для каждого
+кластера хранится список кадров (инвертированный список). Каждый кадр короткого видео ищет кадры длинного видео
+из ближайших кластеров и голосует за сдвиг (индекс кадра длинного видео - индекс кадра короткого видео), как в
+преобразовании Хафа. Сдвиги, набравшие больше всего голосов, затем проверяются полной моделью (см.
+video/compare_videos.py VideoSimilarityModel.compare_videos с search='index'). Время поиска зависит от длины
+инвертированных списков, а не от количества всех сдвигов.
+"""
+from typing import List
+
+import numpy as np
+
+
+def frame_descriptors(features: np.ndarray) -> np.ndarray:
+    """
+    Дескриптор каждого кадра: нормированное среднее векторов его регионов.
+    Args:
+        features (np.ndarray): Фичи видео (кадры x регионы x размерность).
+    Returns (np.ndarray): Дескрипторы кадров (кадры x размерность).
+    """
+    descriptors = features.mean(axis=1)
+    return descriptors / np.maximum(np.linalg.norm(descriptors, axis=1, keepdims=True), 1e-15)
+
+
+def spherical_kmeans(descriptors: np.ndarray, num_clusters: int, num_iters: int, seed: int) -> np.ndarray:
+    """
+    Кластеризация нормированных дескрипторов по косинусной близости.
+    Args:
+        descriptors (np.ndarray): Нормированные дескрипторы (количество x размерность).
+        num_clusters (int): Количество кластеров (не больше количества дескрипторов).
+        num_iters (int): Количество итераций.
+        seed (int): Seed для выбора начальных центров.
+    Returns (np.ndarray): Нормированные центры кластеров (кластеры x размерность).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = descriptors[rng.choice(descriptors.shape[0], num_clusters, replace=False)]
+    for _ in range(num_iters):
+        assignments = np.argmax(np.dot(descriptors, centroids.T), axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, descriptors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # пустые кластеры сохраняют прежний центр
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-15), centroids)
+    return centroids
+
+
+class TemporalIndex:
+    """
+    Временной инвертированный индекс кадров длинного видео.
+    """
+
+    def __init__(self, features: np.ndarray, num_clusters: int = 64, num_iters: int = 10, seed: int = 0):
+        """
+        Args:
+            features (np.ndarray): Фичи видео (кадры x регионы x размерность).
+            num_clusters (int): Количество кластеров (уменьшается до количества кадров для коротких видео).
+            num_iters (int): Количество итераций k-means.
+            seed (int): Seed k-means.
+        """
+        descriptors = frame_descriptors(features.astype(np.float32))
+        self.num_frames = descriptors.shape[0]
+        self.centroids = spherical_kmeans(descriptors, min(num_clusters, self.num_frames), num_iters, seed)
+        assignments = np.argmax(np.dot(descriptors, self.centroids.T), axis=1)
+        # инвертированные списки хранятся подряд: кадры кластера c - frames[list_starts[c]: list_starts[c + 1]]
+        self.frames = np.argsort(assignments, kind='stable').astype(np.int64)
+        self.list_starts = np.searchsorted(assignments[self.frames], np.arange(self.centroids.shape[0] + 1))
+
+    def inverted_list(self, cluster: int) -> np.ndarray:
+        """
+        Args:
+            cluster (int): Индекс кластера.
+        Returns (np.ndarray): Индексы кадров видео из кластера (по возрастанию).
+        """
+        return self.frames[self.list_starts[cluster]: self.list_starts[cluster + 1]]
+
+    def vote(self, query_features: np.ndarray, max_offset: int, num_probes: int = 1) -> np.ndarray:
+        """
+        Голосование кадров короткого видео за сдвиги.
+        Args:
+            query_features (np.ndarray): Фичи короткого видео.
+            max_offset (int): Максимальный сдвиг (длительность длинного видео - длительность короткого).
+            num_probes (int): Количество ближайших кластеров, в которых ищется каждый кадр короткого видео.
+        Returns (np.ndarray): Количество голосов за каждый сдвиг от 0 до max_offset.
+        """
+        votes = np.zeros(max_offset + 1, dtype=np.int64)
+        if max_offset < 0:
+            return votes
+        num_probes = min(num_probes, self.centroids.shape[0])
+        clusters_sim = np.dot(frame_descriptors(query_features.astype(np.float32)), self.centroids.T)
+        nearest_clusters = np.argsort(-clusters_sim, axis=1)[:, :num_probes]
+        for frame_idx, clusters in enumerate(nearest_clusters):
+            for cluster in clusters:
+                offsets = self.inverted_list(cluster) - frame_idx
+                offsets = offsets[(offsets >= 0) & (offsets <= max_offset)]
+                # кадр входит ровно в один список, поэтому повторов внутри offsets нет
+                votes[offsets] += 1
+        return votes
+
+    def candidate_offsets(self, query_features: np.ndarray, max_offset: int, top_k: int,
+                          tolerance: int = 0, num_probes: int = 1) -> List[int]:
+        """
+        Args:
+            query_features (np.ndarray): Фичи короткого видео.
+            max_offset (int): Максимальный сдвиг (длительность длинного видео - длительность короткого).
+            top_k (int): Количество сдвигов-кандидатов.
+            tolerance (int): Голоса за сдвиги, отличающиеся не больше чем на tolerance, складываются (кадры
+                             считываются раз в секунду, поэтому совпадающие кадры могут немного смещаться).
+            num_probes (int): Количество ближайших кластеров, в которых ищется каждый кадр короткого видео.
+        Returns (List[int]): Сдвиги-кандидаты в порядке убывания количества голосов.
+        """
+        votes = self.vote(query_features, max_offset, num_probes)
+        if votes.shape[0] == 0:
+            return []
+        if tolerance > 0:
+            cumulative_votes = np.concatenate([[0], np.cumsum(votes)])
+            offsets = np.arange(votes.shape[0])
+            votes = cumulative_votes[np.minimum(offsets + tolerance + 1, votes.shape[0])] - \
+                cumulative_votes[np.maximum(offsets - tolerance, 0)]
+        return [int(offset) for offset in np.argsort(-votes, kind='stable')[:top_k]]